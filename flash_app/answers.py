@@ -0,0 +1,130 @@
+"""Write-behind buffer of answers in learning sessions with QuestionText flashcards.
+
+Answer is recorded with one query: current state of the flashcard in SessionCardState is updated only when
+the session belongs to the user, so the next question of the session is chosen from up-to-date states at once.
+The answer is appended to a buffer of this process, which is written by flush(): FlashCardsTextStatus records
+with one bulk_create and spaced repetition schedules with scheduler.review_many() for each user, in one
+transaction. Buffer is flushed when it has FLASH_ANSWER_BUFFER_SIZE answers, FLASH_ANSWER_BUFFER_SECONDS after
+the first buffered answer (by a timer thread), before session summaries and exports are counted and at exit
+of the process. With FLASH_ANSWER_BUFFER_SIZE = 1 answers are written at once (used in tests).
+
+Durability: state of flashcards in sessions is committed before the response. Log of answers, schedules,
+due queues and mastered counts of buffered answers are lost when the process is killed (e.g. SIGKILL, OOM)
+before flush - at most FLASH_ANSWER_BUFFER_SIZE answers or FLASH_ANSWER_BUFFER_SECONDS of answers of the
+process. Until flush, due and mastered numbers of the user don't include buffered answers, and summary of
+the session is not stored (see LearningSession.update_summary). When flush fails,
+answers are put back to the buffer and written by the next flush. Answers of deleted sessions or flashcards
+are dropped.
+"""
+from collections import defaultdict, namedtuple
+import atexit
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import FlashCardsTextStatus, QuestionText, Session, SessionCardState
+from . import scheduler
+
+logger = logging.getLogger(__name__)
+
+Answer = namedtuple('Answer', 'session_id flash_card_id user_id result date')
+
+buffer = []
+lock = threading.Lock()
+flush_lock = threading.Lock()
+timer = None
+
+
+def record(session_id, flash_card_id, user_id, result):
+    """Answer of the user is recorded in state of the flashcard and buffered. Raises SessionCardState.DoesNotExist
+    when the flashcard is not in the session of the user"""
+    date = timezone.now()
+    updated = SessionCardState.objects.filter(session_id=session_id, flash_card_id=flash_card_id,
+                                              session__user_id=user_id)\
+        .update(result=result, attempts=F('attempts') + 1, last_answered=date)
+    if not updated:
+        raise SessionCardState.DoesNotExist("Flashcard is not in the learning session of the user")
+    with lock:
+        buffer.append(Answer(session_id, flash_card_id, user_id, result, date))
+        full = len(buffer) >= settings.FLASH_ANSWER_BUFFER_SIZE
+        if not full:
+            start_timer()
+    if full:
+        flush_logged()
+
+
+def start_timer():
+    global timer
+    if timer is None:
+        timer = threading.Timer(settings.FLASH_ANSWER_BUFFER_SECONDS, timer_task)
+        timer.daemon = True
+        timer.start()
+
+
+def timer_task():
+    """Flush of timer thread, database connection of the thread is closed when work is done"""
+    global timer
+    with lock:
+        timer = None
+    try:
+        flush_logged()
+    finally:
+        connections.close_all()
+
+
+def flush_logged():
+    """Flush which doesn't raise, errors are logged and answers stay in the buffer"""
+    try:
+        flush()
+    except Exception:
+        logger.exception("Buffered answers were not written")
+
+
+def flush():
+    """Buffered answers of this process are written, returns number of written answers"""
+    global buffer
+    with flush_lock:
+        with lock:
+            answers, buffer = buffer, []
+        if not answers:
+            return 0
+        try:
+            write(answers)
+        except Exception:
+            with lock:
+                buffer = answers + buffer
+                start_timer()
+            raise
+    return len(answers)
+
+
+def write(answers):
+    session_ids = set(Session.objects.filter(id__in={answer.session_id for answer in answers})
+                      .values_list('id', flat=True))
+    card_ids = set(QuestionText.objects.filter(id__in={answer.flash_card_id for answer in answers})
+                   .values_list('id', flat=True))
+    answers = [answer for answer in answers if answer.session_id in session_ids and answer.flash_card_id in card_ids]
+    results = defaultdict(list)
+    for answer in answers:
+        results[answer.user_id].append((answer.flash_card_id, answer.result, answer.date))
+    with transaction.atomic():
+        FlashCardsTextStatus.objects.bulk_create(
+            [FlashCardsTextStatus(session_id=answer.session_id, flash_card_id=answer.flash_card_id,
+                                  result=answer.result, date=answer.date) for answer in answers])
+        for user_id, user_results in results.items():
+            scheduler.review_many(user_id, user_results)
+
+
+def reset_in_child():
+    """Forked process (e.g. worker of preloaded application) doesn't write answers of the parent"""
+    global buffer, timer
+    buffer, timer = [], None
+
+
+atexit.register(flush_logged)
+os.register_at_fork(after_in_child=reset_in_child)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class FlashAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'flash_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,104 @@
+"""Archive of study history (FlashCardsTextStatus records) of old learning sessions.
+
+Queries of learning read status records of one unfinished session (summary, answers), summary of finished
+session is stored with the session, so records of finished sessions are read only by the export. archive()
+moves records of sessions finished and started more than FLASH_ARCHIVE_AFTER_DAYS days ago to ArchivedTextStatus
+table with the same ids, batch of sessions in one transaction, so the live table and its indexes stay small.
+history() reads records of both tables merged in order of ids, as if they were one table.
+
+PostgreSQL: archive table is partitioned by month of the answer (declarative range partitioning created by
+migration 0017), partitions of months are created by archive() before records are moved to them. Old months
+can be detached and dumped or dropped as whole tables. Other databases use one archive table.
+
+Answers written to a session after it was archived (buffered answers of other process) stay in the live table
+until the next archive().
+"""
+from datetime import timedelta, timezone as dt_timezone
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedTextStatus, FlashCardsTextStatus, Session
+
+TABLE = 'flash_app_archivedtextstatus'
+FIELDS = ('id', 'session_id', 'flash_card_id', 'result', 'date')
+# sessions moved in one transaction, records deleted with one query (below SQLite limit of query parameters)
+BATCH_SIZE = 500
+CHUNK_SIZE = 2000
+
+
+def install(connection):
+    """Archive table created by the migration is replaced with partitioned table on PostgreSQL, ids are always
+    given by archive() so they are not generated by the table"""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {TABLE}")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} ("
+            f"id bigint NOT NULL, "
+            f"result smallint NULL, "
+            f"date timestamp with time zone NOT NULL, "
+            f"flash_card_id bigint NOT NULL REFERENCES flash_app_questiontext (id) DEFERRABLE INITIALLY DEFERRED, "
+            f"session_id bigint NOT NULL REFERENCES flash_app_session (id) DEFERRABLE INITIALLY DEFERRED, "
+            f"PRIMARY KEY (id, date)"
+            f") PARTITION BY RANGE (date)")
+        cursor.execute(f"CREATE INDEX {TABLE}_session_id_idx ON {TABLE} (session_id)")
+        cursor.execute(f"CREATE INDEX {TABLE}_flash_card_id_idx ON {TABLE} (flash_card_id)")
+
+
+def month(date):
+    return date.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def create_partitions(connection, months):
+    """Partitions of the archive table for given months (first moments of months in UTC) on PostgreSQL"""
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        for start in sorted(months):
+            end = (start + timedelta(days=32)).replace(day=1)
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {TABLE}_{start:%Y%m} PARTITION OF {TABLE} "
+                           f"FOR VALUES FROM (%s) TO (%s)", [start, end])
+
+
+def move(session_ids):
+    """Records of sessions are moved to the archive in one transaction, returns number of moved records"""
+    with transaction.atomic():
+        records = list(FlashCardsTextStatus.objects.filter(session_id__in=session_ids).select_for_update()
+                       .values_list(*FIELDS))
+        if not records:
+            return 0
+        create_partitions(transaction.get_connection(), {month(record[-1]) for record in records})
+        ArchivedTextStatus.objects.bulk_create([ArchivedTextStatus(**dict(zip(FIELDS, record)))
+                                                for record in records], batch_size=CHUNK_SIZE)
+        ids = [record[0] for record in records]
+        for start in range(0, len(ids), BATCH_SIZE):
+            FlashCardsTextStatus.objects.filter(id__in=ids[start:start + BATCH_SIZE]).delete()
+    return len(records)
+
+
+def archive(before=None, batch_size=BATCH_SIZE):
+    """Records of sessions finished and started before given time (FLASH_ARCHIVE_AFTER_DAYS days ago by default)
+    are moved to the archive, returns number of moved records"""
+    if before is None:
+        before = timezone.now() - timedelta(days=settings.FLASH_ARCHIVE_AFTER_DAYS)
+    sessions = Session.objects.filter(finished=True, start_date__lt=before).order_by('id').values_list('id', flat=True)
+    moved = last_id = 0
+    while True:
+        session_ids = list(sessions.filter(id__gt=last_id)[:batch_size])
+        if not session_ids:
+            return moved
+        last_id = session_ids[-1]
+        moved += move(session_ids)
+
+
+def history(**filters):
+    """(session_id, flash_card_id, result, date) of records of the live and archive tables matching filters,
+    in order of ids"""
+    tables = [model.objects.filter(**filters).order_by('id').values_list(*FIELDS).iterator(chunk_size=CHUNK_SIZE)
+              for model in (FlashCardsTextStatus, ArchivedTextStatus)]
+    for _, *record in heapq.merge(*tables):
+        yield record
@@ -0,0 +1,93 @@
+"""PostgreSQL backend taking connections from in-process pool (psycopg2 ThreadedConnectionPool).
+
+Django opens the connection when request runs its first query and closes it at the end of the request
+(CONN_MAX_AGE = 0), this backend takes the connection from the pool and returns it there instead, so requests
+don't pay for connecting. Connections broken or left in transaction are closed or rolled back by the pool.
+With CONN_HEALTH_CHECKS connection idle in the pool is checked before it is given to the request.
+
+Pool is created in each process on first use (after fork of worker processes) for each set of connection
+parameters. Settings: POOL = {'min_size': 1, 'max_size': 10} in the database settings, min_size connections are
+opened with the pool, up to max_size connections are kept open. max_size must not be smaller than number of
+threads of the process, otherwise PoolError is raised when the pool is exhausted.
+"""
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base, creation
+
+if base.is_psycopg3:
+    raise ImproperlyConfigured("pooled_postgresql backend needs psycopg2")
+
+from psycopg2.pool import ThreadedConnectionPool  # noqa: E402
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool keeping open up to maxconn connections returned to the pool. psycopg2 pool closes
+    returned connection when minconn connections are idle, so with small minconn threads would connect for most
+    requests. minconn connections are opened when the pool is created."""
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        # _putconn() keeps connection open only while fewer than minconn connections are idle
+        self.minconn = self.maxconn
+
+
+def get_pool(pool_settings, conn_params):
+    key = (os.getpid(), repr(sorted(conn_params.items())))
+    with pools_lock:
+        if key not in pools:
+            pools[key] = ConnectionPool(pool_settings.get('min_size', 1), pool_settings.get('max_size', 10),
+                                        **conn_params)
+        return pools[key]
+
+
+def close_pools():
+    """Closes all connections of pools of this process"""
+    with pools_lock:
+        for key in [key for key in pools if key[0] == os.getpid()]:
+            pools.pop(key).closeall()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        """Test database can't be dropped while connections of the pool are open"""
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.settings_dict.get('POOL', {}), conn_params)
+        connection = self.pool.getconn()
+        if connection.closed or self.settings_dict['CONN_HEALTH_CHECKS'] and not self.is_pooled_usable(connection):
+            self.pool.putconn(connection, close=True)
+            connection = self.pool.getconn()
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = base.IsolationLevel(isolation_level) if isolation_level is not None \
+            else base.IsolationLevel.READ_COMMITTED
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        base.psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def is_pooled_usable(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.pool.putconn(self.connection)
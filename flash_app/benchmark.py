@@ -0,0 +1,394 @@
+"""Benchmark of the learning flow: choose_session -> flashcard_question -> flashcard_answer -> finish_page.
+
+seed() generates synthetic users, categories, QuestionText flashcards and history of finished sessions.
+run_study_flow() goes through learning sessions of seeded users with Django test client and measures latency
+and number of queries of each step. Results are saved as JSON, compare() shows changes against results
+of previous run (e.g. from previous commit).
+
+run_load_test() runs many sessions at once in one process: through the WSGI handler with a pool of threads
+(like a WSGI worker with threads) and through the ASGI handler with async views in one event loop (like an ASGI
+worker), and measures throughput and latency of both.
+
+run_connection_benchmark() sends requests through WSGI handler from many threads, with database connections
+opened and closed by request signals as under WSGI server, to compare throughput of database connection
+settings (FLASH_DB_* environment variables, see flashcards/database.py).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import asyncio
+import math
+import random
+import re
+import subprocess
+import time
+from wsgiref.util import setup_testing_defaults
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import DatabaseError, connection, connections, reset_queries, transaction
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from .models import Category, QuestionText, FlashCardsTextStatus, Session, SessionCardState
+from . import stats
+
+USER_PREFIX = 'benchmark_user_'
+CATEGORY_PREFIX = 'benchmark category '
+STEPS = ('choose_session', 'flashcard_question', 'flashcard_answer', 'finish_page')
+ANSWER_LINK = re.compile(r'(/async)?/flashcard_answer/(\d+)/(\d+)')
+BATCH_SIZE = 5000
+# seeded sessions start during this number of days before now, older ones can be archived (FLASH_ARCHIVE_AFTER_DAYS)
+HISTORY_DAYS = 180
+
+
+def seed(users, categories, cards, history_sessions, cards_per_session=20, rng=None):
+    """Synthetic data: cards are divided between users and common flashcards (without user) and placed
+    in random categories, each user gets history_sessions finished sessions with answers"""
+    rng = rng or random.Random(0)
+    with transaction.atomic():
+        first_user = User.objects.filter(username__startswith=USER_PREFIX).count()
+        user_objects = User.objects.bulk_create(
+            [User(username=f"{USER_PREFIX}{first_user + number}", password='!') for number in range(users)])
+        user_objects = list(User.objects.filter(username__in=[user.username for user in user_objects]))
+        first_category = Category.objects.filter(category_name__startswith=CATEGORY_PREFIX).count()
+        Category.objects.bulk_create(
+            [Category(category_name=f"{CATEGORY_PREFIX}{first_category + number}", category_description='')
+             for number in range(categories)])
+        category_ids = list(Category.objects.filter(category_name__startswith=CATEGORY_PREFIX)
+                            .values_list('id', flat=True))
+        owners = user_objects + [None]
+        for start in range(0, cards, BATCH_SIZE):
+            batch = QuestionText.objects.bulk_create(
+                [QuestionText(question=f"question {number}", answer=f"answer {number}", user=rng.choice(owners))
+                 for number in range(start, min(cards, start + BATCH_SIZE))])
+            QuestionText.categories.through.objects.bulk_create(
+                [QuestionText.categories.through(questiontext_id=card.id, category_id=rng.choice(category_ids))
+                 for card in batch])
+        for user in user_objects:
+            for _ in range(history_sessions):
+                seed_session(user, rng.choice(category_ids), cards_per_session, rng)
+        stats.rebuild()
+    return user_objects
+
+
+def seed_session(user, category_id, cards_per_session, rng):
+    """Finished session with answers and stored summary, started at random time in the last HISTORY_DAYS days.
+    Each flashcard is answered wrong a few times before correct answer"""
+    card_ids = list(QuestionText.objects.available_to(user.id).filter(categories=category_id)
+                    .order_by('?').values_list('id', flat=True)[:cards_per_session])
+    if not card_ids:
+        return
+    session = Session.objects.create(user=user, category_id=category_id, amount_of_cards=len(card_ids))
+    session.start_date = datetime.now(timezone.utc) - timedelta(seconds=rng.randint(0, HISTORY_DAYS * 24 * 3600))
+    date = session.start_date
+    statuses, states = [], []
+    for card_id in card_ids:
+        results = [None] + [0] * rng.randint(0, 2) + [rng.choice((1, 2))]
+        for result in results:
+            date += timedelta(seconds=rng.randint(2, 30))
+            statuses.append(FlashCardsTextStatus(session=session, flash_card_id=card_id, result=result, date=date))
+        states.append(SessionCardState(session=session, flash_card_id=card_id, result=results[-1],
+                                       attempts=len(results) - 1, last_answered=date))
+    FlashCardsTextStatus.objects.bulk_create(statuses)
+    SessionCardState.objects.bulk_create(states)
+    session.finished = True
+    session.cards_learned = len(card_ids)
+    session.learning_time = statuses[-1].date - statuses[0].date
+    session.wrong_answers, session.difficult_answers, session.correct_answers = (
+        sum(status.result == result for status in statuses) for result in (0, 1, 2))
+    session.save(update_fields=['start_date', 'finished', 'cards_learned', 'learning_time', 'wrong_answers',
+                                'difficult_answers', 'correct_answers'])
+
+
+class StepRecorder:
+    """Latency and number of queries of each request, grouped by step of the flow"""
+
+    def __init__(self):
+        self.latency = {step: [] for step in STEPS}
+        self.queries = {step: [] for step in STEPS}
+
+    def request(self, step, method, *args, **kwargs):
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = method(*args, **kwargs)
+            self.latency[step].append((time.perf_counter() - started) * 1000)
+        self.queries[step].append(len(queries))
+        return response
+
+
+class LatencyRecorder:
+    """Latency of each request grouped by step of the flow, for requests made in many threads or coroutines"""
+
+    def __init__(self):
+        self.latency = {step: [] for step in STEPS}
+
+    def request(self, step, method, *args, **kwargs):
+        started = time.perf_counter()
+        response = method(*args, **kwargs)
+        self.latency[step].append((time.perf_counter() - started) * 1000)
+        return response
+
+    async def arequest(self, step, method, *args, **kwargs):
+        started = time.perf_counter()
+        response = await method(*args, **kwargs)
+        self.latency[step].append((time.perf_counter() - started) * 1000)
+        return response
+
+
+def study_session(client, recorder, category_id, cards_per_session, rng, choose_url=None):
+    """One learning session from choosing flashcards to finish page"""
+    response = recorder.request('choose_session', client.post, choose_url or reverse('choose_session'),
+                                {'amount_of_cards': cards_per_session, 'category': category_id})
+    if 'flashcard_question' not in response.url:
+        return
+    question_url = response.url
+    while True:
+        response = recorder.request('flashcard_question', client.get, question_url)
+        if response.status_code == 302:
+            recorder.request('finish_page', client.get, response.url)
+            return
+        answer_url = ANSWER_LINK.search(response.content.decode()).group(0)
+        recorder.request('flashcard_answer', client.post, answer_url, {'result': rng.choice((0, 1, 2, 2))})
+
+
+async def async_study_session(client, recorder, category_id, cards_per_session, rng):
+    """study_session with async views and AsyncClient"""
+    response = await recorder.arequest('choose_session', client.post, reverse('async_choose_session'),
+                                       {'amount_of_cards': cards_per_session, 'category': category_id})
+    if 'flashcard_question' not in response.url:
+        return
+    question_url = response.url
+    while True:
+        response = await recorder.arequest('flashcard_question', client.get, question_url)
+        if response.status_code == 302:
+            await recorder.arequest('finish_page', client.get, response.url)
+            return
+        answer_url = ANSWER_LINK.search(response.content.decode()).group(0)
+        await recorder.arequest('flashcard_answer', client.post, answer_url, {'result': rng.choice((0, 1, 2, 2))})
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seeded_data():
+    """Seeded users and id of seeded categories"""
+    users = list(User.objects.filter(username__startswith=USER_PREFIX))
+    category_ids = list(Category.objects.filter(category_name__startswith=CATEGORY_PREFIX)
+                        .values_list('id', flat=True))
+    if not users or not category_ids:
+        raise ValueError("There is no benchmark data, run seed_benchmark_data command first")
+    return users, category_ids
+
+
+def run_study_flow(sessions, cards_per_session, rng=None, client=None):
+    """Seeded users go through learning sessions, returns results of each step"""
+    rng = rng or random.Random(0)
+    users, category_ids = seeded_data()
+    recorder = StepRecorder()
+    client = client or Client(HTTP_HOST='localhost')
+    for _ in range(sessions):
+        client.force_login(rng.choice(users))
+        study_session(client, recorder, rng.choice(category_ids), cards_per_session, rng)
+    steps = {}
+    for step in STEPS:
+        latency, queries = recorder.latency[step], recorder.queries[step]
+        if not latency:
+            continue
+        steps[step] = {
+            'requests': len(latency),
+            'p50_ms': percentile(latency, 50),
+            'p95_ms': percentile(latency, 95),
+            'p99_ms': percentile(latency, 99),
+            'avg_queries': sum(queries) / len(queries),
+            'max_queries': max(queries),
+        }
+    return {
+        'commit': git_commit(),
+        'date': datetime.now(timezone.utc).isoformat(),
+        'database': connection.vendor,
+        'sessions': sessions,
+        'cards_per_session': cards_per_session,
+        'steps': steps,
+    }
+
+
+def run_wsgi_load(plans, cards_per_session, threads):
+    """Sessions are run by a pool of threads through the WSGI handler, like by a WSGI worker with threads"""
+    recorder, finished, failed = LatencyRecorder(), [], []
+    started = time.perf_counter()
+
+    def run(plan):
+        client, category_id, rng = plan
+        try:
+            study_session(client, recorder, category_id, cards_per_session, rng)
+            finished.append(time.perf_counter() - started)
+        except DatabaseError as error:
+            failed.append(error)
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(run, plans))
+    return recorder, finished, failed, time.perf_counter() - started
+
+
+def run_asgi_load(plans, cards_per_session):
+    """Sessions are run at once in one event loop through the ASGI handler with async views. Each session
+    has its own thread for synchronous code, like each request under ASGI server"""
+    recorder, finished, failed = LatencyRecorder(), [], []
+
+    async def run(plan, started):
+        client, category_id, rng = plan
+        async with ThreadSensitiveContext():
+            try:
+                await async_study_session(client, recorder, category_id, cards_per_session, rng)
+                finished.append(time.perf_counter() - started)
+            except DatabaseError as error:
+                failed.append(error)
+            finally:
+                await sync_to_async(connections.close_all)()
+
+    async def run_all():
+        started = time.perf_counter()
+        await asyncio.gather(*(run(plan, started) for plan in plans))
+        return time.perf_counter() - started
+
+    # event loop runs in a new thread, so its coroutines don't share database connection of this thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        seconds = executor.submit(asyncio.run, run_all()).result()
+    return recorder, finished, failed, seconds
+
+
+def load_results(recorder, finished, failed, seconds):
+    requests = sum(len(latency) for latency in recorder.latency.values())
+    return {
+        'seconds': seconds,
+        'failed_sessions': len(failed),
+        'requests_per_second': requests / seconds if seconds else 0,
+        'session_p95_s': percentile(finished, 95) if finished else None,
+        'steps': {step: {'requests': len(latency), 'p50_ms': percentile(latency, 50),
+                         'p95_ms': percentile(latency, 95)}
+                  for step, latency in recorder.latency.items() if latency},
+    }
+
+
+def run_load_test(sessions, cards_per_session, threads, rng=None, modes=('wsgi', 'asgi')):
+    """The same sessions of seeded users are started at once through WSGI handler with given number
+    of threads and through ASGI handler, returns throughput and latency of each mode. Time of sessions
+    (session_p95_s) includes waiting for a free thread. Sessions failed with database error (e.g. locked
+    SQLite database) are counted"""
+    rng = rng or random.Random(0)
+    users, category_ids = seeded_data()
+    choices = [(rng.choice(users), rng.choice(category_ids), rng.randrange(2 ** 32)) for _ in range(sessions)]
+    results = {
+        'commit': git_commit(),
+        'date': datetime.now(timezone.utc).isoformat(),
+        'database': connection.vendor,
+        'sessions': sessions,
+        'cards_per_session': cards_per_session,
+        'threads': threads,
+    }
+    for mode in modes:
+        client_class = Client if mode == 'wsgi' else AsyncClient
+        plans = []
+        for user, category_id, seed in choices:
+            client = client_class()
+            client.force_login(user)
+            plans.append((client, category_id, random.Random(seed)))
+        # AsyncClient always sends host of test server
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            if mode == 'wsgi':
+                results[mode] = load_results(*run_wsgi_load(plans, cards_per_session, threads))
+            else:
+                results[mode] = load_results(*run_asgi_load(plans, cards_per_session))
+    return results
+
+
+def wsgi_request(handler, path, cookie):
+    """GET request through WSGI handler, returns status"""
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'HTTP_HOST': 'localhost', 'HTTP_COOKIE': cookie}
+    setup_testing_defaults(environ)
+    statuses = []
+    response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        b''.join(response)
+    finally:
+        response.close()
+    return statuses[0]
+
+
+def run_connection_benchmark(requests, threads, path=None):
+    """GET requests of logged seeded user divided between threads, returns throughput and latency
+    with current database settings"""
+    users, _ = seeded_data()
+    client = Client()
+    client.force_login(users[0])
+    cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+    path = path or reverse('choose_session')
+    handler = WSGIHandler()
+    latency, errors = [], []
+
+    def run(number):
+        try:
+            for _ in range(number):
+                started = time.perf_counter()
+                status = wsgi_request(handler, path, cookie)
+                latency.append((time.perf_counter() - started) * 1000)
+                if not status.startswith('200'):
+                    errors.append(status)
+        finally:
+            connections.close_all()
+
+    connections.close_all()
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'localhost']):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(run, [requests // threads + (thread < requests % threads) for thread in range(threads)]))
+        seconds = time.perf_counter() - started
+    database = settings.DATABASES['default']
+    return {
+        'commit': git_commit(),
+        'date': datetime.now(timezone.utc).isoformat(),
+        'engine': database['ENGINE'],
+        'conn_max_age': database.get('CONN_MAX_AGE'),
+        'pool': database.get('POOL'),
+        'path': path,
+        'requests': requests,
+        'threads': threads,
+        'errors': len(errors),
+        'seconds': seconds,
+        'requests_per_second': requests / seconds if seconds else 0,
+        'p50_ms': percentile(latency, 50),
+        'p95_ms': percentile(latency, 95),
+    }
+
+
+def compare(previous, current, threshold=0.2):
+    """Lines describing change of each step, steps slower by more than threshold or with more queries
+    are marked as regression"""
+    lines = []
+    for step, result in current['steps'].items():
+        before = previous['steps'].get(step)
+        if before is None:
+            continue
+        change = result['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0
+        regression = change > threshold or result['max_queries'] > before['max_queries']
+        lines.append(f"{'REGRESSION ' if regression else ''}{step}: p95 {before['p95_ms']:.1f} -> "
+                     f"{result['p95_ms']:.1f} ms ({change:+.0%}), max queries {before['max_queries']} -> "
+                     f"{result['max_queries']}")
+    return lines
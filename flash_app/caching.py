@@ -0,0 +1,138 @@
+"""Cache of rendered GET responses of views, invalidated by versions instead of timeouts.
+
+Each cached view depends on versions of:
+    'categories'  - all categories, bumped when category is added, updated or deleted,
+    'common'      - common flashcards (without user), bumped when they or their categories change,
+    'user:<id>'   - flashcards, answers and schedules of the user.
+Current versions are part of the key of cached response, so a bump makes all responses depending on it
+unreachable at once. Versions are read before the view queries the database and bumped when data is changed
+and again when the transaction is committed, so a response rendered from data being changed is never reached
+with versions from after the change.
+
+Responses can also depend on time (due flashcards), the view gives the time when its response expires.
+Responses rendered from read replicas expire after FLASH_REPLICA_LAG, because a replica can miss the newest
+changes of other users when versions are already bumped.
+Timeout of FLASH_RESPONSE_CACHE_TIMEOUT only frees space of unreachable responses.
+
+Cache is FLASH_RESPONSE_CACHE alias of CACHES setting. Versions must be shared by all processes, so local
+memory cache works for a single process only - check_shared_cache() refuses it when FLASH_WEB_WORKERS > 1.
+"""
+from datetime import timedelta
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib import messages
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+from django.template.response import SimpleTemplateResponse
+from django.utils import timezone
+
+from . import routers
+
+
+def get_cache():
+    return caches[settings.FLASH_RESPONSE_CACHE]
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Versions bumped by one worker process must be seen by others"""
+    backend = settings.CACHES[settings.FLASH_RESPONSE_CACHE]['BACKEND']
+    if backend.endswith('LocMemCache') and settings.FLASH_WEB_WORKERS > 1:
+        return [checks.Error(
+            "Cache of responses is local to each process, other workers would serve stale responses",
+            hint="Use shared cache backend (FileBasedCache, RedisCache, PyMemcacheCache) for FLASH_RESPONSE_CACHE",
+            id='flash_app.E001')]
+    return []
+
+
+def new_version():
+    """Value different from any previous version, also when version was removed from the cache"""
+    return time.time_ns()
+
+
+def versions(dependencies):
+    """Current versions of dependencies, missing versions are created"""
+    cache = get_cache()
+    keys = [f'version:{dependency}' for dependency in dependencies]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, new_version(), timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(*dependencies):
+    """New versions of dependencies now and after commit of current transaction"""
+    def set_versions():
+        get_cache().set_many({f'version:{dependency}': new_version() for dependency in dependencies}, timeout=None)
+    set_versions()
+    transaction.on_commit(set_versions)
+
+
+def user_dependency(user_id):
+    """Dependency of flashcards of the user, or of common flashcards when user_id is None"""
+    return 'common' if user_id is None else f'user:{user_id}'
+
+
+def response_key(name, request, dependencies):
+    version = '.'.join(str(value) for value in versions(dependencies))
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'response:{name}:{request.user.id}:{path}:{version}'
+
+
+def get_response(key):
+    cached = get_cache().get(key)
+    if cached is None:
+        return None
+    expires, response = cached
+    if expires is not None and expires <= timezone.now():
+        return None
+    return response
+
+
+def set_response(key, response, expires=None):
+    timeout = settings.FLASH_RESPONSE_CACHE_TIMEOUT
+    if expires is not None:
+        timeout = min(timeout, max(0, (expires - timezone.now()).total_seconds()))
+    if timeout:
+        get_cache().set(key, (expires, response), timeout=timeout)
+    else:
+        get_cache().delete(key)
+
+
+class CachedResponseMixin:
+    """GET responses of the view are cached for each user, the view is run only when versions of
+    cache_dependencies changed (user dependency is added by the mixin) or the response expired.
+    Responses with messages are not cached"""
+    cache_dependencies = ()
+
+    def get_cache_dependencies(self):
+        return list(self.cache_dependencies) + [user_dependency(self.request.user.id)]
+
+    def get_cache_expiry(self):
+        """Time when response stops being valid, None - valid until versions change"""
+        return None
+
+    def get(self, request, *args, **kwargs):
+        if len(messages.get_messages(request)):
+            return super().get(request, *args, **kwargs)
+        key = response_key(type(self).__name__, request, self.get_cache_dependencies())
+        response = get_response(key)
+        if response is not None:
+            return response
+        response = super().get(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+        expires = self.get_cache_expiry()
+        if routers.reading_replica():
+            replica_expires = timezone.now() + timedelta(seconds=settings.FLASH_REPLICA_LAG)
+            expires = min(expires, replica_expires) if expires else replica_expires
+        if isinstance(response, SimpleTemplateResponse):
+            response.add_post_render_callback(lambda rendered: set_response(key, rendered, expires))
+        else:
+            set_response(key, response, expires)
+        return response
@@ -1,8 +1,52 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
 from django.contrib.auth.models import User
+from django.db import connection, connections
 from django.test import Client
+from django.test.utils import CaptureQueriesContext
 import pytest
 
-from .models import Category, QuestionText, FlashCardsTextStatus, Session, QuestionImage
+from . import answers
+from .models import Category, QuestionText, FlashCardsTextStatus, Session, SessionCardState, QuestionImage, \
+    SessionImage, QuestionImageStatus, SessionImageCardState
+
+
+@pytest.fixture(autouse=True)
+def temporary_cache(settings, tmp_path):
+    """Each test has its own empty cache in temporary directory, cached responses and versions of previous test
+    are not used (ids of objects are used again) and the cache of FLASH_CACHE_DIR is not touched"""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': str(tmp_path / 'cache'),
+        },
+    }
+
+
+@pytest.fixture(autouse=True)
+def answers_written_at_once(settings):
+    """Answers are not kept in the buffer between requests of the test, answers buffered by the test
+    are removed"""
+    settings.FLASH_ANSWER_BUFFER_SIZE = 1
+    yield
+    with answers.lock:
+        answers.buffer.clear()
+        if answers.timer is not None:
+            answers.timer.cancel()
+            answers.timer = None
+
+
+@pytest.fixture
+def replica(settings):
+    """Second connection to the test database used as read replica without lag. Data must be committed
+    (django_db(transaction=True)) to be seen by it"""
+    connections.settings['replica'] = {**connections['default'].settings_dict}
+    settings.FLASH_REPLICA_DATABASES = ['replica']
+    yield connections['replica']
+    connections['replica'].close()
+    del connections['replica']
+    del connections.settings['replica']
 
 
 @pytest.fixture
@@ -81,35 +125,40 @@ def session(user, category, textflashcard, textflashcard_2, textflashcard_3):
         user=user,
     )
     session.flash_cards.set([textflashcard, textflashcard_2, textflashcard_3])
+    for card in (textflashcard, textflashcard_2, textflashcard_3):
+        SessionCardState.objects.create(session=session, flash_card=card)
     return session
 
 
 @pytest.fixture
 def flashcards_status_1(user, session, textflashcard):
-    flashcardsstatus_1 = FlashCardsTextStatus.objects.create(
-        session=session,
-        flash_card=textflashcard,
-        result=2
+    flashcardsstatus_1 = FlashCardsTextStatus.objects.record_result(
+        session_id=session.id,
+        flash_card_id=textflashcard.id,
+        result=2,
+        user_id=user.id
     )
     return flashcardsstatus_1
 
 
 @pytest.fixture
 def flashcards_status_2(user, session, textflashcard_2):
-    flashcardsstatus_2 = FlashCardsTextStatus.objects.create(
-        session=session,
-        flash_card=textflashcard_2,
-        result=0
+    flashcardsstatus_2 = FlashCardsTextStatus.objects.record_result(
+        session_id=session.id,
+        flash_card_id=textflashcard_2.id,
+        result=0,
+        user_id=user.id
     )
     return flashcardsstatus_2
 
 
 @pytest.fixture
 def flashcards_status_3(user, session, textflashcard_3):
-    flashcardsstatus_3 = FlashCardsTextStatus.objects.create(
-        session=session,
-        flash_card=textflashcard_3,
-        result=1
+    flashcardsstatus_3 = FlashCardsTextStatus.objects.record_result(
+        session_id=session.id,
+        flash_card_id=textflashcard_3.id,
+        result=1,
+        user_id=user.id
     )
     return flashcardsstatus_3
 
@@ -124,3 +173,93 @@ def imageflashcard(user, category):
     imageflashcard.categories.set([category])
     return imageflashcard
 
+
+@pytest.fixture
+def imageflashcard_2(user, category):
+    imageflashcard_2 = QuestionImage.objects.create(
+        question="images/lights_3.png",
+        answer="Chile",
+        user=user
+    )
+    imageflashcard_2.categories.set([category])
+    return imageflashcard_2
+
+
+@pytest.fixture
+def session_image(user, category, imageflashcard, imageflashcard_2):
+    session_image = SessionImage.objects.create(
+        amount_of_cards=2,
+        category=category,
+        user=user,
+    )
+    session_image.add_flash_cards([imageflashcard.id, imageflashcard_2.id])
+    return session_image
+
+
+def check_query_budget(queries, limit):
+    if len(queries) > limit:
+        executed = '\n'.join(f"{number}. {query['sql']}" for number, query in enumerate(queries, start=1))
+        pytest.fail(f"{len(queries)} queries executed, budget is {limit}:\n{executed}", pytrace=False)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Test with @pytest.mark.query_budget(n) decorator fails when its body (without fixtures) runs more SQL
+    queries than n"""
+    marker = item.get_closest_marker('query_budget')
+    if marker is None:
+        yield
+        return
+    with CaptureQueriesContext(connection) as queries:
+        yield
+    check_query_budget(queries, marker.args[0])
+
+
+@pytest.fixture
+def query_budget(request):
+    """Context manager failing the test when code in the block runs more SQL queries than the budget.
+    Budget is given as argument, or with @pytest.mark.query_budget(n) decorator of the test"""
+    marker = request.node.get_closest_marker('query_budget')
+
+    @contextmanager
+    def budget(limit=None):
+        if limit is None:
+            if marker is None:
+                raise TypeError("query_budget() needs maximum number of queries as argument "
+                                "or @pytest.mark.query_budget(n) decorator of the test")
+            limit = marker.args[0]
+        with CaptureQueriesContext(connection) as queries:
+            yield queries
+        check_query_budget(queries, limit)
+    return budget
+
+
+@pytest.fixture(params=[5, 500], ids=lambda cards: f"{cards}_cards")
+def study_set(request, category):
+    """Superuser with params cards in text and image learning sessions (half of them answered),
+    the same number of categories and flashcards of the user"""
+    cards = request.param
+    user = User.objects.create_superuser(username="budget_user", password="")
+    Category.objects.bulk_create([Category(category_name=f"Category {number}", category_description="")
+                                  for number in range(cards - 1)])
+    text_cards = QuestionText.objects.bulk_create(
+        [QuestionText(question=f"Question {number}", answer=f"Answer {number}", user=user) for number in range(cards)])
+    image_cards = QuestionImage.objects.bulk_create(
+        [QuestionImage(question=f"images/image_{number}.png", answer=f"Answer {number}", user=user)
+         for number in range(cards)])
+    QuestionText.categories.through.objects.bulk_create(
+        [QuestionText.categories.through(questiontext=card, category=category) for card in text_cards])
+    QuestionImage.categories.through.objects.bulk_create(
+        [QuestionImage.categories.through(questionimage=card, category=category) for card in image_cards])
+    study_set = SimpleNamespace(user=user, category=category, text_card=text_cards[-1], image_card=image_cards[-1])
+    for name, session_model, flash_cards, status_model, state_model in (
+            ('session', Session, text_cards, FlashCardsTextStatus, SessionCardState),
+            ('session_image', SessionImage, image_cards, QuestionImageStatus, SessionImageCardState)):
+        session = session_model.objects.create(amount_of_cards=cards, category=category, user=user)
+        session.add_flash_cards([card.id for card in flash_cards])
+        answered = [card.id for card in flash_cards[:cards // 2]]
+        status_model.objects.bulk_create([status_model(session=session, flash_card_id=card_id, result=2)
+                                          for card_id in answered])
+        state_model.objects.filter(session=session, flash_card_id__in=answered).update(result=2, attempts=1)
+        setattr(study_set, name, session)
+    return study_set
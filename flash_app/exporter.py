@@ -0,0 +1,117 @@
+"""Streaming export of user's flashcards (QuestionText and QuestionImage with categories) and their study history
+(FlashCardsTextStatus records, archived records included) as CSV, JSON Lines or zip bundle with JSON Lines file
+and image files.
+
+Records are read from the database in chunks with server-side cursors (QuerySet.iterator) and written out
+one by one, so the size of the export doesn't change memory usage of the process.
+"""
+import csv
+import json
+import zipfile
+
+from . import archive
+from .models import QuestionText, QuestionImage
+
+FORMATS = (
+    ('csv', 'CSV'),
+    ('jsonl', 'JSON Lines'),
+    ('zip', 'zip with images'),
+)
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'zip': 'application/zip',
+}
+CSV_COLUMNS = ['type', 'id', 'question', 'answer', 'categories', 'session', 'flash_card', 'result', 'date']
+CHUNK_SIZE = 2000
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def records(user):
+    """Dictionaries with text flashcards, image flashcards and answers of the user"""
+    text_cards = QuestionText.objects.filter(user=user).order_by('id').prefetch_related('categories')
+    for card in text_cards.iterator(chunk_size=CHUNK_SIZE):
+        yield {'type': 'text', 'id': card.id, 'question': card.question, 'answer': card.answer,
+               'categories': [category.category_name for category in card.categories.all()]}
+    image_cards = QuestionImage.objects.filter(user=user).order_by('id').prefetch_related('categories')
+    for card in image_cards.iterator(chunk_size=CHUNK_SIZE):
+        yield {'type': 'image', 'id': card.id, 'question': card.question.name, 'answer': card.answer,
+               'categories': [category.category_name for category in card.categories.all()]}
+    for session_id, flash_card_id, result, date in archive.history(session__user=user):
+        yield {'type': 'answer', 'session': session_id, 'flash_card': flash_card_id, 'result': result,
+               'date': date.isoformat()}
+
+
+class Echo:
+    """File-like object returning written value instead of storing it, used to stream csv.writer rows"""
+    def write(self, value):
+        return value
+
+
+def export_csv(user):
+    writer = csv.DictWriter(Echo(), fieldnames=CSV_COLUMNS)
+    yield writer.writeheader()
+    for record in records(user):
+        if 'categories' in record:
+            record = dict(record, categories=';'.join(record['categories']))
+        yield writer.writerow(record)
+
+
+def export_jsonl(user):
+    for record in records(user):
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class ZipStream:
+    """Write-only, not seekable stream for zipfile. Written bytes are collected until they are taken by read"""
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def read(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def export_zip(user):
+    """Zip bundle with flashcards.jsonl and image files of image flashcards, written entry by entry"""
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        with bundle.open('flashcards.jsonl', 'w') as entry:
+            for line in export_jsonl(user):
+                entry.write(line.encode())
+                yield stream.read()
+        written = set()
+        for card in QuestionImage.objects.filter(user=user).order_by('id').only('question').iterator(
+                chunk_size=CHUNK_SIZE):
+            if card.question.name in written:
+                continue
+            written.add(card.question.name)
+            try:
+                image = card.question.open('rb')
+            except FileNotFoundError:
+                continue
+            with image, bundle.open(card.question.name, 'w') as entry:
+                for chunk in image.chunks(FILE_CHUNK_SIZE):
+                    entry.write(chunk)
+                    yield stream.read()
+    yield stream.read()
+
+
+EXPORTERS = {
+    'csv': export_csv,
+    'jsonl': export_jsonl,
+    'zip': export_zip,
+}
+
+
+def export(user, export_format):
+    """Chunks (str or bytes) of the export in given format"""
+    return EXPORTERS[export_format](user)
@@ -4,7 +4,8 @@ from django.core.exceptions import ValidationError
 from django.core.validators import EmailValidator, URLValidator
 from django.forms import ModelForm
 
-from .models import Category, QuestionText, FlashCardsTextStatus
+from .models import Category, QuestionText, FlashCardsTextStatus, QuestionImageStatus, Session, SessionImage
+from .importer import FORMATS
 
 
 class AddCategoryForm(ModelForm):
@@ -26,3 +27,35 @@ class FlashcardTextAnswerForm(ModelForm):
         widgets = {
             'result': forms.Select,
         }
+
+
+class FlashcardImageAnswerForm(ModelForm):
+    class Meta:
+        model = QuestionImageStatus
+        fields = ['result']
+        widgets = {
+            'result': forms.Select,
+        }
+
+
+class StudySessionForm(ModelForm):
+    """Learning session with QuestionText flashcards (choose session views and JSON API)"""
+    amount_of_cards = forms.IntegerField(min_value=1)
+
+    class Meta:
+        model = Session
+        fields = ['amount_of_cards', 'category']
+
+
+class ImageSessionForm(StudySessionForm):
+    """Learning session with QuestionImage flashcards"""
+    class Meta:
+        model = SessionImage
+        fields = ['amount_of_cards', 'category']
+
+
+class ImportFlashcardsForm(forms.Form):
+    file = forms.FileField()
+    format = forms.ChoiceField(choices=(('', 'from file extension'),) + FORMATS, required=False)
+    category = forms.ModelChoiceField(queryset=Category.objects.all(), required=False,
+                                      help_text="for flashcards without categories in the file")
@@ -0,0 +1,100 @@
+"""Derivatives of QuestionImage uploads: small thumbnail for lists and medium size image for study pages,
+both resized with Pillow and saved as WebP.
+
+Derivatives are generated in a pool of worker threads after the upload is committed, so the request
+doesn't wait for image processing. With FLASH_IMAGE_WORKERS = 0 setting they are generated at once
+(used in tests and in backfill command).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+from .models import QuestionImage
+
+logger = logging.getLogger(__name__)
+
+# name of QuestionImage field: longest side of the image in pixels
+SIZES = {
+    'thumbnail': 200,
+    'medium': 800,
+}
+WEBP_QUALITY = 80
+
+executor = None
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=settings.FLASH_IMAGE_WORKERS,
+                                      thread_name_prefix='image-derivatives')
+    return executor
+
+
+def resize(image_file, size):
+    """WebP image with the longest side not bigger than size"""
+    with Image.open(image_file) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        output = BytesIO()
+        image.save(output, 'WEBP', quality=WEBP_QUALITY)
+    return output.getvalue()
+
+
+def generate_derivatives(question_image):
+    """All derivatives of the image are generated and saved on the model. Row of the image is locked while
+    names are replaced, references to previous derivatives are removed, and references to new derivatives
+    are removed at once when the image was deleted in the meantime"""
+    stem = os.path.splitext(os.path.basename(question_image.question.name))[0]
+    with question_image.question.open('rb') as original:
+        for field, size in SIZES.items():
+            original.seek(0)
+            content = resize(original, size)
+            getattr(question_image, field).save(f"{stem}_{field}.webp", ContentFile(content), save=False)
+    with transaction.atomic():
+        previous = QuestionImage.objects.select_for_update().filter(id=question_image.id).values(*SIZES).first()
+        if previous is None:
+            released = [getattr(question_image, field).name for field in SIZES]
+        else:
+            QuestionImage.objects.filter(id=question_image.id).update(
+                **{field: getattr(question_image, field).name for field in SIZES})
+            released = previous.values()
+        storage = question_image.question.storage
+        for name in released:
+            if name:
+                storage.delete(name)
+
+
+def generate_derivatives_task(question_image_id):
+    """Errors are logged, original image is used until derivatives are generated again"""
+    question_image = QuestionImage.objects.filter(id=question_image_id).first()
+    if question_image is None:
+        return
+    try:
+        generate_derivatives(question_image)
+    except Exception:
+        logger.exception("Derivatives of QuestionImage %s were not generated", question_image_id)
+
+
+def worker_task(question_image_id):
+    """Task of worker thread, database connection of the thread is closed when work is done"""
+    try:
+        generate_derivatives_task(question_image_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_derivatives(question_image_id):
+    """Derivatives are generated by worker pool when current transaction is committed"""
+    if settings.FLASH_IMAGE_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(worker_task, question_image_id))
+    else:
+        transaction.on_commit(lambda: generate_derivatives_task(question_image_id))
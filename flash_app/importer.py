@@ -0,0 +1,205 @@
+"""Bulk import of QuestionText flashcards from CSV, JSON, JSON Lines and Anki TSV files.
+
+Files are parsed as a stream of rows {"question", "answer", "categories"} and saved in batches: categories
+of the batch are resolved (or created) with one query, flashcards and their links to categories are saved
+with one bulk insert each. Only one batch is kept in memory, whatever the size of the file. The whole file is
+imported in one transaction, so a file with an invalid row can be fixed and imported again.
+"""
+from collections import Counter
+import csv
+import io
+import json
+import time
+
+from django.db import transaction
+
+from .models import Category, QuestionText
+from . import caching, stats
+
+FORMATS = (
+    ('csv', 'CSV'),
+    ('json', 'JSON'),
+    ('jsonl', 'JSON Lines'),
+    ('tsv', 'Anki TSV'),
+)
+CATEGORY_SEPARATOR = ';'
+CATEGORY_NAME_LENGTH = Category._meta.get_field('category_name').max_length
+BATCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+# the longest JSON flashcard, JSON decode error earlier than this number of characters before the end
+# of the buffer can't be fixed by reading more of the file (e.g. truncated "tru" of true)
+MAX_JSON_FLASHCARD = 1024 * 1024
+TRUNCATED_TAIL = 16
+
+
+class FlashcardImportError(ValueError):
+    """Raised when file can't be parsed"""
+
+
+def guess_format(file_name):
+    """Format of the file from its extension, CSV when extension is unknown"""
+    extension = file_name.rsplit('.', 1)[-1].lower()
+    if extension == 'txt':
+        return 'tsv'
+    return extension if extension in dict(FORMATS) else 'csv'
+
+
+def text_stream(file):
+    """Binary file (e.g. uploaded file) is decoded while it is read"""
+    if isinstance(file, io.TextIOBase):
+        return file
+    return io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+
+
+def split_categories(value):
+    if isinstance(value, (list, tuple)):
+        names = [str(name).strip() for name in value if str(name).strip()]
+    else:
+        names = [name.strip() for name in (value or '').split(CATEGORY_SEPARATOR) if name.strip()]
+    for name in names:
+        if len(name) > CATEGORY_NAME_LENGTH:
+            raise FlashcardImportError(f"Category name longer than {CATEGORY_NAME_LENGTH} characters: {name[:50]}")
+    return names
+
+
+def parse_csv(stream):
+    """CSV file with header: question, answer, categories (separated with ";")"""
+    try:
+        for row in csv.DictReader(stream):
+            yield {'question': row.get('question'), 'answer': row.get('answer'),
+                   'categories': split_categories(row.get('categories'))}
+    except csv.Error as error:
+        raise FlashcardImportError(f"Invalid CSV file: {error}")
+
+
+def parse_tsv(stream):
+    """Anki "Notes in plain text" export: front, back and tags separated with tabs, tags are categories.
+    Lines starting with "#" are Anki headers"""
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('#'):
+            continue
+        fields = line.split('\t')
+        if len(fields) < 2:
+            raise FlashcardImportError(f"Line without answer: {line[:50]}")
+        yield {'question': fields[0], 'answer': fields[1],
+               'categories': split_categories(fields[2].split() if len(fields) > 2 else [])}
+
+
+def parse_jsonl(stream):
+    """One JSON object with question, answer and categories in each line"""
+    for line in stream:
+        if line.strip():
+            yield json_row(json.loads(line))
+
+
+def parse_json(stream):
+    """JSON array of objects with question, answer and categories. The array is decoded object by object
+    from chunks of the file, so the whole file is never loaded into memory. More of the file is read only when
+    the object can be incomplete, up to MAX_JSON_FLASHCARD characters"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if not buffer:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    raise FlashcardImportError("Empty JSON file")
+                buffer += chunk
+                continue
+            if buffer[0] != '[':
+                raise FlashcardImportError("JSON file must contain array of flashcards")
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError as error:
+            if len(buffer) > MAX_JSON_FLASHCARD or error.pos < len(buffer) - TRUNCATED_TAIL \
+                    and not error.msg.startswith('Unterminated string'):
+                raise FlashcardImportError(f"Invalid JSON file: {error.msg}")
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                raise FlashcardImportError("JSON file is not complete")
+            buffer += chunk
+            continue
+        buffer = buffer[end:]
+        yield json_row(obj)
+
+
+def json_row(obj):
+    if not isinstance(obj, dict):
+        raise FlashcardImportError("Each flashcard must be JSON object")
+    return {'question': obj.get('question'), 'answer': obj.get('answer'),
+            'categories': split_categories(obj.get('categories'))}
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'json': parse_json,
+    'jsonl': parse_jsonl,
+    'tsv': parse_tsv,
+}
+
+
+def parse(file, file_format):
+    """Rows of the file in given format"""
+    return PARSERS[file_format](text_stream(file))
+
+
+def batches(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def resolve_categories(names, known):
+    """Id of categories with given names, missing categories are created. known is cache of category ids
+    shared by batches"""
+    missing = set(names) - known.keys()
+    if missing:
+        Category.objects.bulk_create([Category(category_name=name, category_description='') for name in missing],
+                                     ignore_conflicts=True)
+        known.update(Category.objects.filter(category_name__in=missing).values_list('category_name', 'id'))
+    return known
+
+
+def import_flashcards(rows, user=None, default_categories=(), batch_size=BATCH_SIZE, progress=None):
+    """Flashcards are saved in batches in one transaction, so an invalid row leaves no flashcards of the file
+    (rows are kept by the database, not in memory). Flashcards are assigned to user (None for common
+    flashcards). Rows without categories are added to default_categories. progress is called after each batch
+    with number of saved flashcards and time from the start. Returns number of imported flashcards"""
+    known_categories = {}
+    imported = 0
+    started = time.perf_counter()
+    with transaction.atomic():
+        for batch in batches(rows, batch_size):
+            for number, row in enumerate(batch, start=imported + 1):
+                if not row['question'] or not row['answer']:
+                    raise FlashcardImportError(f"Flashcard {number} has no question or answer")
+                if not row['categories']:
+                    row['categories'] = list(default_categories)
+            category_ids = resolve_categories({name for row in batch for name in row['categories']}, known_categories)
+            cards = QuestionText.objects.bulk_create(
+                [QuestionText(question=row['question'], answer=row['answer'], user=user) for row in batch])
+            links = QuestionText.categories.through.objects.bulk_create(
+                [QuestionText.categories.through(questiontext_id=card.id, category_id=category_ids[name])
+                 for card, row in zip(cards, batch) for name in set(row['categories'])])
+            stats.change_by_category(user.id if user else None, Counter(link.category_id for link in links))
+            caching.bump('categories', caching.user_dependency(user.id if user else None))
+            imported += len(batch)
+            if progress:
+                progress(imported, time.perf_counter() - started)
+    return imported
@@ -0,0 +1,186 @@
+"""Cost of requests: number of SQL queries, database time, repeated queries, template render time and wall time.
+
+Measurements of sampled requests (FLASH_INSTRUMENTATION_SAMPLE_RATE setting) are made by InstrumentationMiddleware
+and aggregated in this process per URL name from flashcards/urls.py. After each sampled request the aggregates
+of the process are published to the shared cache (FLASH_RESPONSE_CACHE) under the id of the process, with list
+of ids of processes. Statistics merged from all worker processes with histogram of wall time are available for
+staff users on /instrumentation page. Process added to the list at the same time as other process can be
+missing from it until its next published request.
+
+Queries are counted by execute wrapper installed on connections of all databases (primary, replicas). Metrics
+of the request are found in context variable, which is copied to threads running queries of async views.
+"""
+from collections import Counter
+import contextvars
+import copy
+import os
+import random
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from . import caching
+
+# upper bounds of histogram buckets of wall time in milliseconds
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, float('inf'))
+PROCESSES_KEY = 'instrumentation:processes'
+# seconds statistics of a process are kept after its last published request
+PROCESS_TIMEOUT = 7 * 24 * 3600
+
+
+current = contextvars.ContextVar('instrumentation', default=None)
+
+
+def sampled():
+    """Random decision if request is measured"""
+    return random.random() < settings.FLASH_INSTRUMENTATION_SAMPLE_RATE
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    """Query is counted in metrics of the current request when it is measured"""
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics(execute, sql, params, many, context)
+
+
+def install():
+    """Execute wrapper is added once to connections of all databases in this thread"""
+    for connection in connections.all():
+        if execute_wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(execute_wrapper)
+
+
+class RequestMetrics:
+    """Measurements of one request, used as database execute wrapper to count queries"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+        self.wall_time = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def finish(self):
+        self.wall_time = time.perf_counter() - self.started
+
+    @property
+    def repeated_queries(self):
+        """Number of queries with the same SQL as one of previous queries of the request (N+1 pattern)"""
+        return sum(count - 1 for count in self.statements.values())
+
+    def server_timing(self):
+        """Value of Server-Timing header"""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries, {self.repeated_queries} repeated"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.wall_time * 1000:.1f}',
+        ])
+
+
+class ViewStats:
+    """Aggregated measurements of requests to one URL"""
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.repeated_queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.wall_time = 0.0
+        self.histogram = [0] * len(BUCKETS)
+
+    def add(self, metrics):
+        self.requests += 1
+        self.queries += metrics.queries
+        self.max_queries = max(self.max_queries, metrics.queries)
+        self.repeated_queries += metrics.repeated_queries
+        self.db_time += metrics.db_time
+        self.template_time += metrics.template_time
+        self.wall_time += metrics.wall_time
+        wall_time_ms = metrics.wall_time * 1000
+        self.histogram[next(index for index, bound in enumerate(BUCKETS) if wall_time_ms <= bound)] += 1
+
+    def merge(self, other):
+        """Statistics of the same URL from other process are added"""
+        self.requests += other.requests
+        self.queries += other.queries
+        self.max_queries = max(self.max_queries, other.max_queries)
+        self.repeated_queries += other.repeated_queries
+        self.db_time += other.db_time
+        self.template_time += other.template_time
+        self.wall_time += other.wall_time
+        self.histogram = [count + other_count for count, other_count in zip(self.histogram, other.histogram)]
+
+    def as_dict(self):
+        return {
+            'requests': self.requests,
+            'avg_queries': self.queries / self.requests,
+            'max_queries': self.max_queries,
+            'avg_repeated_queries': self.repeated_queries / self.requests,
+            'avg_db_ms': self.db_time * 1000 / self.requests,
+            'avg_template_ms': self.template_time * 1000 / self.requests,
+            'avg_wall_ms': self.wall_time * 1000 / self.requests,
+            'wall_ms_histogram': {('inf' if bound == float('inf') else str(bound)): count
+                                  for bound, count in zip(BUCKETS, self.histogram)},
+        }
+
+
+stats = {}
+stats_lock = threading.Lock()
+
+
+def process_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def process_key(process):
+    return f'instrumentation:process:{process}'
+
+
+def record(url_name, metrics):
+    with stats_lock:
+        stats.setdefault(url_name, ViewStats()).add(metrics)
+        published = copy.deepcopy(stats)
+    publish(published)
+
+
+def publish(process_stats):
+    """Statistics of this process are stored in the shared cache, the process is added to the list of processes"""
+    cache, process = caching.get_cache(), process_id()
+    cache.set(process_key(process), process_stats, timeout=PROCESS_TIMEOUT)
+    processes = cache.get(PROCESSES_KEY, set())
+    if process not in processes:
+        cache.set(PROCESSES_KEY, processes | {process}, timeout=None)
+
+
+def snapshot():
+    """Aggregated statistics of each URL name merged from all processes"""
+    merged = {}
+    cache = caching.get_cache()
+    for process_stats in cache.get_many([process_key(process) for process in cache.get(PROCESSES_KEY, ())]).values():
+        for url_name, view_stats in process_stats.items():
+            merged.setdefault(url_name, ViewStats()).merge(view_stats)
+    return {url_name: view_stats.as_dict() for url_name, view_stats in sorted(merged.items())}
+
+
+def reset():
+    """Statistics of this process and published statistics of all processes are removed"""
+    with stats_lock:
+        stats.clear()
+    cache = caching.get_cache()
+    cache.delete_many([process_key(process) for process in cache.get(PROCESSES_KEY, ())] + [PROCESSES_KEY])
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from flash_app import archive
+
+
+class Command(BaseCommand):
+    help = "Moves study history of finished learning sessions started more than --days days ago " \
+           "from FlashCardsTextStatus to the archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="age of archived sessions, FLASH_ARCHIVE_AFTER_DAYS by default")
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE,
+                            help="number of sessions moved in one transaction")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days']) if options['days'] is not None else None
+        moved = archive.archive(before, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{moved} records archived"))
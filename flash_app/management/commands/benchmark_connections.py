@@ -0,0 +1,63 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from flash_app import benchmark
+
+# FLASH_DB_* environment variables of compared database connection settings
+CONFIGURATIONS = {
+    'connection per request': {'FLASH_DB_CONN_MAX_AGE': '0', 'FLASH_DB_POOL_SIZE': '0'},
+    'persistent connections': {'FLASH_DB_CONN_MAX_AGE': '60', 'FLASH_DB_POOL_SIZE': '0'},
+    'connection pool': {'FLASH_DB_POOL_SIZE': None, 'FLASH_DB_POOL_MIN_SIZE': None},
+}
+
+
+class Command(BaseCommand):
+    help = "Measures throughput of GET requests sent through WSGI handler from many threads with data generated " \
+           "by seed_benchmark_data command and current database settings (FLASH_DB_* environment variables). " \
+           "With --compare runs the benchmark without persistent connections, with persistent connections " \
+           "and with connection pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--path', help="requested path (default choose_session page)")
+        parser.add_argument('--compare', action='store_true', help="compare database connection settings")
+        parser.add_argument('--output', help="JSON file for results")
+
+    def handle(self, *args, **options):
+        if options['compare']:
+            results = {name: self.run_configuration(environ, options) for name, environ in CONFIGURATIONS.items()}
+        else:
+            try:
+                results = {'current settings': benchmark.run_connection_benchmark(
+                    options['requests'], options['threads'], options['path'])}
+            except ValueError as error:
+                raise CommandError(error)
+        for name, result in results.items():
+            self.stdout.write(f"{name:<24} {result['requests_per_second']:>8.1f} requests/s, "
+                              f"p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, "
+                              f"{result['errors']} errors ({result['engine']}, CONN_MAX_AGE {result['conn_max_age']}, "
+                              f"pool {result['pool']})")
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
+
+    def run_configuration(self, environ, options):
+        """Benchmark in new process with given environment variables, pool has a connection for each thread"""
+        environ = {name: value or str(options['threads']) for name, value in environ.items()}
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            command = [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_connections',
+                       '--requests', str(options['requests']), '--threads', str(options['threads']),
+                       '--output', output.name]
+            if options['path']:
+                command += ['--path', options['path']]
+            process = subprocess.run(command, env={**os.environ, **environ}, capture_output=True, text=True)
+            if process.returncode:
+                raise CommandError(process.stderr)
+            return json.load(output)['current settings']
@@ -0,0 +1,66 @@
+from datetime import timedelta
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from flash_app.models import Category, QuestionText, CardSchedule, DueCard
+from flash_app import scheduler
+
+
+class Rollback(Exception):
+    """Raised to roll back benchmark data"""
+
+
+class Command(BaseCommand):
+    help = "Measures how long choosing flashcards for a session takes for users with growing number of flashcards. " \
+           "Benchmark data is created in a transaction which is rolled back at the end."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+                            help="numbers of scheduled flashcards of the user")
+        parser.add_argument('--session-size', type=int, default=20)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'cards':>10} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    timings = self.measure(size, options)
+                    raise Rollback
+            except Rollback:
+                pass
+            timings.sort()
+            self.stdout.write(f"{size:>10} {statistics.median(timings):>10.3f} "
+                              f"{timings[int(len(timings) * 0.95) - 1]:>10.3f} {timings[-1]:>10.3f}")
+
+    def measure(self, size, options):
+        batch_size = options['batch_size']
+        user = User.objects.create_user(username=f"benchmark_due_queue_{size}")
+        category = Category.objects.create(category_name=f"benchmark due queue {size}", category_description="")
+        now = timezone.now()
+        for start in range(0, size, batch_size):
+            count = min(batch_size, size - start)
+            cards = QuestionText.objects.bulk_create(
+                [QuestionText(question=f"question {number}", answer="", user=user)
+                 for number in range(start, start + count)])
+            QuestionText.categories.through.objects.bulk_create(
+                [QuestionText.categories.through(questiontext_id=card.id, category_id=category.id) for card in cards])
+            # half of flashcards is overdue, half is due in future
+            due_dates = [now + timedelta(minutes=(number % 1000) - 500) for number in range(start, start + count)]
+            CardSchedule.objects.bulk_create(
+                [CardSchedule(user=user, flash_card=card, due_date=due_date) for card, due_date in zip(cards, due_dates)])
+            DueCard.objects.bulk_create(
+                [DueCard(user=user, category=category, flash_card=card, due_date=due_date)
+                 for card, due_date in zip(cards, due_dates)])
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            scheduler.session_card_ids(user.id, category, options['session_size'], now)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
@@ -0,0 +1,36 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flash_app import benchmark
+
+
+class Command(BaseCommand):
+    help = "Measures latency (p50/p95/p99) and number of queries of each step of learning session " \
+           "with data generated by seed_benchmark_data command. Results are saved as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=20)
+        parser.add_argument('--cards-per-session', type=int, default=20)
+        parser.add_argument('--output', help="JSON file for results")
+        parser.add_argument('--compare', help="JSON file with results of previous run")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            results = benchmark.run_study_flow(options['sessions'], options['cards_per_session'],
+                                               rng=random.Random(options['seed']))
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(f"{'step':<20} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+        for step, result in results['steps'].items():
+            self.stdout.write(f"{step:<20} {result['requests']:>8} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+                              f"{result['p99_ms']:>8.1f} {result['max_queries']:>8}")
+        if options['compare']:
+            with open(options['compare']) as file:
+                for line in benchmark.compare(json.load(file), results):
+                    self.stdout.write(self.style.ERROR(line) if line.startswith('REGRESSION') else line)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
@@ -0,0 +1,31 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from flash_app import exporter
+
+
+class Command(BaseCommand):
+    help = "Exports flashcards of user with their categories and study history as CSV, JSON Lines or zip bundle"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--format', choices=[name for name, _ in exporter.FORMATS], default='jsonl')
+        parser.add_argument('--output', help="path of the file, standard output by default")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+        if options['output']:
+            output = open(options['output'], 'wb')
+        else:
+            output = sys.stdout.buffer
+        try:
+            for chunk in exporter.export(user, options['format']):
+                output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        finally:
+            if options['output']:
+                output.close()
@@ -0,0 +1,26 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from flash_app import images
+from flash_app.models import QuestionImage
+
+
+class Command(BaseCommand):
+    help = "Generates thumbnails and medium size WebP images of QuestionImage flashcards which don't have them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="generate derivatives of all images again")
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        question_images = QuestionImage.objects.all()
+        if not options['all']:
+            question_images = question_images.filter(Q(thumbnail='') | Q(medium=''))
+        ids = list(question_images.order_by('id').values_list('id', flat=True))
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for done, _ in enumerate(executor.map(images.worker_task, ids), start=1):
+                if done % 100 == 0:
+                    self.stdout.write(f"{done}/{len(ids)} images")
+        self.stdout.write(self.style.SUCCESS(f"Derivatives of {len(ids)} images generated"))
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from flash_app import importer
+
+
+class Command(BaseCommand):
+    help = "Imports QuestionText flashcards from CSV, JSON, JSON Lines or Anki TSV file in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=[name for name, _ in importer.FORMATS],
+                            help="format of the file, by default taken from file extension")
+        parser.add_argument('--user', help="username of flashcards owner, without it flashcards are common")
+        parser.add_argument('--category', action='append', default=[],
+                            help="category of flashcards which don't have categories in the file")
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+        file_format = options['format'] or importer.guess_format(options['path'])
+        with open(options['path'], 'rb') as file:
+            try:
+                imported = importer.import_flashcards(importer.parse(file, file_format), user=user,
+                                                      default_categories=options['category'],
+                                                      batch_size=options['batch_size'], progress=self.progress)
+            except (importer.FlashcardImportError, ValueError) as error:
+                raise CommandError(error)
+        self.stdout.write(self.style.SUCCESS(f"{imported} flashcards imported"))
+
+    def progress(self, imported, elapsed):
+        self.stdout.write(f"{imported} flashcards imported in {elapsed:.1f} s ({imported / (elapsed or 1):.0f}/s)")
@@ -0,0 +1,39 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from flash_app import benchmark
+
+
+class Command(BaseCommand):
+    help = "Starts many learning sessions at once with data generated by seed_benchmark_data command, through " \
+           "WSGI handler with a pool of threads and through ASGI handler with async views, and compares " \
+           "their throughput and latency. Use a database allowing concurrent writes (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=50, help="sessions started at once")
+        parser.add_argument('--cards-per-session', type=int, default=10)
+        parser.add_argument('--threads', type=int, default=4, help="threads of WSGI worker")
+        parser.add_argument('--mode', choices=('wsgi', 'asgi'), action='append',
+                            help="run only given mode (can be repeated)")
+        parser.add_argument('--output', help="JSON file for results")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        modes = options['mode'] or ('wsgi', 'asgi')
+        try:
+            results = benchmark.run_load_test(options['sessions'], options['cards_per_session'], options['threads'],
+                                              rng=random.Random(options['seed']), modes=modes)
+        except ValueError as error:
+            raise CommandError(error)
+        for mode in modes:
+            result = results[mode]
+            self.stdout.write(f"{mode}: {result['seconds']:.2f} s, {result['requests_per_second']:.1f} requests/s, "
+                              f"session p95 {result['session_p95_s'] or 0:.2f} s, {result['failed_sessions']} failed sessions")
+            for step, step_result in result['steps'].items():
+                self.stdout.write(f"    {step:<20} {step_result['requests']:>8} p50 {step_result['p50_ms']:>8.1f} ms "
+                                  f"p95 {step_result['p95_ms']:>8.1f} ms")
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, indent=2)
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from flash_app import caching, stats
+
+
+class Command(BaseCommand):
+    help = "Counts cached numbers of flashcards and mastered flashcards in categories (CategoryStats) again"
+
+    def handle(self, *args, **options):
+        stats.rebuild()
+        caching.bump('categories')
+        self.stdout.write(self.style.SUCCESS("Category stats rebuilt"))
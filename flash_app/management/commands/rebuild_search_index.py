@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from flash_app import search
+
+
+class Command(BaseCommand):
+    help = "Creates missing full-text search structures (e.g. SQLite triggers dropped by table rebuild) " \
+           "and indexes all flashcards and categories again"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        search.install(connections[options['database']])
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt"))
@@ -0,0 +1,24 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from flash_app import benchmark
+
+
+class Command(BaseCommand):
+    help = "Generates synthetic users, categories, QuestionText flashcards and learning history for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--categories', type=int, default=5)
+        parser.add_argument('--cards', type=int, default=10000)
+        parser.add_argument('--history-sessions', type=int, default=20, help="finished sessions of each user")
+        parser.add_argument('--cards-per-session', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        users = benchmark.seed(options['users'], options['categories'], options['cards'],
+                               options['history_sessions'], options['cards_per_session'],
+                               rng=random.Random(options['seed']))
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(users)} users, {options['categories']} categories and {options['cards']} flashcards created"))
@@ -0,0 +1,68 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+
+from . import instrumentation
+
+
+class InstrumentationMiddleware:
+    """Measures sampled requests (see instrumentation.py) and adds Server-Timing header to their responses.
+    Template render time is measured for TemplateResponse, templates rendered with render() shortcut are
+    counted as time of the view. Under ASGI requests are measured in async mode, so async views are not
+    switched to sync mode, their queries run in other thread are counted with metrics from context variable"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not instrumentation.sampled():
+            return self.get_response(request)
+        instrumentation.install()
+        metrics = self.start(request)
+        token = instrumentation.current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            instrumentation.current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not instrumentation.sampled():
+            return await self.get_response(request)
+        # queries of the request run in the thread of sync_to_async calls (thread sensitive)
+        await sync_to_async(instrumentation.install)()
+        metrics = self.start(request)
+        token = instrumentation.current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            instrumentation.current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self, request):
+        metrics = instrumentation.RequestMetrics()
+        request.instrumentation = metrics
+        return metrics
+
+    def finish(self, request, response, metrics):
+        metrics.finish()
+        response['Server-Timing'] = metrics.server_timing()
+        match = request.resolver_match
+        instrumentation.record(match.view_name if match else 'unresolved', metrics)
+        return response
+
+    def process_template_response(self, request, response):
+        metrics = getattr(request, 'instrumentation', None)
+        if metrics is not None:
+            render_started = time.perf_counter()
+
+            def rendered(response):
+                metrics.template_time += time.perf_counter() - render_started
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.1 on 2026-10-18 10:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_card_states(apps, schema_editor):
+    """Current state of flashcards in existing sessions is replayed from FlashCardsTextStatus records"""
+    FlashCardsTextStatus = apps.get_model('flash_app', 'FlashCardsTextStatus')
+    SessionCardState = apps.get_model('flash_app', 'SessionCardState')
+    states = {}
+    for status in FlashCardsTextStatus.objects.filter(session__isnull=False).order_by('date', 'id').iterator():
+        key = (status.session_id, status.flash_card_id)
+        state = states.setdefault(key, SessionCardState(session_id=status.session_id,
+                                                        flash_card_id=status.flash_card_id))
+        state.result = status.result
+        if status.result is not None:
+            state.attempts += 1
+            state.last_answered = status.date
+    SessionCardState.objects.bulk_create(states.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0004_questionimage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionCardState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result', models.IntegerField(choices=[(0, 'WRONG'), (1, 'Correct but difficult'), (2, 'CORRECT')], null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_answered', models.DateTimeField(null=True)),
+                ('flash_card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.questiontext')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='card_states', to='flash_app.session')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='sessioncardstate',
+            constraint=models.UniqueConstraint(fields=('session', 'flash_card'), name='unique_session_card_state'),
+        ),
+        migrations.RunPython(build_card_states, migrations.RunPython.noop),
+    ]
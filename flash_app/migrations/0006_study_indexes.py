@@ -0,0 +1,31 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0005_sessioncardstate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flashcardstextstatus',
+            index=models.Index(fields=['session', 'flash_card', '-date'], name='status_session_card_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questiontext',
+            index=models.Index(condition=models.Q(('user__isnull', True)), fields=['id'], name='questiontext_common_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['user', 'start_date'], name='session_user_start_idx'),
+        ),
+        # flashcards of category are looked up through the ManyToMany table starting from category_id
+        migrations.RunSQL(
+            'CREATE INDEX questiontext_categories_category_card_idx '
+            'ON flash_app_questiontext_categories (category_id, questiontext_id)',
+            'DROP INDEX questiontext_categories_category_card_idx',
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0006_study_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='cards_learned',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='correct_answers',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='difficult_answers',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='finished',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='learning_time',
+            field=models.DurationField(null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='wrong_answers',
+            field=models.IntegerField(null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flash_app', '0007_session_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CardSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ease', models.FloatField(default=2.5)),
+                ('interval', models.IntegerField(default=0)),
+                ('repetitions', models.IntegerField(default=0)),
+                ('due_date', models.DateTimeField()),
+                ('flash_card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.questiontext')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'due_date'], name='schedule_user_due_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cardschedule',
+            constraint=models.UniqueConstraint(fields=('user', 'flash_card'), name='unique_card_schedule'),
+        ),
+    ]
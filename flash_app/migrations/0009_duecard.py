@@ -0,0 +1,50 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_due_queue(apps, schema_editor):
+    """Existing schedules are put in the queue of each category of the flashcard"""
+    CardSchedule = apps.get_model('flash_app', 'CardSchedule')
+    DueCard = apps.get_model('flash_app', 'DueCard')
+    QuestionTextCategories = apps.get_model('flash_app', 'QuestionText').categories.through
+    categories = {}
+    for card_id, category_id in QuestionTextCategories.objects.values_list('questiontext_id', 'category_id').iterator():
+        categories.setdefault(card_id, []).append(category_id)
+    due_cards = []
+    for schedule in CardSchedule.objects.iterator():
+        for category_id in categories.get(schedule.flash_card_id, []):
+            due_cards.append(DueCard(user_id=schedule.user_id, category_id=category_id,
+                                     flash_card_id=schedule.flash_card_id, due_date=schedule.due_date))
+    DueCard.objects.bulk_create(due_cards, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flash_app', '0008_cardschedule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DueCard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_date', models.DateTimeField()),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.category')),
+                ('flash_card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.questiontext')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'category', 'due_date'], name='duecard_user_category_due_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='duecard',
+            constraint=models.UniqueConstraint(fields=('user', 'category', 'flash_card'), name='unique_due_card'),
+        ),
+        migrations.RunPython(fill_due_queue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0009_duecard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionimage',
+            name='medium',
+            field=models.ImageField(blank=True, upload_to='images/derivatives/'),
+        ),
+        migrations.AddField(
+            model_name='questionimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, upload_to='images/derivatives/'),
+        ),
+    ]
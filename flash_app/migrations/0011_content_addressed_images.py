@@ -0,0 +1,37 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:16
+
+from django.db import migrations, models
+import flash_app.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0010_questionimage_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('references', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='questionimage',
+            name='medium',
+            field=models.ImageField(blank=True, storage=flash_app.storage.get_image_storage, upload_to='images/derivatives/'),
+        ),
+        migrations.AlterField(
+            model_name='questionimage',
+            name='question',
+            field=models.ImageField(storage=flash_app.storage.get_image_storage, upload_to='images/'),
+        ),
+        migrations.AlterField(
+            model_name='questionimage',
+            name='thumbnail',
+            field=models.ImageField(blank=True, storage=flash_app.storage.get_image_storage, upload_to='images/derivatives/'),
+        ),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flash_app', '0011_content_addressed_images'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuestionImageStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result', models.IntegerField(choices=[(0, 'WRONG'), (1, 'Correct but difficult'), (2, 'CORRECT')], null=True)),
+                ('date', models.DateTimeField(auto_now=True)),
+                ('flash_card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.questionimage')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SessionImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateTimeField(auto_now_add=True)),
+                ('amount_of_cards', models.IntegerField()),
+                ('finished', models.BooleanField(default=False)),
+                ('cards_learned', models.IntegerField(null=True)),
+                ('learning_time', models.DurationField(null=True)),
+                ('wrong_answers', models.IntegerField(null=True)),
+                ('difficult_answers', models.IntegerField(null=True)),
+                ('correct_answers', models.IntegerField(null=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.category')),
+                ('flash_cards', models.ManyToManyField(through='flash_app.QuestionImageStatus', to='flash_app.questionimage')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SessionImageCardState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result', models.IntegerField(choices=[(0, 'WRONG'), (1, 'Correct but difficult'), (2, 'CORRECT')], null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_answered', models.DateTimeField(null=True)),
+                ('flash_card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.questionimage')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='card_states', to='flash_app.sessionimage')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='questionimagestatus',
+            name='session',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='flash_app.sessionimage'),
+        ),
+        migrations.AddConstraint(
+            model_name='sessionimagecardstate',
+            constraint=models.UniqueConstraint(fields=('session', 'flash_card'), name='unique_session_image_card_state'),
+        ),
+        migrations.AddIndex(
+            model_name='sessionimage',
+            index=models.Index(fields=['user', 'start_date'], name='sessionimage_user_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questionimagestatus',
+            index=models.Index(fields=['session', 'flash_card', '-date'], name='imgstatus_session_card_idx'),
+        ),
+    ]
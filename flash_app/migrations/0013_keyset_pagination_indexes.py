@@ -0,0 +1,21 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0012_image_sessions'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='questionimage',
+            index=models.Index(fields=['user', 'question', 'id'], name='image_user_question_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='questiontext',
+            index=models.Index(fields=['user', 'question', 'id'], name='text_user_question_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+from flash_app import search
+
+
+def install_search(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0013_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        # tsvector column with GIN index on PostgreSQL, FTS5 table with triggers on SQLite (see search.py)
+        migrations.RunPython(install_search, uninstall_search),
+    ]
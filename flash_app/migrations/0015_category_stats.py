@@ -0,0 +1,41 @@
+# Generated by Django 4.2.1 on 2026-10-18 11:39
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from flash_app import stats
+
+
+def count_category_stats(apps, schema_editor):
+    stats.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('flash_app', '0014_full_text_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cards', models.IntegerField(default=0)),
+                ('mastered_cards', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.category')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='categorystats',
+            constraint=models.UniqueConstraint(fields=('user', 'category'), name='unique_category_stats'),
+        ),
+        migrations.AddConstraint(
+            model_name='categorystats',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('category',), name='unique_common_category_stats'),
+        ),
+        migrations.RunPython(count_category_stats, migrations.RunPython.noop),
+    ]
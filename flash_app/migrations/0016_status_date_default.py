@@ -0,0 +1,24 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:13
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0015_category_stats'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='flashcardstextstatus',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='questionimagestatus',
+            name='date',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
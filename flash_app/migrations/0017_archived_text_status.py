@@ -0,0 +1,32 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from flash_app import archive
+
+
+def install_archive(apps, schema_editor):
+    archive.install(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0016_status_date_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTextStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('result', models.SmallIntegerField(choices=[(0, 'WRONG'), (1, 'Correct but difficult'), (2, 'CORRECT')], null=True)),
+                ('date', models.DateTimeField()),
+                ('flash_card', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.questiontext')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='flash_app.session')),
+            ],
+        ),
+        # table partitioned by month on PostgreSQL (see archive.py)
+        migrations.RunPython(install_archive, migrations.RunPython.noop),
+    ]
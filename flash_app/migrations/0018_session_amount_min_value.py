@@ -0,0 +1,24 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:34
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0017_archived_text_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='session',
+            name='amount_of_cards',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AlterField(
+            model_name='sessionimage',
+            name='amount_of_cards',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+    ]
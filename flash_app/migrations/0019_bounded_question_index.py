@@ -0,0 +1,22 @@
+# Generated by Django 4.2.1 on 2026-10-18 12:40
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flash_app', '0018_session_amount_min_value'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='questiontext',
+            name='text_user_question_idx',
+        ),
+        migrations.AddIndex(
+            model_name='questiontext',
+            index=models.Index(models.F('user'), django.db.models.functions.text.Substr('question', 1, 100), models.F('id'), name='text_user_question_key_idx'),
+        ),
+    ]
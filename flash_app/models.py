@@ -1,5 +1,12 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Min, Q, Sum
+from django.db.models.functions import Substr
 from django.contrib.auth.models import User
+from django.core.validators import MinValueValidator
+from django.utils import timezone
+from datetime import timedelta
+
+from .storage import get_image_storage
 
 
 RESULTS = (
@@ -7,6 +14,8 @@ RESULTS = (
     (1, 'Correct but difficult'),
     (2, 'CORRECT'),
 )
+# flashcards of session which are not answered yet or were answered as wrong
+PENDING = Q(result__isnull=True) | Q(result=0)
 
 
 class Category(models.Model):
@@ -18,6 +27,22 @@ class Category(models.Model):
         return f"{self.category_name}"
 
 
+class FlashcardQuerySet(models.QuerySet):
+    """Queries over QuestionText and QuestionImage flashcards"""
+
+    def available_to(self, user_id):
+        """Flashcards created by the user and flashcards placed in database without assigned user"""
+        return self.filter(Q(user_id=user_id) | Q(user_id__isnull=True))
+
+
+# length of prefix of the question ordering flashcards lists
+QUESTION_KEY_LENGTH = 100
+
+
+def question_key():
+    return Substr('question', 1, QUESTION_KEY_LENGTH)
+
+
 class QuestionText(models.Model):
     """Flashcards with text question and text answer"""
     question = models.TextField()
@@ -25,44 +50,305 @@ class QuestionText(models.Model):
     categories = models.ManyToManyField(Category)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
 
+    objects = FlashcardQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], condition=Q(user__isnull=True), name='questiontext_common_idx'),
+            # keyset pagination of flashcards list (see pagination.py) on prefix of the question, so long
+            # questions fit in the index entry
+            models.Index(F('user'), question_key(), F('id'), name='text_user_question_key_idx'),
+        ]
+
 
-class FlashCardsTextStatus(models.Model):
+class CardStatusQuerySet(models.QuerySet):
+    """Queries over the status log of learning sessions"""
+
+    def record_result(self, session_id, flash_card_id, result, user_id):
+        """New record is appended to the log and current state of the flashcard in session of the user
+        is updated in the same transaction (one answer of record_results). Raises DoesNotExist of state model
+        when the flashcard is not in the session of the user"""
+        return self.record_results(session_id, [(flash_card_id, result)], user_id)[0]
+
+    def record_results(self, session_id, results, user_id):
+        """Batch of (flash_card_id, result) answers in session of the user is appended to the log and states
+        of flashcards are updated, with the same number of queries for any size of the batch. Raises
+        DoesNotExist of state model when a flashcard is not in the session of the user"""
+        state_model = self.model.session.field.related_model.state_model()
+        with transaction.atomic():
+            states = {state.flash_card_id: state for state in state_model.objects.select_for_update().filter(
+                session_id=session_id, session__user_id=user_id,
+                flash_card_id__in={flash_card_id for flash_card_id, _ in results})}
+            if len(states) < len({flash_card_id for flash_card_id, _ in results}):
+                raise state_model.DoesNotExist("Flashcard is not in the learning session of the user")
+            statuses = self.bulk_create([self.model(session_id=session_id, flash_card_id=flash_card_id,
+                                                    result=result) for flash_card_id, result in results])
+            for status in statuses:
+                state = states[status.flash_card_id]
+                state.result, state.attempts, state.last_answered = status.result, state.attempts + 1, status.date
+            state_model.objects.bulk_update(states.values(), ['result', 'attempts', 'last_answered'])
+        return statuses
+
+
+class CardStatus(models.Model):
+    """Base of models recording results of each learning session, subclasses add session and flash_card"""
+    result = models.IntegerField(choices=RESULTS, null=True)
+    # time of the answer, given by answers buffer which writes records later
+    date = models.DateTimeField(default=timezone.now, editable=False)
+
+    objects = CardStatusQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+
+class FlashCardsTextStatus(CardStatus):
     """Model to record results of each learning session for QuestionText objects"""
     session = models.ForeignKey("Session", on_delete=models.CASCADE, null=True)
     flash_card = models.ForeignKey(QuestionText, on_delete=models.CASCADE)
-    result = models.IntegerField(choices=RESULTS, null=True)
-    date = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'flash_card', '-date'], name='status_session_card_date_idx'),
+        ]
 
-class Session(models.Model):
-    """Model to create learning session for QuestionText objects"""
+
+class ArchivedTextStatus(models.Model):
+    """FlashCardsTextStatus records of old finished sessions moved by archive.py, with the same ids. Only
+    foreign key indexes are kept, on PostgreSQL the table is partitioned by month of the answer"""
+    session = models.ForeignKey("Session", on_delete=models.CASCADE)
+    flash_card = models.ForeignKey(QuestionText, on_delete=models.CASCADE)
+    result = models.SmallIntegerField(choices=RESULTS, null=True)
+    date = models.DateTimeField()
+
+
+class LearningSession(models.Model):
+    """Base of learning session models, subclasses add flash_cards ManyToMany field with "through" status model
+    and state model with ForeignKey to session named card_states"""
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     start_date = models.DateTimeField(auto_now_add=True)
+    amount_of_cards = models.IntegerField(validators=[MinValueValidator(1)])
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    # summary stored when session is finished
+    finished = models.BooleanField(default=False)
+    cards_learned = models.IntegerField(null=True)
+    learning_time = models.DurationField(null=True)
+    wrong_answers = models.IntegerField(null=True)
+    difficult_answers = models.IntegerField(null=True)
+    correct_answers = models.IntegerField(null=True)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def status_model(cls):
+        return cls.flash_cards.through
+
+    @classmethod
+    def state_model(cls):
+        return cls.card_states.field.model
+
+    def add_flash_cards(self, flash_card_ids):
+        """Flashcards are put in "through" table with result "None" and get their current state record,
+        each table is filled with one bulk insert"""
+        status_model, state_model = self.status_model(), self.state_model()
+        status_model.objects.bulk_create(
+            [status_model(session=self, flash_card_id=card_id, result=None) for card_id in flash_card_ids])
+        state_model.objects.bulk_create(
+            [state_model(session=self, flash_card_id=card_id) for card_id in flash_card_ids])
+
+    def update_summary(self):
+        """Summary is counted from status records in one query. When there are no pending flashcards and
+        all answers counted in states of flashcards are in status records (answers buffered by other processes
+        are written), session is finished and summary is saved, so later it is read together with the session"""
+        if self.finished:
+            return
+        summary = self.status_model().objects.filter(session=self).aggregate(
+            cards_learned=Count('flash_card', distinct=True),
+            first_date=Min('date'),
+            last_date=Max('date'),
+            wrong_answers=Count('id', filter=Q(result=0)),
+            difficult_answers=Count('id', filter=Q(result=1)),
+            correct_answers=Count('id', filter=Q(result=2)),
+        )
+        self.cards_learned = summary['cards_learned']
+        self.learning_time = summary['last_date'] - summary['first_date'] if summary['first_date'] else timedelta(0)
+        self.wrong_answers = summary['wrong_answers']
+        self.difficult_answers = summary['difficult_answers']
+        self.correct_answers = summary['correct_answers']
+        states = self.card_states.aggregate(pending=Count('id', filter=PENDING), attempts=Sum('attempts'))
+        answers = summary['wrong_answers'] + summary['difficult_answers'] + summary['correct_answers']
+        if not states['pending'] and (states['attempts'] or 0) == answers:
+            self.finished = True
+            self.save(update_fields=['finished', 'cards_learned', 'learning_time', 'wrong_answers',
+                                     'difficult_answers', 'correct_answers'])
+
+
+class Session(LearningSession):
+    """Model to create learning session for QuestionText objects"""
     flash_cards = models.ManyToManyField(QuestionText, through=FlashCardsTextStatus)
-    amount_of_cards = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'start_date'], name='session_user_start_idx'),
+        ]
+
+
+class CardStateQuerySet(models.QuerySet):
+    """Queries over current state of flashcards in learning sessions"""
+
+    def pending(self):
+        """Flashcards which are not answered yet or were answered as wrong"""
+        return self.filter(PENDING)
+
+    def next_pending(self, session_id):
+        """Random pending flashcard of the session with its flashcard, or None when session is finished"""
+        return self.filter(session_id=session_id).pending().select_related('flash_card').order_by('?').first()
+
+    async def anext_pending(self, session_id):
+        """Async version of next_pending"""
+        return await self.filter(session_id=session_id).pending().select_related('flash_card').order_by('?').afirst()
+
+
+class CardState(models.Model):
+    """Base of models with current state of each flashcard in learning session - the newest result, number
+    of answers and time of the last answer. Subclasses add session and flash_card"""
+    result = models.IntegerField(choices=RESULTS, null=True)
+    attempts = models.IntegerField(default=0)
+    last_answered = models.DateTimeField(null=True)
+
+    objects = CardStateQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+
+class SessionCardState(CardState):
+    """Current state of each flashcard in learning session. Full history of answers is kept
+    in FlashCardsTextStatus"""
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='card_states')
+    flash_card = models.ForeignKey(QuestionText, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'flash_card'], name='unique_session_card_state'),
+        ]
+
+
+class CardSchedule(models.Model):
+    """Spaced repetition schedule of QuestionText flashcard for user (SM-2 algorithm, see scheduler.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    flash_card = models.ForeignKey(QuestionText, on_delete=models.CASCADE)
+    ease = models.FloatField(default=2.5)
+    interval = models.IntegerField(default=0)
+    repetitions = models.IntegerField(default=0)
+    due_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'flash_card'], name='unique_card_schedule'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'due_date'], name='schedule_user_due_idx'),
+        ]
+
+
+class DueCard(models.Model):
+    """Queue of due flashcards of user in each category of the flashcard, ordered by due date of CardSchedule"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    flash_card = models.ForeignKey(QuestionText, on_delete=models.CASCADE)
+    due_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'flash_card'], name='unique_due_card'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'category', 'due_date'], name='duecard_user_category_due_idx'),
+        ]
+
+
+class CategoryStats(models.Model):
+    """Cached number of QuestionText flashcards of the user in category (common flashcards when user is null)
+    and number of flashcards of category mastered by the user, maintained by stats.py"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    cards = models.IntegerField(default=0)
+    mastered_cards = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='unique_category_stats'),
+            models.UniqueConstraint(fields=['category'], condition=Q(user__isnull=True),
+                                    name='unique_common_category_stats'),
+        ]
 
 
 class QuestionImage(models.Model):
     """Flashcards with image as a question and text answer"""
-    question = models.ImageField(upload_to='images/')
+    question = models.ImageField(upload_to='images/', storage=get_image_storage)
     answer = models.TextField()
     categories = models.ManyToManyField(Category)
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
 
+    objects = FlashcardQuerySet.as_manager()
+
+    # smaller WebP copies of question image generated by images.py
+    thumbnail = models.ImageField(upload_to='images/derivatives/', storage=get_image_storage, blank=True)
+    medium = models.ImageField(upload_to='images/derivatives/', storage=get_image_storage, blank=True)
+
+    @property
+    def thumbnail_url(self):
+        """The smallest image for lists, original image until derivatives are generated"""
+        return (self.thumbnail or self.question).url
+
+    @property
+    def medium_url(self):
+        """Image for study pages, original image until derivatives are generated"""
+        return (self.medium or self.question).url
+
+    class Meta:
+        indexes = [
+            # keyset pagination of flashcards list (see pagination.py)
+            models.Index(fields=['user', 'question', 'id'], name='image_user_question_idx'),
+        ]
+
+
+class StoredFile(models.Model):
+    """Number of references to file in content-addressed storage (see storage.py)"""
+    name = models.CharField(max_length=255, unique=True)
+    references = models.PositiveIntegerField(default=0)
+
+
+class QuestionImageStatus(CardStatus):
+    """Model to record results of each learning session for QuestionImage objects"""
+    session = models.ForeignKey("SessionImage", on_delete=models.CASCADE, null=True)
+    flash_card = models.ForeignKey(QuestionImage, on_delete=models.CASCADE)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', 'flash_card', '-date'], name='imgstatus_session_card_idx'),
+        ]
+
+
+class SessionImage(LearningSession):
+    """Model to create learning session for QuestionImage objects"""
+    flash_cards = models.ManyToManyField(QuestionImage, through=QuestionImageStatus)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'start_date'], name='sessionimage_user_start_idx'),
+        ]
+
+
+class SessionImageCardState(CardState):
+    """Current state of each flashcard in image learning session. Full history of answers is kept
+    in QuestionImageStatus"""
+    session = models.ForeignKey(SessionImage, on_delete=models.CASCADE, related_name='card_states')
+    flash_card = models.ForeignKey(QuestionImage, on_delete=models.CASCADE)
 
-# class QuestionImageStatus(models.Model):
-# """Model to record results of each learning session for QuestionImage objects"""
-#     session = models.ForeignKey("SessionImage", on_delete=models.CASCADE, null=True)
-#     flash_card = models.ForeignKey(QuestionImage, on_delete=models.CASCADE)
-#     result = models.IntegerField(choices=RESULTS, null=True)
-#     date = models.DateTimeField(auto_now=True)
-#
-#
-# class SessionImage(models.Model):
-# """Model to create learning session for QuestionImage objects"""
-#     user = models.ForeignKey(User, on_delete=models.CASCADE)
-#     start_date = models.DateTimeField(auto_now_add=True)
-#     flash_cards = models.ManyToManyField(QuestionImage, through=QuestionImageStatus)
-#     amount_of_cards = models.IntegerField()
-#     category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'flash_card'], name='unique_session_image_card_state'),
+        ]
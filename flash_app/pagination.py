@@ -0,0 +1,112 @@
+"""Keyset (cursor) pagination of list views.
+
+Instead of OFFSET, the next page is selected with condition on ordering columns of the last row of the current
+page, e.g. for ordering ('question', 'answer', 'id'):
+
+    question >= q AND (question > q OR (question = q AND answer > a) OR (question = q AND answer = a AND id > i))
+
+so with an index on ordering columns every page costs the same as the first one. Ordering columns must be
+bounded (index entry of unbounded text fails on PostgreSQL), for text use annotation with prefix of the text
+and expression index on it. Cursor is a list of ordering
+values of the row encoded in URL (?after=... for next page, ?before=... for previous page, empty ?before= for
+the last page). Total number of rows is not counted.
+"""
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise Http404("Invalid cursor")
+    if not isinstance(values, list) or len(values) != length \
+            or not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise Http404("Invalid cursor")
+    return values
+
+
+def keyset_filter(queryset, keyset, values, backwards=False):
+    """Rows after (or before when backwards) the row with given values of keyset fields"""
+    lookup = 'lt' if backwards else 'gt'
+    condition = Q()
+    for position, field in enumerate(keyset):
+        equal = {previous: value for previous, value in zip(keyset[:position], values)}
+        condition |= Q(**equal, **{f'{field}__{lookup}': values[position]})
+    return queryset.filter(condition, **{f'{keyset[0]}__{lookup}e': values[0]})
+
+
+class KeysetPage:
+    """Page of rows with cursors of neighbouring pages, used in templates as page_obj"""
+
+    def __init__(self, object_list, keyset, has_next, has_previous):
+        self.object_list = object_list
+        self.keyset = keyset
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def cursor(self, row):
+        """Values of keyset fields, or of annotations of the queryset"""
+        values = []
+        for name in self.keyset:
+            try:
+                field = row._meta.get_field(name)
+            except FieldDoesNotExist:
+                values.append(getattr(row, name))
+            else:
+                values.append(field.get_prep_value(field.value_from_object(row)))
+        return encode_cursor(values)
+
+    def next_cursor(self):
+        return self.cursor(self.object_list[-1]) if self.has_next else None
+
+    def previous_cursor(self):
+        return self.cursor(self.object_list[0]) if self.has_previous else None
+
+
+class KeysetPaginationMixin:
+    """ListView pagination with cursors. keyset are ordering fields of the list, the last one must be unique"""
+    keyset = None
+
+    def get_ordering(self):
+        return self.keyset
+
+    def paginate_queryset(self, queryset, page_size):
+        after, before = self.request.GET.get('after'), self.request.GET.get('before')
+        backwards = before is not None
+        cursor = before if backwards else after
+        if cursor:
+            try:
+                queryset = keyset_filter(queryset, self.keyset, decode_cursor(cursor, len(self.keyset)), backwards)
+            except (ValueError, TypeError, ValidationError):
+                # values of cursor not matching types of keyset fields
+                raise Http404("Invalid cursor")
+        if backwards:
+            queryset = queryset.reverse()
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+            page = KeysetPage(rows, self.keyset, has_next=bool(cursor), has_previous=has_more)
+        else:
+            page = KeysetPage(rows, self.keyset, has_next=has_more, has_previous=bool(cursor))
+        return None, page, page.object_list, page.has_next or page.has_previous
@@ -0,0 +1,70 @@
+"""Routing of safe reads to read replicas.
+
+Replicas are database aliases in FLASH_REPLICA_DATABASES setting (see flashcards/database.py). Reads go to
+a random replica only during GET and HEAD requests of views with replica_reads = True (lists, finish pages),
+which is decided by ReplicaRoutingMiddleware. All other reads, reads inside transactions and all writes go
+to the primary (default) database.
+
+Replica can lag behind the primary, so after a request which wrote to the database (POST of an answer, summary
+saved by finish page) the browser of the user gets a cookie valid for FLASH_REPLICA_LAG seconds, and while
+it is present all reads of the user go to the primary - the user always sees own answers.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.deprecation import MiddlewareMixin
+
+PRIMARY_COOKIE = 'flash_primary'
+SAFE_METHODS = ('GET', 'HEAD')
+
+replica_reads = contextvars.ContextVar('replica_reads', default=False)
+primary_written = contextvars.ContextVar('primary_written', default=False)
+
+
+def reading_replica():
+    """Reads of the current request go to replicas"""
+    return replica_reads.get() and bool(settings.FLASH_REPLICA_DATABASES)
+
+
+class ReplicaRouter:
+    """Database router sending reads to replicas when reading_replica()"""
+
+    def db_for_read(self, model, **hints):
+        if not reading_replica() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.FLASH_REPLICA_DATABASES)
+
+    def db_for_write(self, model, **hints):
+        primary_written.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Replicas have the same data as the primary"""
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """Replicas get migrations from the primary with replication"""
+        return db not in settings.FLASH_REPLICA_DATABASES
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """Enables replica reads for safe requests of views with replica_reads = True when the user is not pinned
+    to the primary, pins the user to the primary after a request which wrote to the database"""
+
+    def process_request(self, request):
+        replica_reads.set(False)
+        primary_written.set(False)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'view_class', None)
+        replica_reads.set(request.method in SAFE_METHODS and getattr(view_class, 'replica_reads', False)
+                          and PRIMARY_COOKIE not in request.COOKIES)
+
+    def process_response(self, request, response):
+        replica_reads.set(False)
+        if settings.FLASH_REPLICA_DATABASES and (primary_written.get() or request.method not in SAFE_METHODS):
+            response.set_cookie(PRIMARY_COOKIE, '1', max_age=settings.FLASH_REPLICA_LAG, httponly=True,
+                                samesite='Lax')
+        return response
@@ -0,0 +1,125 @@
+"""Spaced repetition of QuestionText flashcards with SM-2 algorithm.
+
+Results of answers (RESULTS: 0 - wrong, 1 - correct but difficult, 2 - correct) are translated to SM-2 quality
+of answer. Each answer updates ease, interval and due date of the flashcard in CardSchedule of the user
+and pushes the new due date to DueCard queue of each category of the flashcard. Flashcards for new session
+are popped from the queue (the most overdue first) with index on (user, category, due date), so the cost
+depends on number of chosen flashcards, not on number of flashcards of the user. Remaining places are filled
+with flashcards which were never learned by the user, then with flashcards due soonest.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, Min, OuterRef
+from django.utils import timezone
+
+from .models import CardSchedule, DueCard, QuestionText
+from . import caching, stats
+
+QUALITY_OF_RESULT = {0: 1, 1: 3, 2: 5}
+MIN_EASE = 1.3
+
+
+def next_schedule(ease, interval, repetitions, result):
+    """New (ease, interval in days, repetitions) after answer with given result"""
+    quality = QUALITY_OF_RESULT[result]
+    if quality < 3:
+        repetitions = 0
+        interval = 1
+    else:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = round(interval * ease)
+        repetitions += 1
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ease, interval, repetitions
+
+
+def review_many(user_id, results, now=None):
+    """Schedules of flashcards are updated after a batch of (flash_card_id, result) answers of the user,
+    in order of the answers, with the same number of queries for any size of the batch. Answer given earlier
+    (e.g. buffered) is (flash_card_id, result, date of the answer)"""
+    now = now or timezone.now()
+    card_ids = {flash_card_id for flash_card_id, *_ in results}
+    schedules = {schedule.flash_card_id: schedule for schedule in CardSchedule.objects.select_for_update()
+                 .filter(user_id=user_id, flash_card_id__in=card_ids)}
+    was_mastered = {flash_card_id: stats.is_mastered(schedule.interval)
+                    for flash_card_id, schedule in schedules.items()}
+    existing = list(schedules.values())
+    for flash_card_id, result, *date in results:
+        schedule = schedules.setdefault(flash_card_id, CardSchedule(user_id=user_id, flash_card_id=flash_card_id))
+        schedule.ease, schedule.interval, schedule.repetitions = next_schedule(
+            schedule.ease, schedule.interval, schedule.repetitions, result)
+        schedule.due_date = (date[0] if date else now) + timedelta(days=schedule.interval)
+    CardSchedule.objects.bulk_update(existing, ['ease', 'interval', 'repetitions', 'due_date'])
+    CardSchedule.objects.bulk_create([schedule for flash_card_id, schedule in schedules.items()
+                                      if flash_card_id not in was_mastered])
+    category_ids = defaultdict(list)
+    for flash_card_id, category_id in QuestionText.categories.through.objects.filter(
+            questiontext_id__in=card_ids).values_list('questiontext_id', 'category_id'):
+        category_ids[flash_card_id].append(category_id)
+    DueCard.objects.filter(user_id=user_id, flash_card_id__in=card_ids).delete()
+    DueCard.objects.bulk_create([DueCard(user_id=user_id, category_id=category_id, flash_card_id=flash_card_id,
+                                         due_date=schedule.due_date)
+                                 for flash_card_id, schedule in schedules.items()
+                                 for category_id in category_ids[flash_card_id]])
+    mastered = Counter()
+    for flash_card_id, schedule in schedules.items():
+        change = stats.is_mastered(schedule.interval) - was_mastered.get(flash_card_id, False)
+        for category_id in category_ids[flash_card_id]:
+            mastered[category_id] += change
+    stats.change_by_category(user_id, mastered, field='mastered')
+    caching.bump(caching.user_dependency(user_id))
+    return schedules
+
+
+def pop_due(user_id, category, number, now=None):
+    """Id of at most number of the most overdue flashcards of user in category. Flashcards stay in the queue
+    until they are answered, so flashcards from unfinished session are not lost"""
+    now = now or timezone.now()
+    return list(DueCard.objects.filter(user_id=user_id, category=category, due_date__lte=now)
+                .order_by('due_date').values_list('flash_card_id', flat=True)[:number])
+
+
+def upcoming(user_id, category, number, now=None):
+    """Id of at most number of flashcards of user in category which are not due yet, due soonest first"""
+    now = now or timezone.now()
+    return list(DueCard.objects.filter(user_id=user_id, category=category, due_date__gt=now)
+                .order_by('due_date').values_list('flash_card_id', flat=True)[:number])
+
+
+def session_card_ids(user_id, category, number, now=None):
+    """Id of flashcards for new session: due flashcards from category (the most overdue first) are popped from
+    the queue, remaining places are filled with random flashcards never learned by the user and then with
+    flashcards due soonest, so the user can study ahead when all flashcards are learned"""
+    card_ids = pop_due(user_id, category, number, now)
+    if len(card_ids) < number:
+        scheduled = CardSchedule.objects.filter(user_id=user_id, flash_card_id=OuterRef('pk'))
+        card_ids += QuestionText.objects.available_to(user_id).filter(categories=category)\
+            .exclude(Exists(scheduled)).order_by('?').values_list('id', flat=True)[:number - len(card_ids)]
+    if len(card_ids) < number:
+        card_ids += upcoming(user_id, category, number - len(card_ids), now)
+    return card_ids
+
+
+def start_session(session):
+    """Session (with user, category and amount_of_cards) is saved with flashcards chosen by session_card_ids
+    in one transaction. Returns number of flashcards, session without flashcards is not saved"""
+    with transaction.atomic():
+        session.save()
+        card_ids = session_card_ids(session.user_id, session.category, session.amount_of_cards)
+        if not card_ids:
+            transaction.set_rollback(True)
+            return 0
+        session.add_flash_cards(card_ids)
+    return len(card_ids)
+
+
+def next_due_date(user_id, now=None):
+    """The earliest future due date of flashcards of the user, when numbers of due flashcards change"""
+    now = now or timezone.now()
+    return DueCard.objects.filter(user_id=user_id, due_date__gt=now).aggregate(next_due=Min('due_date'))['next_due']
@@ -0,0 +1,101 @@
+"""Full-text search of QuestionText flashcards and categories.
+
+PostgreSQL: search_vector tsvector column generated by the database from searched columns
+(GENERATED ALWAYS ... STORED) with GIN index.
+SQLite: FTS5 external content table <table>_fts updated by triggers of the searched table.
+
+In both cases the index is maintained by the database, so flashcards added with save(), update() or
+bulk_create() of the import are searchable at once. The 'simple' configuration (no stemming, no stop words)
+is used, because flashcards are written in many languages. Every word of the query must be found, words are
+matched as prefixes. Results are ranked, question weights more than answer.
+
+Structures are created by migration 0014. On SQLite a migration rebuilding the table drops its triggers,
+rebuild_search_index command creates them again.
+"""
+import re
+
+from django.db import connections
+
+# searched table: searched columns with their weights, the most important first
+SEARCHED = {
+    'flash_app_questiontext': (('question', 'A', 2.0), ('answer', 'B', 1.0)),
+    'flash_app_category': (('category_name', 'A', 1.0),),
+}
+WORD = re.compile(r'\w+')
+MAX_WORDS = 10
+RESULTS_LIMIT = 50
+
+
+def words(query):
+    return WORD.findall(query.lower())[:MAX_WORDS]
+
+
+def postgresql_sql(table, columns):
+    document = ' || '.join(f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')"
+                           for column, weight, _ in columns)
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS ({document}) STORED",
+        f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING gin (search_vector)",
+    ]
+
+
+def sqlite_sql(table, columns):
+    names = ', '.join(column for column, _, _ in columns)
+    new_values = ', '.join(f'new.{column}' for column, _, _ in columns)
+    old_values = ', '.join(f'old.{column}' for column, _, _ in columns)
+    delete = f"INSERT INTO {table}_fts({table}_fts, rowid, {names}) VALUES ('delete', old.id, {old_values});"
+    insert = f"INSERT INTO {table}_fts(rowid, {names}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table}_fts USING fts5({names}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 0')",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END",
+        f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+    ]
+
+
+def install(connection):
+    """Creates search index of searched tables (if it doesn't exist) and indexes existing rows"""
+    if connection.vendor == 'postgresql':
+        statements = [sql for table, columns in SEARCHED.items() for sql in postgresql_sql(table, columns)]
+    elif connection.vendor == 'sqlite':
+        statements = [sql for table, columns in SEARCHED.items() for sql in sqlite_sql(table, columns)]
+    else:
+        return
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for table in SEARCHED:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+            elif connection.vendor == 'sqlite':
+                for trigger in ('insert', 'delete', 'update'):
+                    cursor.execute(f"DROP TRIGGER IF EXISTS {table}_fts_{trigger}")
+                cursor.execute(f"DROP TABLE IF EXISTS {table}_fts")
+
+
+def search(queryset, query, limit=RESULTS_LIMIT):
+    """Rows of queryset (of searched table) matching all words of the query, the best matches first"""
+    terms = words(query)
+    if not terms:
+        return queryset.none()
+    table = queryset.model._meta.db_table
+    if connections[queryset.db].vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        queryset = queryset.extra(
+            select={'rank': f"ts_rank({table}.search_vector, to_tsquery('simple', %s))"}, select_params=(tsquery,),
+            where=[f"{table}.search_vector @@ to_tsquery('simple', %s)"], params=(tsquery,))
+    else:
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for _, _, weight in SEARCHED[table])
+        # joined FTS table is searched once, bm25() is lower for better matches
+        queryset = queryset.extra(
+            select={'rank': f"-bm25({table}_fts, {weights})"}, tables=[f'{table}_fts'],
+            where=[f"{table}_fts.rowid = {table}.id", f"{table}_fts MATCH %s"], params=(match,))
+    return queryset.order_by('-rank', 'id')[:limit]
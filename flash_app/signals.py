@@ -0,0 +1,121 @@
+from collections import Counter
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Category, QuestionText, CardSchedule, DueCard, QuestionImage
+from . import caching, stats
+
+
+@receiver(m2m_changed, sender=QuestionText.categories.through)
+def update_due_queue(sender, instance, action, reverse, pk_set, **kwargs):
+    """Queue of due flashcards follows changes of flashcard categories, made from flashcard or from category side"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        queued = DueCard.objects.filter(category=instance)
+        pairs = [(card_id, instance.id) for card_id in pk_set or ()]
+        changed = {'flash_card_id__in': pk_set}
+    else:
+        queued = DueCard.objects.filter(flash_card=instance)
+        pairs = [(instance.id, category_id) for category_id in pk_set or ()]
+        changed = {'category_id__in': pk_set}
+    if action == 'post_clear':
+        queued.delete()
+    elif action == 'post_remove':
+        queued.filter(**changed).delete()
+    else:
+        schedules = {}
+        for schedule in CardSchedule.objects.filter(flash_card_id__in={card_id for card_id, _ in pairs}):
+            schedules.setdefault(schedule.flash_card_id, []).append(schedule)
+        DueCard.objects.bulk_create(
+            [DueCard(user_id=schedule.user_id, category_id=category_id, flash_card_id=card_id,
+                     due_date=schedule.due_date)
+             for card_id, category_id in pairs for schedule in schedules.get(card_id, [])],
+            ignore_conflicts=True)
+
+
+@receiver(m2m_changed, sender=QuestionText.categories.through)
+def update_category_stats(sender, instance, action, reverse, pk_set, **kwargs):
+    """Cached numbers of flashcards in categories follow changes of flashcard categories. Categories removed
+    by clear() are read before they are removed"""
+    if action == 'pre_clear':
+        through = QuestionText.categories.through.objects
+        if reverse:
+            pk_set = set(through.filter(category_id=instance.id).values_list('questiontext_id', flat=True))
+        else:
+            pk_set = set(instance.categories.values_list('id', flat=True))
+    elif action not in ('post_add', 'post_remove'):
+        return
+    if not pk_set:
+        return
+    sign = 1 if action == 'post_add' else -1
+    if reverse:
+        owners = Counter(QuestionText.objects.filter(id__in=pk_set).values_list('user_id', flat=True))
+        for user_id, number in owners.items():
+            stats.change(user_id, [instance.id], cards=sign * number)
+        stats.change_mastered(pk_set, [instance.id], sign)
+    else:
+        stats.change(instance.user_id, pk_set, cards=sign)
+        stats.change_mastered([instance.id], pk_set, sign)
+
+
+@receiver(pre_delete, sender=QuestionText)
+def remove_from_category_stats(sender, instance, **kwargs):
+    """Links of deleted flashcard to categories are deleted without m2m_changed signal"""
+    category_ids = list(instance.categories.values_list('id', flat=True))
+    stats.change(instance.user_id, category_ids, cards=-1)
+    stats.change_mastered([instance.id], category_ids, -1)
+
+
+@receiver(pre_save, sender=QuestionText)
+def move_category_stats(sender, instance, **kwargs):
+    """Flashcard with changed owner is moved to cached numbers of the new owner"""
+    if instance._state.adding or instance.pk is None:
+        return
+    previous = list(QuestionText.objects.filter(pk=instance.pk).values_list('user_id', flat=True))
+    if not previous or previous[0] == instance.user_id:
+        return
+    previous_user_id = previous[0]
+    category_ids = list(instance.categories.values_list('id', flat=True))
+    stats.change(previous_user_id, category_ids, cards=-1)
+    stats.change(instance.user_id, category_ids, cards=1)
+    caching.bump(caching.user_dependency(previous_user_id))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_categories(sender, instance, **kwargs):
+    caching.bump('categories')
+
+
+@receiver(post_save, sender=QuestionText)
+@receiver(post_delete, sender=QuestionText)
+def invalidate_flashcard(sender, instance, **kwargs):
+    """Cached responses of the owner of flashcard (or depending on common flashcards) are invalidated"""
+    caching.bump(caching.user_dependency(instance.user_id))
+
+
+@receiver(m2m_changed, sender=QuestionText.categories.through)
+def invalidate_flashcard_categories(sender, instance, action, reverse, **kwargs):
+    """Flashcards added to or removed from category (reverse) can belong to many users"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        caching.bump('categories' if reverse else caching.user_dependency(instance.user_id))
+
+
+@receiver(pre_delete, sender=QuestionImage)
+def lock_image_files(sender, instance, **kwargs):
+    """Row of deleted flashcard is locked and names of its files are read again, so derivatives saved
+    by image worker after the flashcard was loaded are released too"""
+    current = QuestionImage.objects.select_for_update().filter(pk=instance.pk)\
+        .values('question', 'thumbnail', 'medium').first()
+    for field, name in (current or {}).items():
+        setattr(instance, field, name)
+
+
+@receiver(post_delete, sender=QuestionImage)
+def release_image_files(sender, instance, **kwargs):
+    """References to image files of deleted flashcard are removed from content-addressed storage"""
+    for field in (instance.question, instance.thumbnail, instance.medium):
+        if field.name:
+            field.storage.delete(field.name)
@@ -0,0 +1,119 @@
+"""Cached number of QuestionText flashcards in categories and progress of the user.
+
+CategoryStats row of (user, category) holds number of the user's own flashcards in the category and number of
+flashcards of the category mastered by the user (interval of CardSchedule at least MASTERED_INTERVAL days).
+Row with null user holds number of common flashcards. Rows are changed incrementally: by signals (signals.py)
+on changes of flashcard categories, deletion of flashcard and change of its owner, by scheduler after answers
+and by import after each batch. rebuild() counts everything again (migration, rebuild_category_stats command).
+
+Due flashcards change with time, so they are counted from DueCard queue with index on (user, category,
+due date) in one grouped query.
+"""
+from collections import defaultdict
+
+from django.apps import apps as django_apps
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import CardSchedule, CategoryStats, DueCard
+
+MASTERED_INTERVAL = 21
+
+
+class CategoryCounts:
+    """Flashcards of category available to the user"""
+
+    def __init__(self):
+        self.own = 0
+        self.common = 0
+        self.mastered = 0
+        self.due = 0
+
+    @property
+    def total(self):
+        return self.own + self.common
+
+    @property
+    def mastery(self):
+        """Percentage of mastered flashcards"""
+        return min(100, round(100 * self.mastered / self.total)) if self.total else 0
+
+
+def is_mastered(interval):
+    return interval >= MASTERED_INTERVAL
+
+
+def change(user_id, category_ids, cards=0, mastered=0):
+    """Number of flashcards and mastered flashcards of the user (None for common flashcards) in categories
+    is changed by given numbers"""
+    category_ids = list(category_ids)
+    if not category_ids or not (cards or mastered):
+        return
+    CategoryStats.objects.bulk_create([CategoryStats(user_id=user_id, category_id=category_id)
+                                       for category_id in category_ids], ignore_conflicts=True)
+    CategoryStats.objects.filter(user_id=user_id, category_id__in=category_ids).update(
+        cards=F('cards') + cards, mastered_cards=F('mastered_cards') + mastered)
+
+
+def change_by_category(user_id, numbers, field='cards'):
+    """numbers is {category_id: change of field ('cards' or 'mastered')}, categories with the same change
+    are changed together"""
+    categories_of_number = defaultdict(list)
+    for category_id, number in numbers.items():
+        if number:
+            categories_of_number[number].append(category_id)
+    for number, category_ids in categories_of_number.items():
+        change(user_id, category_ids, **{field: number})
+
+
+def change_mastered(flash_card_ids, category_ids, sign=1):
+    """Users who mastered given flashcards gain (or lose with sign=-1) them in categories"""
+    mastered = defaultdict(int)
+    for user_id in CardSchedule.objects.filter(flash_card_id__in=flash_card_ids, interval__gte=MASTERED_INTERVAL)\
+            .values_list('user_id', flat=True):
+        mastered[user_id] += 1
+    for user_id, number in mastered.items():
+        change(user_id, category_ids, mastered=sign * number)
+
+
+def category_counts(user_id, category_ids=None, now=None):
+    """CategoryCounts of categories for the user, as defaultdict with category id as a key"""
+    now = now or timezone.now()
+    counts = defaultdict(CategoryCounts)
+    rows = CategoryStats.objects.filter(Q(user_id=user_id) | Q(user__isnull=True))
+    due = DueCard.objects.filter(user_id=user_id, due_date__lte=now)
+    if category_ids is not None:
+        rows = rows.filter(category_id__in=category_ids)
+        due = due.filter(category_id__in=category_ids)
+    for row in rows:
+        category_counts = counts[row.category_id]
+        if row.user_id is None:
+            category_counts.common = row.cards
+        else:
+            category_counts.own = row.cards
+            category_counts.mastered = row.mastered_cards
+    if user_id is not None:
+        for category_id, number in due.values_list('category_id').annotate(number=Count('id')).order_by():
+            counts[category_id].due = number
+    return counts
+
+
+def rebuild(apps=django_apps):
+    """All CategoryStats rows are counted again from flashcards and schedules"""
+    model = apps.get_model('flash_app', 'CategoryStats')
+    through = apps.get_model('flash_app', 'QuestionText').categories.through
+    schedules = apps.get_model('flash_app', 'CardSchedule').objects
+    rows = {}
+    with transaction.atomic():
+        model.objects.all().delete()
+        for user_id, category_id, number in through.objects.values_list('questiontext__user_id', 'category_id')\
+                .annotate(number=Count('id')).order_by():
+            rows[user_id, category_id] = model(user_id=user_id, category_id=category_id, cards=number)
+        for user_id, category_id, number in schedules.filter(interval__gte=MASTERED_INTERVAL)\
+                .values_list('user_id', 'flash_card__categories').annotate(number=Count('id')).order_by():
+            if category_id is None:
+                continue
+            row = rows.setdefault((user_id, category_id), model(user_id=user_id, category_id=category_id))
+            row.mastered_cards = number
+        model.objects.bulk_create(rows.values(), batch_size=5000)
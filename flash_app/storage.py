@@ -0,0 +1,118 @@
+"""Content-addressed storage of uploaded images.
+
+File is saved under the SHA-256 hash of its content (e.g. images/3f/3fa9...c2.png), so the same image uploaded
+many times is stored once. Number of references to each file is kept in StoredFile and the file is removed
+when the last reference is deleted. Content of the file under given URL never changes, so MEDIA_URL of hashed
+files can be served with long-lived cache headers, e.g. in nginx:
+
+    location ~ ^/media/images/(derivatives/)?[0-9a-f]{2}/ {
+        add_header Cache-Control "public, max-age=31536000, immutable";
+    }
+
+Hash of uploaded file is counted by upload handlers while the file is received, so the file isn't read again.
+"""
+import hashlib
+import os
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+from django.db import transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+
+def file_hash(content):
+    """SHA-256 of the file counted by upload handler, or counted now from chunks of the file"""
+    content_hash = getattr(content, 'content_hash', None)
+    if content_hash:
+        return content_hash
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage saving files under hash of their content with counted references"""
+
+    def hashed_name(self, name, content):
+        directory, file_name = os.path.split(name)
+        extension = os.path.splitext(file_name)[1].lower()
+        digest = file_hash(content)
+        return os.path.join(directory, digest[:2], digest + extension).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        """New reference to the file is counted, file is written only when it is not stored yet"""
+        StoredFile = apps.get_model('flash_app', 'StoredFile')
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(self.generate_filename(name), content)
+        with transaction.atomic():
+            StoredFile.objects.get_or_create(name=name)
+            stored = StoredFile.objects.select_for_update().get(name=name)
+            if not self.exists(name):
+                self._save(name, content)
+            stored.references = F('references') + 1
+            stored.save(update_fields=['references'])
+        return name
+
+    def delete(self, name):
+        """Reference to the file is removed, file is deleted with the last reference when the transaction
+        is committed, so it is kept when the reference comes back with rollback. Files saved before
+        content-addressed storage (without StoredFile record) are kept"""
+        StoredFile = apps.get_model('flash_app', 'StoredFile')
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is None:
+                return
+            if stored.references > 1:
+                stored.references = F('references') - 1
+                stored.save(update_fields=['references'])
+                return
+            stored.delete()
+            transaction.on_commit(lambda: self.delete_unreferenced(name))
+
+    def delete_unreferenced(self, name):
+        """File is deleted unless it was referenced again by upload of the same content"""
+        StoredFile = apps.get_model('flash_app', 'StoredFile')
+        if not StoredFile.objects.filter(name=name).exists():
+            super().delete(name)
+
+
+content_addressed_storage = ContentAddressedStorage()
+
+
+def get_image_storage():
+    return content_addressed_storage
+
+
+class HashingUploadMixin:
+    """Upload handler counting SHA-256 of the file from received chunks"""
+
+    def new_file(self, *args, **kwargs):
+        self.digest = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_hash = self.digest.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+    pass
@@ -0,0 +1,82 @@
+import re
+
+import pytest
+from django.db import connection
+
+from .models import Category, QuestionText, FlashCardsTextStatus, Session, SessionCardState, question_key
+from .pagination import keyset_filter
+
+
+def assert_uses_indexes(queryset):
+    """EXPLAIN of the query must not contain sequential (full table) scan. On PostgreSQL sequential scans
+    are switched off for the EXPLAIN so the planner uses an index whenever there is one, regardless of the table
+    size, and switched on again for following queries of the connection"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                plan = queryset.explain()
+            finally:
+                cursor.execute('RESET enable_seqscan')
+        assert 'Seq Scan' not in plan, plan
+    else:
+        plan = queryset.explain()
+        assert not re.search(r'\bSCAN\b', plan), plan
+
+
+@pytest.fixture
+def seeded_data(user, user_login):
+    """Two categories with common flashcards, flashcards of two users and their sessions"""
+    categories = [Category.objects.create(category_name=f"category {number}", category_description="")
+                  for number in range(2)]
+    for number in range(40):
+        card = QuestionText.objects.create(question=f"question {number}", answer=f"answer {number}",
+                                           user=[None, user, user_login][number % 3])
+        card.categories.set([categories[number % 2]])
+    sessions = []
+    for owner in (user, user_login):
+        for category in categories:
+            session = Session.objects.create(user=owner, category=category, amount_of_cards=10)
+            session.add_flash_cards(QuestionText.objects.available_to(owner.id).filter(categories=category)
+                                    .values_list('id', flat=True))
+            sessions.append(session)
+    return categories, sessions
+
+
+@pytest.mark.django_db
+def test_status_log_of_flashcard_in_session_uses_index(seeded_data):
+    categories, sessions = seeded_data
+    card_id = sessions[0].card_states.first().flash_card_id
+    assert_uses_indexes(FlashCardsTextStatus.objects.filter(session_id=sessions[0].id, flash_card_id=card_id)
+                        .order_by('-date')[:1])
+
+
+@pytest.mark.django_db
+def test_next_pending_flashcard_uses_index(seeded_data):
+    categories, sessions = seeded_data
+    assert_uses_indexes(SessionCardState.objects.filter(session_id=sessions[0].id).pending()
+                        .select_related('flash_card'))
+
+
+@pytest.mark.django_db
+def test_flashcards_of_category_for_user_use_index(user, seeded_data):
+    categories, sessions = seeded_data
+    assert_uses_indexes(QuestionText.objects.available_to(user.id).filter(categories=categories[0])
+                        .values_list('id', flat=True))
+
+
+@pytest.mark.django_db
+def test_common_flashcards_use_partial_index(seeded_data):
+    assert_uses_indexes(QuestionText.objects.filter(user__isnull=True).values_list('id', flat=True))
+
+
+@pytest.mark.django_db
+def test_sessions_of_user_use_index(user, seeded_data):
+    assert_uses_indexes(Session.objects.filter(user_id=user.id).order_by('-start_date'))
+
+
+@pytest.mark.django_db
+def test_keyset_page_of_flashcards_list_uses_index(user, seeded_data):
+    keyset = ('question_key', 'id')
+    queryset = QuestionText.objects.filter(user_id=user.id).annotate(question_key=question_key()).order_by(*keyset)
+    assert_uses_indexes(keyset_filter(queryset, keyset, ['question 20', 21])[:20])
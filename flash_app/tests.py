@@ -1,9 +1,30 @@
+from asgiref.sync import async_to_sync
 from django.test import Client
 import pytest
 from django.urls import reverse
 from django.contrib.auth.models import Permission
 
-from .models import Category, QuestionText, FlashCardsTextStatus, Session, QuestionImage
+from datetime import timedelta
+from pathlib import Path
+import csv
+import io
+import json
+import os
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .models import Category, QuestionText, FlashCardsTextStatus, Session, SessionCardState, QuestionImage, \
+    CardSchedule, StoredFile, QuestionImageStatus, SessionImage, SessionImageCardState, CategoryStats, DueCard, \
+    ArchivedTextStatus
+from flashcards.database import database_settings
+from . import answers, archive, benchmark, caching, exporter, images, importer, instrumentation, pagination, routers, \
+    scheduler, search, stats
 
 
 def test_main(client):
@@ -113,6 +134,139 @@ def test_questiontext_addition_requires_login(client, user, category):
     assert QuestionText.objects.count() == initial_questiontext_count + 1
 
 
+# tests for import of QuestionText flashcards
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('file_format, content', [
+    ('csv', 'question,answer,categories\nPeru,Lima,Capitals;South_America\nChile,Santiago,\n'),
+    ('json', '[{"question": "Peru", "answer": "Lima", "categories": ["Capitals", "South_America"]},\n'
+             ' {"question": "Chile", "answer": "Santiago"}]'),
+    ('jsonl', '{"question": "Peru", "answer": "Lima", "categories": "Capitals;South_America"}\n'
+              '{"question": "Chile", "answer": "Santiago"}\n'),
+    ('tsv', '#separator:tab\nPeru\tLima\tCapitals South_America\nChile\tSantiago\n'),
+])
+def test_import_flashcards(user, category, file_format, content):
+    """Flashcards are imported in batches with categories created once"""
+    rows = importer.parse(io.BytesIO(content.encode()), file_format)
+    imported = importer.import_flashcards(rows, user=user, default_categories=[category.category_name], batch_size=1)
+    assert imported == 2
+    peru = QuestionText.objects.get(question="Peru", answer="Lima", user=user)
+    assert peru.categories.count() == 2
+    assert QuestionText.objects.get(question="Chile").categories.get() == category
+    assert Category.objects.count() == 3
+
+
+def test_import_json_read_in_chunks(monkeypatch):
+    """JSON array is decoded object by object from small chunks of the file"""
+    monkeypatch.setattr(importer, 'CHUNK_SIZE', 7)
+    content = '[' + ','.join(f'{{"question": "q{number}", "answer": "a{number}"}}' for number in range(20)) + ']'
+    rows = list(importer.parse(io.BytesIO(content.encode()), 'json'))
+    assert len(rows) == 20
+    assert rows[19] == {'question': 'q19', 'answer': 'a19', 'categories': []}
+
+
+def test_import_malformed_json_not_buffered(monkeypatch):
+    """Malformed object is reported without reading the rest of the file"""
+    monkeypatch.setattr(importer, 'CHUNK_SIZE', 64)
+    stream = io.StringIO('[{"question": "q", "answer": oops}, ' + ' ' * 10000 + ']')
+    with pytest.raises(importer.FlashcardImportError, match="Invalid JSON"):
+        list(importer.parse_json(stream))
+    assert stream.tell() == 64
+
+
+@pytest.mark.django_db
+def test_import_flashcards_view(client, user, category):
+    """test for ImportFlashcardsView with logged user"""
+    client.force_login(user=user)
+    upload = io.BytesIO('question,answer,categories\nPeru,Lima,\nChile,Santiago,\n'.encode())
+    upload.name = 'cards.csv'
+    response = client.post('/import_flashcards', {'file': upload, 'category': category.pk})
+    assert response.status_code == 302
+    assert response.url == '/import_flashcards'
+    assert QuestionText.objects.filter(user=user, categories=category).count() == 2
+
+
+@pytest.mark.django_db
+def test_import_flashcards_view_invalid_file(client, user):
+    """File with flashcard without answer is not imported"""
+    client.force_login(user=user)
+    upload = io.BytesIO('[{"question": "Peru"}]'.encode())
+    upload.name = 'cards.json'
+    response = client.post('/import_flashcards', {'file': upload})
+    assert response.status_code == 200
+    assert response.context['form'].errors['file']
+    assert QuestionText.objects.count() == 0
+
+
+@pytest.mark.django_db
+def test_import_flashcards_view_invalid_row_after_batches(client, user):
+    """Flashcards of batches saved before an invalid row are not kept, the file can be fixed and imported again"""
+    client.force_login(user=user)
+    rows = ''.join(f'q{number},a{number},\n' for number in range(1500))
+    upload = io.BytesIO(f'question,answer,categories\n{rows}Peru,,\n'.encode())
+    upload.name = 'cards.csv'
+    response = client.post('/import_flashcards', {'file': upload})
+    assert response.status_code == 200
+    assert response.context['form'].errors['file'] == ["Flashcard 1501 has no question or answer"]
+    assert QuestionText.objects.count() == 0
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('name, content', [
+    ('cards.csv', 'question,answer,categories\n"' + 'x' * 200000 + '",Lima,\n'),
+    ('cards.csv', 'question,answer,categories\nPeru,Lima,' + 'x' * 65 + '\n'),
+    ('cards.txt', 'Peru\tLima\t' + 'x' * 65 + '\n'),
+])
+def test_import_flashcards_view_invalid_rows(client, user, name, content):
+    """Invalid CSV and too long category names are errors of the form"""
+    client.force_login(user=user)
+    upload = io.BytesIO(content.encode())
+    upload.name = name
+    response = client.post('/import_flashcards', {'file': upload})
+    assert response.status_code == 200
+    assert response.context['form'].errors['file']
+    assert QuestionText.objects.count() == 0
+
+
+# tests for export of flashcards
+
+@pytest.mark.django_db
+def test_export_flashcards_jsonl(client, user, textflashcard, imageflashcard, flashcards_status_2):
+    """Flashcards and answers of logged user are streamed as JSON Lines"""
+    client.force_login(user=user)
+    response = client.get('/export_flashcards?format=jsonl')
+    assert response.status_code == 200
+    assert response.streaming
+    records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    assert {'type': 'text', 'id': textflashcard.id, 'question': "Peru", 'answer': "Lima",
+            'categories': ["Capital Cities"]} in records
+    assert [record['type'] for record in records].count('image') == 1
+    assert [record['type'] for record in records].count('answer') == 4
+
+
+@pytest.mark.django_db
+def test_export_flashcards_csv(user, textflashcard):
+    rows = list(csv.DictReader(io.StringIO(''.join(exporter.export(user, 'csv')))))
+    assert rows[0]['question'] == "Peru"
+    assert rows[0]['categories'] == "Capital Cities"
+
+
+@pytest.mark.django_db
+def test_export_flashcards_zip(settings, tmp_path, user, category):
+    """Zip bundle contains flashcards and image files"""
+    settings.MEDIA_ROOT = tmp_path
+    (tmp_path / 'images').mkdir()
+    (tmp_path / 'images' / 'lights.png').write_bytes(b'image')
+    QuestionImage.objects.create(question='images/lights.png', answer="Peru", user=user)
+    bundle = zipfile.ZipFile(io.BytesIO(b''.join(exporter.export(user, 'zip'))))
+    assert sorted(bundle.namelist()) == ['flashcards.jsonl', 'images/lights.png']
+    assert bundle.read('images/lights.png') == b'image'
+
+
+def test_export_flashcards_without_login(client):
+    response = client.get('/export_flashcards')
+    assert response.status_code == 302
+
+
 @pytest.mark.django_db
 def test_questiontext_delete_without_login(client, textflashcard):
     """test for DeleteQuestionTextView with no logged user"""
@@ -174,6 +328,89 @@ def test_questiontext_list_view_without_login(client):
     assert response.url == '/accounts/login/?next=/flashcards_list'
 
 
+@pytest.mark.django_db
+def test_questiontext_list_keyset_pagination(client, user):
+    """Pages follow (prefix of question, id) ordering with the same question on many flashcards"""
+    QuestionText.objects.bulk_create([QuestionText(question=f"question {number % 7}", answer=f"answer {number % 2}",
+                                                   user=user) for number in range(45)])
+    expected = list(QuestionText.objects.order_by('question', 'id'))
+    client.force_login(user=user)
+    pages, url = [], '/flashcards_list'
+    while url:
+        page = client.get(url).context['page_obj']
+        pages.append(list(page))
+        url = page.has_next and f'/flashcards_list?after={page.next_cursor()}'
+    assert [len(page) for page in pages] == [20, 20, 5]
+    assert sum(pages, []) == expected
+    last_page = client.get('/flashcards_list?before=').context['page_obj']
+    assert list(last_page) == expected[-20:]
+    previous_page = client.get(f'/flashcards_list?before={last_page.previous_cursor()}').context['page_obj']
+    assert list(previous_page) == expected[-40:-20]
+    assert previous_page.has_next and previous_page.has_previous
+
+
+@pytest.mark.django_db
+def test_questiontext_list_keyset_page_query_count(client, user, django_assert_num_queries):
+    """Page after cursor runs the same queries as the first page, without counting all flashcards"""
+    QuestionText.objects.bulk_create([QuestionText(question=f"question {number}", answer="", user=user)
+                                      for number in range(60)])
+    client.force_login(user=user)
+    with django_assert_num_queries(3):
+        page = client.get('/flashcards_list').context['page_obj']
+    with django_assert_num_queries(3):
+        client.get(f'/flashcards_list?after={page.next_cursor()}')
+
+
+@pytest.mark.django_db
+def test_list_view_invalid_cursor(client, user):
+    client.force_login(user=user)
+    assert client.get('/flashcards_list?after=invalid').status_code == 404
+    assert client.get('/category_list?after=WzFd').status_code == 404
+    for values in (["a", "notanint"], ["a", {"id": 1}], [["a"], 1]):
+        assert client.get('/flashcards_list', {'after': pagination.encode_cursor(values)}).status_code == 404
+
+
+# tests for full-text search
+
+@pytest.mark.django_db
+def test_search_prefix_of_all_words(user, textflashcard, textflashcard_2):
+    available = QuestionText.objects.available_to(user.id)
+    assert list(search.search(available, "li")) == [textflashcard]
+    assert list(search.search(available, "PER lim")) == [textflashcard]
+    assert list(search.search(available, "peru santiago")) == []
+    assert list(search.search(available, " ?! ")) == []
+
+
+@pytest.mark.django_db
+def test_search_ranks_question_above_answer(user):
+    in_answer = QuestionText.objects.create(question="Capital of France", answer="Paris", user=user)
+    in_question = QuestionText.objects.create(question="Paris", answer="France", user=user)
+    assert list(search.search(QuestionText.objects.all(), "paris")) == [in_question, in_answer]
+
+
+@pytest.mark.django_db
+def test_search_index_follows_changes(user, textflashcard):
+    QuestionText.objects.filter(id=textflashcard.id).update(answer="Cuzco")
+    assert list(search.search(QuestionText.objects.all(), "cuz")) == [textflashcard]
+    assert list(search.search(QuestionText.objects.all(), "lima")) == []
+    importer.import_flashcards([{'question': "Ecuador", 'answer': "Quito", 'categories': []}], user)
+    assert search.search(QuestionText.objects.all(), "quito").get().question == "Ecuador"
+    textflashcard.delete()
+    assert list(search.search(QuestionText.objects.all(), "cuzco")) == []
+
+
+@pytest.mark.django_db
+def test_search_view(client, user, user_login, category, textflashcard):
+    QuestionText.objects.create(question="Lima beans", answer="Fasola", user=user_login)
+    client.force_login(user=user)
+    response = client.get('/search', {'q': "capital lima"})
+    assert list(response.context['flashcards']) == []
+    response = client.get('/search', {'q': "lima"})
+    assert list(response.context['flashcards']) == [textflashcard]
+    response = client.get('/search', {'q': "capital"})
+    assert list(response.context['categories']) == [category]
+
+
 # tests for ChooseLearnSessionView:
 def test_chooseleaarningsession_view_without_login(client):
     """test for ChooseLearnSessionView for no logged user"""
@@ -200,7 +437,7 @@ def test_chooseleaarningsession_view(client, user, category, textflashcard, text
 @pytest.mark.django_db
 def test_chooseleaarningsession_view_for_empty_category(client, user, category_2, textflashcard, textflashcard_2, textflashcard_3):
     """check if when user choose category where does not have flashcards
-    will be redirected to "choose_session" and nothing will be put to the FlashCardsTextStatus model"""
+    will be redirected to "choose_session" and session without flashcards is not saved"""
     client.force_login(user=user)
     response = client.get('/choose_session')
     assert response.status_code == 200
@@ -209,7 +446,7 @@ def test_chooseleaarningsession_view_for_empty_category(client, user, category_2
     response = client.post('/choose_session', {'amount_of_cards': 3, 'category': category_2.pk, 'user': user.pk})
     assert response.status_code == 302
     assert response.url == '/choose_session'
-    assert Session.objects.count() == initial_session_count + 1
+    assert Session.objects.count() == initial_session_count
     assert FlashCardsTextStatus.objects.count() == initial_flashcardstextstatus_count
 # how to assert message?
 
@@ -230,6 +467,36 @@ def test_chooseleaarningsession_view_for_less_flashcards(client, user, category,
     # assert response.url == reverse('flashcard_question', kwargs={"session_id": session.id})
 
 
+@pytest.mark.django_db
+def test_chooseleaarningsession_view_amount_must_be_positive(client, user, category, textflashcard):
+    client.force_login(user=user)
+    for amount in (0, -3):
+        response = client.post('/choose_session', {'amount_of_cards': amount, 'category': category.pk})
+        assert response.status_code == 200
+        assert 'amount_of_cards' in response.context['form'].errors
+        response = post_json(client, '/api/sessions', {'amount_of_cards': amount, 'category': category.pk})
+        assert response.status_code == 400
+    response = client.post(reverse('choose_image_session'), {'amount_of_cards': -1, 'category': category.pk})
+    assert 'amount_of_cards' in response.context['form'].errors
+    assert not Session.objects.exists()
+
+
+@pytest.mark.django_db
+def test_chooseleaarningsession_view_query_count(client, user, category, django_assert_num_queries):
+    """Number of queries for creating session doesn't depend on the amount of flashcards"""
+    for number in range(60):
+        card = QuestionText.objects.create(question=f"question {number}", answer=f"answer {number}",
+                                           user=user if number % 2 else None)
+        card.categories.set([category])
+    client.force_login(user=user)
+    with django_assert_num_queries(11):
+        response = client.post('/choose_session', {'amount_of_cards': 50, 'category': category.pk})
+    session = Session.objects.get()
+    assert response.url == reverse('flashcard_question', kwargs={"session_id": session.id})
+    assert FlashCardsTextStatus.objects.filter(session=session).count() == 50
+    assert SessionCardState.objects.filter(session=session).count() == 50
+
+
 # tests for FlashcardTextQuestionView:
 
 @pytest.mark.django_db
@@ -249,7 +516,35 @@ def test_flashcardtextquestionview_with_result_zero(client, user, category, sess
     response = client.get(reverse('flashcard_question', kwargs={'session_id': session.id}))
     assert response.status_code == 200
     assert response.context["questiontext"] == textflashcard_2  # flashcard with result "0""
-    assert response.context["flashcard_status"] == flashcards_status_2
+    assert response.context["flashcard_state"].flash_card == textflashcard_2
+    assert response.context["flashcard_state"].result == flashcards_status_2.result
+
+
+@pytest.mark.django_db
+def test_flashcardtextquestionview_finished_session(client, user, session, textflashcard, textflashcard_2,
+                                                     flashcards_status_1, flashcards_status_2, flashcards_status_3):
+    """Check if session where all flashcards have the newest result "1" or "2" is redirected to finish page"""
+    FlashCardsTextStatus.objects.record_result(session.id, textflashcard.id, 0, user.id)
+    FlashCardsTextStatus.objects.record_result(session.id, textflashcard.id, 1, user.id)
+    FlashCardsTextStatus.objects.record_result(session.id, textflashcard_2.id, 2, user.id)
+    client.force_login(user=user)
+    response = client.get(reverse('flashcard_question', kwargs={'session_id': session.id}))
+    assert response.status_code == 302
+    assert response.url == reverse('finish_page', kwargs={'session_id': session.id})
+
+
+@pytest.mark.django_db
+def test_flashcardtextquestionview_query_count(client, user, category, session, django_assert_num_queries):
+    """Number of queries doesn't depend on the amount of flashcards in session"""
+    client.force_login(user=user)
+    with django_assert_num_queries(3):
+        client.get(reverse('flashcard_question', kwargs={'session_id': session.id}))
+    for number in range(50):
+        card = QuestionText.objects.create(question=f"question {number}", answer=f"answer {number}", user=user)
+        session.add_flash_cards([card.id])
+        FlashCardsTextStatus.objects.record_result(session.id, card.id, 1, user.id)
+    with django_assert_num_queries(3):
+        client.get(reverse('flashcard_question', kwargs={'session_id': session.id}))
 
 
 # tests for FlashcardTextAnswerView:
@@ -276,6 +571,520 @@ def test_flashcardtextanswerview(client, user, session, textflashcard_2):
     assert FlashCardsTextStatus.objects.count() == initial_flashcardstextstatus_count + 1
 
 
+@pytest.mark.django_db
+def test_flashcardtextanswerview_updates_card_state(client, user, session, textflashcard_2):
+    """test for FlashcardTextAnswerView - each answer updates current state of the flashcard in session"""
+    client.force_login(user=user)
+    url = reverse('flashcard_answer', kwargs={'session_id': session.id, 'questiontext_id': textflashcard_2.id})
+    client.post(url, {'result': 0})
+    client.post(url, {'result': 1})
+    state = SessionCardState.objects.get(session=session, flash_card=textflashcard_2)
+    assert state.result == 1
+    assert state.attempts == 2
+    assert state.last_answered == FlashCardsTextStatus.objects.filter(session=session, flash_card=textflashcard_2).latest('date').date
+    assert SessionCardState.objects.filter(session=session).count() == 3
+
+
+# tests for spaced repetition scheduler
+
+def test_scheduler_intervals_grow_for_correct_answers():
+    """SM-2 intervals are 1, 6 and then multiplied by ease, wrong answer starts repetitions again"""
+    ease, interval, repetitions = scheduler.next_schedule(2.5, 0, 0, 2)
+    assert (interval, repetitions) == (1, 1)
+    ease, interval, repetitions = scheduler.next_schedule(ease, interval, repetitions, 2)
+    assert (interval, repetitions) == (6, 2)
+    ease, interval, repetitions = scheduler.next_schedule(ease, interval, repetitions, 1)
+    assert interval == 16
+    assert repetitions == 3
+    ease, interval, repetitions = scheduler.next_schedule(ease, interval, repetitions, 0)
+    assert (interval, repetitions) == (1, 0)
+    assert ease >= scheduler.MIN_EASE
+
+
+@pytest.mark.django_db
+def test_scheduler_updated_by_answer(client, user, session, textflashcard_2):
+    """Answer in FlashcardTextAnswerView creates schedule of the flashcard for user"""
+    client.force_login(user=user)
+    client.post(reverse('flashcard_answer', kwargs={'session_id': session.id, 'questiontext_id': textflashcard_2.id}),
+                {'result': 2})
+    schedule = CardSchedule.objects.get(user=user, flash_card=textflashcard_2)
+    assert schedule.repetitions == 1
+    assert schedule.due_date > timezone.now()
+
+
+@pytest.mark.django_db
+def test_scheduler_session_cards_due_first(user, category, textflashcard, textflashcard_2, textflashcard_3):
+    """Overdue flashcards are chosen first, then new ones, flashcards due in future fill remaining places"""
+    now = timezone.now()
+    scheduler.review_many(user.id, [(textflashcard.id, 0)], now=now - timedelta(days=2))
+    scheduler.review_many(user.id, [(textflashcard_2.id, 2)], now=now)
+    assert scheduler.session_card_ids(user.id, category, 1) == [textflashcard.id]
+    assert scheduler.session_card_ids(user.id, category, 2) == [textflashcard.id, textflashcard_3.id]
+    assert scheduler.session_card_ids(user.id, category, 3) == [textflashcard.id, textflashcard_3.id,
+                                                                textflashcard_2.id]
+
+
+@pytest.mark.django_db
+def test_scheduler_study_ahead(client, user, category, textflashcard, textflashcard_2):
+    """When all flashcards are learned and none is due, session has flashcards due soonest"""
+    now = timezone.now()
+    scheduler.review_many(user.id, [(textflashcard.id, 2)], now=now + timedelta(days=3))
+    scheduler.review_many(user.id, [(textflashcard_2.id, 2)], now=now)
+    assert scheduler.session_card_ids(user.id, category, 1) == [textflashcard_2.id]
+    client.force_login(user=user)
+    client.post('/choose_session', {'amount_of_cards': 5, 'category': category.pk})
+    assert Session.objects.get().card_states.count() == 2
+
+
+@pytest.mark.django_db
+def test_due_queue_follows_flashcard_categories(user, category, category_2, textflashcard):
+    """Flashcard moved to another category is moved in queue of due flashcards"""
+    scheduler.review_many(user.id, [(textflashcard.id, 0)], now=timezone.now() - timedelta(days=2))
+    assert scheduler.pop_due(user.id, category, 10) == [textflashcard.id]
+    textflashcard.categories.set([category_2])
+    assert scheduler.pop_due(user.id, category, 10) == []
+    assert scheduler.pop_due(user.id, category_2, 10) == [textflashcard.id]
+
+
+# tests for cached numbers of flashcards in categories
+
+def assert_stats_rebuilt_equal():
+    """Incrementally maintained CategoryStats are the same as counted from scratch"""
+    def rows():
+        return sorted(CategoryStats.objects.filter(Q(cards__gt=0) | Q(mastered_cards__gt=0))
+                      .values_list('user_id', 'category_id', 'cards', 'mastered_cards'), key=str)
+    incremental = rows()
+    stats.rebuild()
+    assert rows() == incremental
+
+
+@pytest.mark.django_db
+def test_category_stats_follow_flashcards(user, user_login, category, category_2, textflashcard, textflashcard_2):
+    common = QuestionText.objects.create(question="Ecuador", answer="Quito")
+    common.categories.set([category, category_2])
+    QuestionText.objects.create(question="Bolivia", answer="Sucre", user=user_login).categories.set([category])
+    counts = stats.category_counts(user.id)
+    assert (counts[category.id].own, counts[category.id].common, counts[category.id].total) == (2, 1, 3)
+    assert counts[category_2.id].total == 1
+    category_2.questiontext_set.add(textflashcard)
+    textflashcard_2.categories.clear()
+    common.delete()
+    counts = stats.category_counts(user.id)
+    assert (counts[category.id].total, counts[category_2.id].total) == (1, 1)
+    textflashcard.user = user_login
+    textflashcard.save()
+    assert stats.category_counts(user.id)[category.id].total == 0
+    assert stats.category_counts(user_login.id)[category.id].total == 2
+    importer.import_flashcards([{'question': "Peru", 'answer': "Lima", 'categories': ["Mountains"]}] * 3, user)
+    assert stats.category_counts(user.id)[category_2.id].total == 3
+    assert_stats_rebuilt_equal()
+
+
+@pytest.mark.django_db
+def test_category_stats_due_and_mastery(user, category, textflashcard, textflashcard_2):
+    now = timezone.now()
+    for _ in range(4):
+        scheduler.review_many(user.id, [(textflashcard.id, 2)], now=now - timedelta(days=10))
+    scheduler.review_many(user.id, [(textflashcard_2.id, 0)], now=now - timedelta(days=2))
+    counts = stats.category_counts(user.id, now=now)[category.id]
+    assert (counts.mastered, counts.due, counts.mastery) == (1, 1, 50)
+    assert_stats_rebuilt_equal()
+    scheduler.review_many(user.id, [(textflashcard.id, 0)], now=now)
+    assert stats.category_counts(user.id)[category.id].mastered == 0
+
+
+@pytest.mark.django_db
+def test_category_list_and_session_chooser_show_counts(client, user, category, textflashcard):
+    client.force_login(user=user)
+    response = client.get('/category_list')
+    assert response.context['category_list'][0].counts.total == 1
+    response = client.get('/choose_session')
+    assert "Capital Cities (1 flashcards, 0 due, 0% mastered)" in response.content.decode()
+
+
+# tests for cached responses
+
+def test_local_memory_cache_refused_with_many_workers(settings):
+    settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+    settings.FLASH_WEB_WORKERS = 2
+    assert [error.id for error in caching.check_shared_cache(None)] == ['flash_app.E001']
+    settings.FLASH_WEB_WORKERS = 1
+    assert caching.check_shared_cache(None) == []
+
+
+@pytest.mark.django_db
+def test_category_list_cached_until_category_changes(client, user, category, django_assert_num_queries):
+    client.force_login(user=user)
+    client.get('/category_list')
+    with django_assert_num_queries(2):
+        response = client.get('/category_list')
+    assert "Capital Cities" in response.content.decode()
+    client.post('/add_category', {'category_name': "Rivers", 'category_description': "The longest rivers"})
+    assert "Rivers" in client.get('/category_list').content.decode()
+    Category.objects.filter(category_name="Rivers").delete()
+    assert "Rivers" not in client.get('/category_list').content.decode()
+
+
+@pytest.mark.django_db
+def test_flashcards_list_cached_per_user(client, user, user_login, textflashcard, django_assert_num_queries):
+    other_client = Client()
+    other_client.force_login(user=user_login)
+    client.force_login(user=user)
+    client.get('/flashcards_list')
+    other_client.get('/flashcards_list')
+    QuestionText.objects.create(question="Bolivia", answer="Sucre", user=user_login)
+    with django_assert_num_queries(2):
+        client.get('/flashcards_list')
+    assert len(other_client.get('/flashcards_list').context['questiontext_list']) == 1
+    textflashcard.answer = "Cuzco"
+    textflashcard.save()
+    assert "Cuzco" in client.get('/flashcards_list').content.decode()
+
+
+@pytest.mark.django_db
+def test_category_list_cache_invalidated_by_answer(client, user, session, textflashcard):
+    client.force_login(user=user)
+    client.get('/category_list')
+    client.post(reverse('flashcard_answer', kwargs={'session_id': session.id, 'questiontext_id': textflashcard.id}),
+                {'result': 0})
+    scheduler.review_many(user.id, [(textflashcard.id, 0)], now=timezone.now() - timedelta(days=2))
+    assert client.get('/category_list').context['category_list'][0].counts.due == 1
+
+
+def test_cached_response_expires():
+    caching.set_response('response:test', "response", expires=timezone.now() + timedelta(hours=1))
+    assert caching.get_response('response:test') == "response"
+    caching.set_response('response:test', "response", expires=timezone.now() - timedelta(seconds=1))
+    assert caching.get_response('response:test') is None
+
+
+# tests for JSON API of learning sessions
+
+def post_json(client, url, data):
+    return client.post(url, json.dumps(data), content_type='application/json')
+
+
+@pytest.mark.django_db
+def test_api_learning_session(client, user, category, textflashcard, textflashcard_2, textflashcard_3):
+    client.force_login(user=user)
+    response = post_json(client, '/api/sessions', {'category': category.id, 'amount_of_cards': 3})
+    assert response.status_code == 201
+    session_id = response.json()['session_id']
+    cards = client.get(f'/api/sessions/{session_id}/cards', {'limit': 2}).json()['cards']
+    assert len(cards) == 2
+    assert {card['answer'] for card in cards} <= {"Lima", "Santiago", "Bogota"}
+    answers = [{'card_id': cards[0]['id'], 'result': 0}, {'card_id': cards[1]['id'], 'result': 2},
+               {'card_id': cards[0]['id'], 'result': 1}]
+    response = post_json(client, f'/api/sessions/{session_id}/answers', {'answers': answers})
+    assert response.json() == {'recorded': 3, 'remaining': 1, 'finished': False}
+    state = SessionCardState.objects.get(session_id=session_id, flash_card_id=cards[0]['id'])
+    assert (state.result, state.attempts) == (1, 2)
+    assert CardSchedule.objects.filter(user=user).count() == 2
+    last_card = client.get(f'/api/sessions/{session_id}/cards').json()['cards']
+    post_json(client, f'/api/sessions/{session_id}/answers', {'answers': [{'card_id': last_card[0]['id'],
+                                                                          'result': 2}]})
+    assert client.get(f'/api/sessions/{session_id}/cards').json() == {'session_id': session_id, 'cards': [],
+                                                                     'finished': True}
+    summary = client.get(f'/api/sessions/{session_id}').json()
+    assert summary['finished'] and summary['cards_learned'] == 3
+    assert (summary['wrong_answers'], summary['difficult_answers'], summary['correct_answers']) == (1, 1, 2)
+
+
+@pytest.mark.django_db
+def test_api_answers_query_count_independent_of_batch_size(client, user, session, textflashcard, textflashcard_2,
+                                                           textflashcard_3, django_assert_max_num_queries):
+    client.force_login(user=user)
+    url = f'/api/sessions/{session.id}/answers'
+    with django_assert_max_num_queries(16):
+        post_json(client, url, {'answers': [{'card_id': textflashcard.id, 'result': 0}]})
+    with django_assert_max_num_queries(16):
+        post_json(client, url, {'answers': [{'card_id': card.id, 'result': 2}
+                                            for card in (textflashcard, textflashcard_2, textflashcard_3)]})
+    assert FlashCardsTextStatus.objects.filter(session=session, result__isnull=False).count() == 4
+
+
+@pytest.mark.django_db
+def test_api_session_of_other_user(client, user_login, session, textflashcard):
+    client.force_login(user=user_login)
+    assert client.get(f'/api/sessions/{session.id}/cards').status_code == 404
+    response = post_json(client, f'/api/sessions/{session.id}/answers',
+                         {'answers': [{'card_id': textflashcard.id, 'result': 2}]})
+    assert response.status_code == 404
+    assert not FlashCardsTextStatus.objects.filter(session=session, result=2).exists()
+
+
+@pytest.mark.django_db
+def test_api_requires_login_and_valid_data(client, user, session, textflashcard):
+    assert client.get(f'/api/sessions/{session.id}/cards').status_code == 401
+    client.force_login(user=user)
+    assert post_json(client, f'/api/sessions/{session.id}/answers', {'answers': []}).status_code == 400
+    assert post_json(client, f'/api/sessions/{session.id}/answers',
+                     {'answers': [{'card_id': textflashcard.id, 'result': 5}]}).status_code == 400
+    assert client.post('/api/sessions', "not json", content_type='application/json').status_code == 400
+    for limit in ('0', '-3', 'ten'):
+        assert client.get(f'/api/sessions/{session.id}/cards?limit={limit}').status_code == 400
+    assert len(client.get(f'/api/sessions/{session.id}/cards?limit=1000').json()['cards']) == 3
+
+
+@pytest.mark.django_db
+def test_scheduler_review_many_as_single_reviews(user, user_login, category, textflashcard, textflashcard_2):
+    """Batch of answers gives the same schedules as the answers written one by one"""
+    now = timezone.now()
+    results = [(textflashcard.id, 2), (textflashcard_2.id, 0), (textflashcard.id, 2), (textflashcard.id, 1)]
+    for card_id, result in results:
+        scheduler.review_many(user.id, [(card_id, result)], now=now)
+    scheduler.review_many(user_login.id, results, now=now)
+    for card in (textflashcard, textflashcard_2):
+        single = CardSchedule.objects.get(user=user, flash_card=card)
+        batch = CardSchedule.objects.get(user=user_login, flash_card=card)
+        assert (single.ease, single.interval, single.repetitions, single.due_date) == \
+            (batch.ease, batch.interval, batch.repetitions, batch.due_date)
+    assert DueCard.objects.filter(user=user_login).count() == 2
+
+
+# tests for async views of the learning flow
+
+@pytest.mark.django_db
+def test_async_learning_session(client, user, category, textflashcard, textflashcard_2):
+    """Async views go through the same flow as sync views, links lead to async views"""
+    client.force_login(user=user)
+    assert client.get('/async/choose_session').status_code == 200
+    response = client.post('/async/choose_session', {'amount_of_cards': 5, 'category': category.id})
+    session = Session.objects.get()
+    assert response.url == reverse('async_flashcard_question', kwargs={'session_id': session.id})
+    for _ in range(2):
+        response = client.get(response.url)
+        answer_url = response.context['answer_url']
+        assert answer_url in response.content.decode()
+        assert answer_url.startswith('/async/flashcard_answer/')
+        assert client.get(answer_url).status_code == 200
+        response = client.post(answer_url, {'result': 2})
+    response = client.get(response.url)
+    assert response.url == reverse('async_finish_page', kwargs={'session_id': session.id})
+    response = client.get(response.url)
+    assert response.context['amount'] == 2
+    assert CardSchedule.objects.filter(user=user).count() == 2
+
+
+@pytest.mark.django_db
+def test_async_views_with_asgi_handler(async_client, user, session, textflashcard):
+    async_client.force_login(user=user)
+
+    @async_to_sync
+    async def answer():
+        response = await async_client.get(f'/async/flashcard_answer/{session.id}/{textflashcard.id}')
+        assert "Lima" in response.content.decode()
+        response = await async_client.post(f'/async/flashcard_answer/{session.id}/{textflashcard.id}',
+                                           {'result': 0})
+        assert response.url == f'/async/flashcard_question/{session.id}'
+        response = await async_client.get(response.url)
+        assert response.status_code == 200
+        response = await async_client.get(f'/async/flashcard_answer/{session.id}/0')
+        assert response.status_code == 404
+    answer()
+    state = SessionCardState.objects.get(session=session, flash_card=textflashcard)
+    assert (state.result, state.attempts) == (0, 1)
+
+
+@pytest.mark.django_db
+def test_async_views_require_login(client, session):
+    response = client.get(f'/async/flashcard_question/{session.id}')
+    assert response.status_code == 302
+    assert response.url.startswith('/accounts/login/')
+
+
+@pytest.mark.django_db
+def test_async_choose_session_without_flashcards(client, user, category):
+    client.force_login(user=user)
+    response = client.post('/async/choose_session', {'amount_of_cards': 5, 'category': category.id})
+    assert response.url == reverse('async_choose_session')
+    assert not Session.objects.exists()
+
+
+# tests for answers buffer
+
+@pytest.mark.django_db
+def test_answers_buffered_until_finish_page(client, user, session, textflashcard, textflashcard_2, textflashcard_3,
+                                            settings, django_assert_max_num_queries):
+    settings.FLASH_ANSWER_BUFFER_SIZE = 100
+    settings.FLASH_ANSWER_BUFFER_SECONDS = 3600
+    client.force_login(user=user)
+    for card, result in ((textflashcard, 0), (textflashcard, 2), (textflashcard_2, 1), (textflashcard_3, 2)):
+        with django_assert_max_num_queries(4):
+            response = client.post(reverse('flashcard_answer', kwargs={'session_id': session.id,
+                                                                       'questiontext_id': card.id}),
+                                   {'result': result})
+        assert response.url == reverse('flashcard_question', kwargs={'session_id': session.id})
+    assert SessionCardState.objects.get(session=session, flash_card=textflashcard).attempts == 2
+    assert not FlashCardsTextStatus.objects.filter(session=session, result__isnull=False).exists()
+    assert len(answers.buffer) == 4
+    response = client.get(reverse('finish_page', kwargs={'session_id': session.id}))
+    assert response.context['amount'] == 3
+    assert not answers.buffer
+    statuses = FlashCardsTextStatus.objects.filter(session=session, result__isnull=False).order_by('date')
+    assert [status.result for status in statuses] == [0, 2, 1, 2]
+    assert CardSchedule.objects.filter(user=user).count() == 3
+
+
+@pytest.mark.django_db
+def test_answer_to_session_of_other_user(client, user_login, session, textflashcard, settings):
+    settings.FLASH_ANSWER_BUFFER_SIZE = 100
+    client.force_login(user=user_login)
+    response = client.post(reverse('flashcard_answer', kwargs={'session_id': session.id,
+                                                               'questiontext_id': textflashcard.id}), {'result': 2})
+    assert response.status_code == 404
+    assert SessionCardState.objects.get(session=session, flash_card=textflashcard).attempts == 0
+    assert not answers.buffer
+
+
+@pytest.mark.django_db
+def test_answers_of_deleted_session_dropped(user, session, textflashcard, textflashcard_2, settings):
+    settings.FLASH_ANSWER_BUFFER_SIZE = 100
+    settings.FLASH_ANSWER_BUFFER_SECONDS = 3600
+    answers.record(session.id, textflashcard.id, user.id, 2)
+    other_session = Session.objects.create(user=user, category=session.category, amount_of_cards=1)
+    other_session.add_flash_cards([textflashcard_2.id])
+    answers.record(other_session.id, textflashcard_2.id, user.id, 0)
+    session.delete()
+    assert answers.flush() == 2
+    assert list(FlashCardsTextStatus.objects.filter(result__isnull=False).values_list('session_id', 'result')) == \
+        [(other_session.id, 0)]
+
+
+@pytest.mark.django_db
+def test_summary_not_stored_with_answers_buffered_in_other_process(user, session, textflashcard, textflashcard_2,
+                                                                    textflashcard_3, settings):
+    settings.FLASH_ANSWER_BUFFER_SIZE = 100
+    settings.FLASH_ANSWER_BUFFER_SECONDS = 3600
+    for card in (textflashcard, textflashcard_2, textflashcard_3):
+        answers.record(session.id, card.id, user.id, 2)
+    session.update_summary()
+    assert not Session.objects.get(id=session.id).finished
+    answers.flush()
+    session.update_summary()
+    session = Session.objects.get(id=session.id)
+    assert session.finished
+    assert session.correct_answers == 3
+
+
+@pytest.mark.django_db
+def test_buffered_answers_scheduled_from_date_of_answer(user, session, textflashcard, settings):
+    settings.FLASH_ANSWER_BUFFER_SIZE = 100
+    settings.FLASH_ANSWER_BUFFER_SECONDS = 3600
+    answers.record(session.id, textflashcard.id, user.id, 2)
+    answered = answers.buffer[0].date
+    answers.buffer[0] = answers.buffer[0]._replace(date=answered - timedelta(days=3))
+    answers.flush()
+    assert CardSchedule.objects.get(user=user, flash_card=textflashcard).due_date == answered - timedelta(days=2)
+
+
+@pytest.mark.django_db
+def test_finish_page_when_flush_fails(client, user, session, textflashcard, settings, monkeypatch):
+    """Answers stay buffered and summary is shown without them"""
+    settings.FLASH_ANSWER_BUFFER_SIZE = 100
+    settings.FLASH_ANSWER_BUFFER_SECONDS = 3600
+    answers.record(session.id, textflashcard.id, user.id, 2)
+
+    def fail(buffered):
+        raise DatabaseError("database is down")
+    monkeypatch.setattr(answers, 'write', fail)
+    client.force_login(user=user)
+    response = client.get(reverse('finish_page', kwargs={'session_id': session.id}))
+    assert response.status_code == 200
+    assert len(answers.buffer) == 1
+    assert not Session.objects.get(id=session.id).finished
+
+
+# tests for archive of study history
+
+@pytest.mark.django_db
+def test_archive_moves_history_of_old_finished_sessions(user, session, category, textflashcard, flashcards_status_2):
+    """History of old finished session is moved with the same ids, export reads both tables"""
+    Session.objects.filter(id=session.id).update(finished=True)
+    new_session = Session.objects.create(user=user, category=category, amount_of_cards=1, finished=True)
+    new_session.add_flash_cards([textflashcard.id])
+    unfinished = Session.objects.create(user=user, category=category, amount_of_cards=1)
+    unfinished.add_flash_cards([textflashcard.id])
+    Session.objects.filter(id__in=[session.id, unfinished.id]).update(start_date=timezone.now() - timedelta(days=100))
+    session_history = list(FlashCardsTextStatus.objects.filter(session=session).order_by('id')
+                           .values_list('id', 'flash_card_id', 'result', 'date'))
+    exported = [record for record in exporter.records(user) if record['type'] == 'answer']
+    assert archive.archive(batch_size=1) == 4
+    assert not FlashCardsTextStatus.objects.filter(session=session).exists()
+    assert FlashCardsTextStatus.objects.filter(session__in=[new_session, unfinished]).count() == 2
+    assert list(ArchivedTextStatus.objects.filter(session=session).order_by('id')
+                .values_list('id', 'flash_card_id', 'result', 'date')) == session_history
+    assert [record for record in exporter.records(user) if record['type'] == 'answer'] == exported
+    assert archive.archive() == 0
+
+
+@pytest.mark.django_db
+def test_finish_page_of_archived_session(client, user, session, flashcards_status_2):
+    """Summary of finished session is stored, so it doesn't change when history is archived"""
+    SessionCardState.objects.filter(session=session).update(result=2)
+    client.force_login(user=user)
+    summary = client.get(reverse('finish_page', kwargs={'session_id': session.id})).context['session']
+    archive.archive(timezone.now())
+    response = client.get(reverse('finish_page', kwargs={'session_id': session.id}))
+    assert response.context['session'].wrong_answers == summary.wrong_answers == 1
+    assert response.context['session'].cards_learned == summary.cards_learned
+
+
+@pytest.mark.django_db
+def test_archived_history_deleted_with_session(session, flashcards_status_2):
+    Session.objects.filter(id=session.id).update(finished=True)
+    archive.archive(timezone.now())
+    session.delete()
+    assert not ArchivedTextStatus.objects.exists()
+
+
+# tests for routing of reads to replicas
+
+def test_replica_router_reads_from_replica_when_enabled(settings):
+    settings.FLASH_REPLICA_DATABASES = ['replica']
+    assert Category.objects.all().db == 'default'
+    token = routers.replica_reads.set(True)
+    try:
+        assert Category.objects.all().db == 'replica'
+        assert Category.objects.select_for_update().db == 'default'
+        assert routers.ReplicaRouter().db_for_write(Category) == 'default'
+    finally:
+        routers.replica_reads.reset(token)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_replica_reads_until_user_writes(client, user, session, textflashcard, replica):
+    client.force_login(user=user)
+    with CaptureQueriesContext(replica) as replica_queries:
+        response = client.get('/flashcards_list')
+    assert "Peru" in response.content.decode()
+    assert len(replica_queries) > 0
+    with CaptureQueriesContext(replica) as replica_queries:
+        client.get(reverse('choose_session'))
+        response = client.post(reverse('flashcard_answer', kwargs={'session_id': session.id,
+                                                                   'questiontext_id': textflashcard.id}),
+                               {'result': 2})
+    assert len(replica_queries) == 0
+    assert routers.PRIMARY_COOKIE in response.cookies
+    with CaptureQueriesContext(replica) as replica_queries:
+        client.get(reverse('finish_page', kwargs={'session_id': session.id}))
+    assert len(replica_queries) == 0
+    del client.cookies[routers.PRIMARY_COOKIE]
+    with CaptureQueriesContext(replica) as replica_queries:
+        client.get('/category_list')
+    assert len(replica_queries) > 0
+
+
+@pytest.mark.django_db(transaction=True)
+def test_responses_from_replica_cached_for_replication_lag(client, user, textflashcard, replica, settings):
+    settings.FLASH_REPLICA_LAG = 0
+    client.force_login(user=user)
+    for _ in range(2):
+        with CaptureQueriesContext(replica) as replica_queries:
+            client.get('/flashcards_list')
+        assert len(replica_queries) > 0
+
+
 # tests for finish page
 
 @pytest.mark.django_db
@@ -296,6 +1105,382 @@ def test_finish_page_view_with_login(client, user, session):
     assert response.context['category'] == session.category.category_name
 
 
+@pytest.mark.django_db
+def test_finish_page_view_stores_summary(client, user, session, textflashcard_2, flashcards_status_1,
+                                         flashcards_status_2, flashcards_status_3, django_assert_num_queries):
+    """Summary of finished session is saved and next visits read it with one query for the session"""
+    FlashCardsTextStatus.objects.record_result(session.id, textflashcard_2.id, 2, user.id)
+    client.force_login(user=user)
+    response = client.get(reverse('finish_page', kwargs={'session_id': session.id}))
+    assert response.status_code == 200
+    session.refresh_from_db()
+    assert session.finished
+    assert session.cards_learned == 3
+    assert (session.wrong_answers, session.difficult_answers, session.correct_answers) == (1, 1, 2)
+    assert response.context['time'] == session.learning_time
+    with django_assert_num_queries(3):
+        response = client.get(reverse('finish_page', kwargs={'session_id': session.id}))
+    assert response.context['amount'] == 3
+
+
+@pytest.mark.django_db
+def test_finish_page_view_for_unfinished_session(client, user, session, flashcards_status_2):
+    """Summary of session with pending flashcards is not saved"""
+    client.force_login(user=user)
+    response = client.get(reverse('finish_page', kwargs={'session_id': session.id}))
+    assert response.status_code == 200
+    session.refresh_from_db()
+    assert not session.finished
+
+
+# tests for request instrumentation
+
+@pytest.mark.django_db
+def test_instrumentation_of_sampled_request(client, settings, user, session, flashcards_status_2):
+    """Sampled requests get Server-Timing header and are aggregated per URL name"""
+    settings.FLASH_INSTRUMENTATION_SAMPLE_RATE = 1
+    instrumentation.reset()
+    client.force_login(user=user)
+    response = client.get(reverse('flashcard_question', kwargs={'session_id': session.id}))
+    assert 'db;dur=' in response['Server-Timing']
+    assert 'total;dur=' in response['Server-Timing']
+    stats = instrumentation.snapshot()['flashcard_question']
+    assert stats['requests'] == 1
+    assert stats['max_queries'] == 3
+    assert sum(stats['wall_ms_histogram'].values()) == 1
+
+
+@pytest.mark.django_db
+def test_instrumentation_of_async_view(async_client, settings, user, session, textflashcard):
+    """Queries of async views run in other thread are counted"""
+    settings.FLASH_INSTRUMENTATION_SAMPLE_RATE = 1
+    instrumentation.reset()
+    async_client.force_login(user=user)
+    response = async_to_sync(async_client.get)(f'/async/flashcard_answer/{session.id}/{textflashcard.id}')
+    assert 'db;dur=' in response['Server-Timing']
+    assert instrumentation.snapshot()['async_flashcard_answer']['max_queries'] >= 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_instrumentation_counts_replica_queries(client, settings, user, category, replica):
+    settings.FLASH_INSTRUMENTATION_SAMPLE_RATE = 1
+    instrumentation.reset()
+    client.force_login(user=user)
+    with CaptureQueriesContext(connection) as primary_queries, CaptureQueriesContext(replica) as replica_queries:
+        client.get('/category_list')
+    assert len(replica_queries) > 0
+    assert instrumentation.snapshot()['category_list']['max_queries'] == len(primary_queries) + len(replica_queries)
+
+
+def test_instrumentation_merges_worker_processes(monkeypatch):
+    """Statistics published by each worker process are merged, stats of the process are kept in the cache"""
+    instrumentation.reset()
+    for process, wall_times in (('web-1:10', [0.003]), ('web-1:11', [0.2, 0.004])):
+        monkeypatch.setattr(instrumentation, 'process_id', lambda: process)
+        monkeypatch.setattr(instrumentation, 'stats', {})
+        for wall_time in wall_times:
+            metrics = instrumentation.RequestMetrics()
+            metrics(lambda *args: None, 'SELECT 1', (), False, {})
+            metrics.wall_time = wall_time
+            instrumentation.record('index', metrics)
+    stats = instrumentation.snapshot()['index']
+    assert (stats['requests'], stats['max_queries']) == (3, 1)
+    assert (stats['wall_ms_histogram']['5'], stats['wall_ms_histogram']['250']) == (2, 1)
+    instrumentation.reset()
+    assert instrumentation.snapshot() == {}
+
+@pytest.mark.django_db
+def test_instrumentation_not_sampled_request(client, settings):
+    settings.FLASH_INSTRUMENTATION_SAMPLE_RATE = 0
+    response = client.get('/')
+    assert 'Server-Timing' not in response
+
+
+def test_instrumentation_repeated_queries():
+    """Queries with the same SQL in one request are counted as repeated"""
+    metrics = instrumentation.RequestMetrics()
+    for card_id in range(3):
+        metrics(lambda *args: None, 'SELECT * FROM flash_app_questiontext WHERE id = %s', (card_id,), False, {})
+    metrics(lambda *args: None, 'SELECT * FROM flash_app_session', (), False, {})
+    metrics.finish()
+    assert (metrics.queries, metrics.repeated_queries) == (4, 2)
+
+
+@pytest.mark.django_db
+def test_instrumentation_view_for_staff(client, user):
+    client.force_login(user=user)
+    assert client.get('/instrumentation').status_code == 403
+    user.is_staff = True
+    user.save()
+    response = client.get('/instrumentation')
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/json'
+
+
+# tests for benchmark of the learning flow
+
+@pytest.mark.django_db
+def test_benchmark_seed():
+    users = benchmark.seed(users=2, categories=2, cards=40, history_sessions=1, cards_per_session=5)
+    assert len(users) == 2
+    assert QuestionText.objects.count() == 40
+    assert QuestionText.categories.through.objects.count() == 40
+    for state in SessionCardState.objects.all():
+        assert state.attempts == FlashCardsTextStatus.objects.filter(
+            session=state.session, flash_card=state.flash_card, result__isnull=False).count()
+    summary_fields = ('cards_learned', 'learning_time', 'wrong_answers', 'difficult_answers', 'correct_answers')
+    stored = list(Session.objects.order_by('id').values_list('finished', *summary_fields))
+    assert len(stored) == 2 and all(stored_summary[0] for stored_summary in stored)
+    Session.objects.update(finished=False)
+    for session in Session.objects.order_by('id'):
+        session.update_summary()
+    assert list(Session.objects.order_by('id').values_list('finished', *summary_fields)) == stored
+    assert archive.archive(before=timezone.now()) == ArchivedTextStatus.objects.count() > 0
+
+
+@pytest.mark.django_db
+def test_benchmark_study_flow(client):
+    benchmark.seed(users=1, categories=1, cards=10, history_sessions=0)
+    results = benchmark.run_study_flow(sessions=2, cards_per_session=3, client=client)
+    assert results['sessions'] == 2
+    assert set(results['steps']) == set(benchmark.STEPS)
+    assert results['steps']['choose_session']['requests'] == 2
+    assert results['steps']['finish_page']['requests'] == 2
+    assert benchmark.compare(results, results)[0].startswith('choose_session')
+
+
+def test_benchmark_compare_marks_regression():
+    step = {'p95_ms': 10.0, 'max_queries': 3}
+    previous = {'steps': {'flashcard_question': step}}
+    slower = {'steps': {'flashcard_question': dict(step, p95_ms=15.0)}}
+    more_queries = {'steps': {'flashcard_question': dict(step, max_queries=4)}}
+    assert benchmark.compare(previous, slower)[0].startswith('REGRESSION')
+    assert benchmark.compare(previous, more_queries)[0].startswith('REGRESSION')
+    assert not benchmark.compare(previous, previous)[0].startswith('REGRESSION')
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_load_test():
+    benchmark.seed(users=1, categories=1, cards=10, history_sessions=0)
+    results = benchmark.run_load_test(sessions=1, cards_per_session=3, threads=1)
+    for mode in ('wsgi', 'asgi'):
+        assert results[mode]['failed_sessions'] == 0
+        assert results[mode]['steps']['choose_session']['requests'] == 1
+        assert results[mode]['steps']['finish_page']['requests'] == 1
+        assert results[mode]['steps']['flashcard_answer']['requests'] >= 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_connections():
+    benchmark.seed(users=1, categories=1, cards=10, history_sessions=0)
+    results = benchmark.run_connection_benchmark(requests=5, threads=2)
+    assert results['errors'] == 0
+    assert results['requests'] == 5
+    assert results['path'] == reverse('choose_session')
+
+
+# tests for database settings from environment variables
+
+def test_database_settings_postgresql():
+    database = database_settings(Path('/app'), {'FLASH_DB_PASSWORD': 'secret', 'FLASH_DB_CONN_MAX_AGE': '300'})
+    assert database['ENGINE'] == 'django.db.backends.postgresql'
+    assert (database['NAME'], database['USER'], database['PASSWORD']) == ('flashcards', 'postgres', 'secret')
+    assert (database['CONN_MAX_AGE'], database['CONN_HEALTH_CHECKS']) == (300, True)
+    assert database_settings(Path('/app'), {'FLASH_DB_CONN_MAX_AGE': 'none'})['CONN_MAX_AGE'] is None
+
+
+def test_database_settings_pool():
+    database = database_settings(Path('/app'), {'FLASH_DB_POOL_SIZE': '8', 'FLASH_DB_CONN_HEALTH_CHECKS': 'no'})
+    assert database['ENGINE'] == 'flash_app.backends.pooled_postgresql'
+    assert database['POOL'] == {'min_size': 1, 'max_size': 8}
+    assert (database['CONN_MAX_AGE'], database['CONN_HEALTH_CHECKS']) == (0, False)
+
+
+def test_database_settings_sqlite():
+    database = database_settings(Path('/app'), {'FLASH_DB_ENGINE': 'sqlite', 'FLASH_DB_POOL_SIZE': '8'})
+    assert database['ENGINE'] == 'django.db.backends.sqlite3'
+    assert database['NAME'] == str(Path('/app') / 'db.sqlite3')
+    assert 'POOL' not in database
+    with pytest.raises(ValueError):
+        database_settings(Path('/app'), {'FLASH_DB_ENGINE': 'mysql'})
+
+
+
+class FakePooledConnection:
+    """Connection returned by psycopg2.connect() in tests of the pool, broken connection fails the health check"""
+    autocommit = False
+
+    def __init__(self, broken=False):
+        self.closed, self.broken, self.rolled_back = False, broken, False
+
+    @property
+    def info(self):
+        import psycopg2.extensions
+        status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN if self.broken \
+            else psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        return type('ConnectionInfo', (), {'transaction_status': status})
+
+    def cursor(self):
+        import psycopg2
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                return False
+
+            def execute(self, sql):
+                if connection.broken:
+                    raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        return Cursor()
+
+    def rollback(self):
+        self.rolled_back = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def pooled_backend(monkeypatch):
+    """Pooled backend with psycopg2 ThreadedConnectionPool, connections are FakePooledConnection (list of
+    connections opened by the pool is returned), no PostgreSQL server is needed"""
+    pooled_base = pytest.importorskip('flash_app.backends.pooled_postgresql.base')
+    opened = []
+
+    def connect(*args, **kwargs):
+        opened.append(FakePooledConnection())
+        return opened[-1]
+    monkeypatch.setattr(pooled_base, 'pools', {})
+    monkeypatch.setattr(pooled_base.base.psycopg2, 'connect', connect)
+    monkeypatch.setattr(pooled_base.base.psycopg2.extras, 'register_default_jsonb', lambda **kwargs: None)
+    database = database_settings(Path('/app'), {'FLASH_DB_POOL_SIZE': '3'})
+    database.update({'OPTIONS': {}, 'TIME_ZONE': None, 'AUTOCOMMIT': True, 'ATOMIC_REQUESTS': False})
+
+    def wrapper():
+        return pooled_base.DatabaseWrapper(database, alias='pooled')
+    return wrapper, opened
+
+
+def test_pooled_backend_checkout_and_return(pooled_backend):
+    """Connections returned by concurrent requests stay open in the pool up to its size"""
+    wrapper, opened = pooled_backend
+    wrappers = [wrapper() for _ in range(3)]
+    for request in wrappers:
+        request.connection = request.get_new_connection({})
+    assert [request.connection for request in wrappers] == opened
+    assert all(connection.rolled_back for connection in opened)
+    for request in wrappers:
+        request._close()
+    assert not any(connection.closed for connection in opened)
+    assert {id(wrapper().get_new_connection({})) for _ in range(3)} == {id(connection) for connection in opened}
+    assert len(opened) == 3
+
+
+def test_pooled_backend_replaces_broken_connection(pooled_backend):
+    wrapper, opened = pooled_backend
+    request = wrapper()
+    request.connection = request.get_new_connection({})
+    request._close()
+    opened[0].broken = True
+    connection = wrapper().get_new_connection({})
+    assert connection is opened[1] and opened[0].closed
+    opened[1].close()
+    assert wrapper().get_new_connection({}) is opened[2]
+
+
+# query budgets of views: each URL runs at most the same number of queries with 5 and 500 cards in session
+
+QUERY_BUDGETS = [
+    # url name, method, url kwargs from study_set, data of POST request, maximum number of queries
+    ('index', 'get', lambda s: {}, None, 2),
+    ('login', 'get', lambda s: {}, None, 2),
+    ('admin:index', 'get', lambda s: {}, None, 3),
+    ('add_category', 'get', lambda s: {}, None, 2),
+    ('update_category', 'get', lambda s: {'pk': s.category.id}, None, 3),
+    ('delete_category', 'get', lambda s: {'pk': s.category.id}, None, 3),
+    ('add_textflashcard', 'get', lambda s: {}, None, 3),
+    ('import_flashcards', 'get', lambda s: {}, None, 3),
+    ('export_flashcards', 'get', lambda s: {}, None, 8),
+    ('choose_session', 'get', lambda s: {}, None, 5),
+    ('choose_session', 'post', lambda s: {}, lambda s: {'amount_of_cards': 20, 'category': s.category.id}, 12),
+    ('flashcard_question', 'get', lambda s: {'session_id': s.session.id}, None, 3),
+    ('flashcard_answer', 'get', lambda s: {'session_id': s.session.id, 'questiontext_id': s.text_card.id}, None, 3),
+    ('flashcard_answer', 'post', lambda s: {'session_id': s.session.id, 'questiontext_id': s.text_card.id},
+     lambda s: {'result': 2}, 15),
+    ('finish_page', 'get', lambda s: {'session_id': s.session.id}, None, 5),
+    ('category_list', 'get', lambda s: {}, None, 6),
+    ('flashcards_list', 'get', lambda s: {}, None, 3),
+    ('search', 'get', lambda s: {}, lambda s: {'q': "question 1"}, 4),
+    ('update_questiontext', 'get', lambda s: {'pk': s.text_card.id}, None, 7),
+    ('delete_questiontext', 'get', lambda s: {'pk': s.text_card.id}, None, 5),
+    ('profile', 'get', lambda s: {}, None, 2),
+    ('instrumentation', 'get', lambda s: {}, None, 2),
+    ('add_imageflashcard', 'get', lambda s: {}, None, 3),
+    ('image_list', 'get', lambda s: {}, None, 3),
+    ('choose_image_session', 'get', lambda s: {}, None, 3),
+    ('choose_image_session', 'post', lambda s: {}, lambda s: {'amount_of_cards': 20, 'category': s.category.id}, 10),
+    ('image_question', 'get', lambda s: {'session_id': s.session_image.id}, None, 3),
+    ('image_answer', 'get', lambda s: {'session_id': s.session_image.id, 'questionimage_id': s.image_card.id},
+     None, 3),
+    ('image_answer', 'post', lambda s: {'session_id': s.session_image.id, 'questionimage_id': s.image_card.id},
+     lambda s: {'result': 2}, 7),
+    ('image_finish_page', 'get', lambda s: {'session_id': s.session_image.id}, None, 5),
+    ('api_sessions', 'post', lambda s: {}, lambda s: {'amount_of_cards': 20, 'category': s.category.id}, 12),
+    ('api_session', 'get', lambda s: {'session_id': s.session.id}, None, 5),
+    ('api_session_cards', 'get', lambda s: {'session_id': s.session.id}, lambda s: {'limit': 50}, 3),
+    ('api_session_answers', 'post', lambda s: {'session_id': s.session.id},
+     lambda s: {'answers': [{'card_id': s.text_card.id, 'result': 0}, {'card_id': s.text_card.id, 'result': 2}]},
+     15),
+    ('async_choose_session', 'get', lambda s: {}, None, 5),
+    ('async_choose_session', 'post', lambda s: {}, lambda s: {'amount_of_cards': 20, 'category': s.category.id}, 12),
+    ('async_flashcard_question', 'get', lambda s: {'session_id': s.session.id}, None, 3),
+    ('async_flashcard_answer', 'get', lambda s: {'session_id': s.session.id, 'questiontext_id': s.text_card.id},
+     None, 3),
+    ('async_flashcard_answer', 'post', lambda s: {'session_id': s.session.id, 'questiontext_id': s.text_card.id},
+     lambda s: {'result': 2}, 15),
+    ('async_finish_page', 'get', lambda s: {'session_id': s.session.id}, None, 5),
+]
+
+
+def test_query_budgets_cover_all_urls():
+    from flashcards.urls import urlpatterns
+    names = {pattern.name for pattern in urlpatterns if getattr(pattern, 'name', None)}
+    assert names - {'admin'} <= {url_name for url_name, *_ in QUERY_BUDGETS}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url_name, method, url_kwargs, data, budget', QUERY_BUDGETS,
+                         ids=[f"{budget[1]}_{budget[0]}" for budget in QUERY_BUDGETS])
+def test_query_budget(client, study_set, query_budget, url_name, method, url_kwargs, data, budget):
+    client.force_login(user=study_set.user)
+    url = reverse(url_name, kwargs=url_kwargs(study_set))
+    with query_budget(budget):
+        if method == 'post' and url_name.startswith('api_'):
+            response = client.post(url, json.dumps(data(study_set)), content_type='application/json')
+        else:
+            response = getattr(client, method)(url, data(study_set) if data else None)
+        if response.streaming:
+            b''.join(response.streaming_content)
+    assert response.status_code in (200, 201, 302)
+
+
+@pytest.mark.django_db
+@pytest.mark.query_budget(1)
+def test_query_budget_from_decorator(session):
+    """Decorator limits queries of the whole test, queries of fixtures are not counted"""
+    assert SessionCardState.objects.next_pending(session.id).flash_card.question
+
+
+@pytest.mark.django_db
+def test_query_budget_without_limit(query_budget):
+    with pytest.raises(TypeError, match="needs maximum number of queries"):
+        with query_budget():
+            pass
+
+
 # tests for profile view
 
 @pytest.mark.django_db
@@ -350,8 +1535,138 @@ def test_questionimage_list_view(client, user, imageflashcard):
     assert response.context['image_list'][0] == imageflashcard
 
 
+@pytest.mark.django_db
+def test_questionimage_derivatives(client, settings, tmp_path, user, category, django_capture_on_commit_callbacks):
+    """Thumbnail and medium size WebP images are generated after upload"""
+    settings.MEDIA_ROOT = tmp_path
+    settings.FLASH_IMAGE_WORKERS = 0
+    upload = io.BytesIO()
+    Image.new('RGB', (1600, 1200), 'red').save(upload, 'PNG')
+    client.force_login(user=user)
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post('/add_imageflashcard', {
+            'question': SimpleUploadedFile('map.png', upload.getvalue(), content_type='image/png'),
+            'answer': "Peru", 'categories': category.pk})
+    assert response.status_code == 302
+    question_image = QuestionImage.objects.get()
+    with Image.open(question_image.thumbnail.path) as thumbnail:
+        assert (thumbnail.format, thumbnail.size) == ('WEBP', (200, 150))
+    with Image.open(question_image.medium.path) as medium:
+        assert medium.size == (800, 600)
+    assert question_image.thumbnail_url.endswith('.webp')
+
+
+@pytest.mark.django_db
+def test_questionimage_content_addressed_storage(client, settings, tmp_path, user, category,
+                                                 django_capture_on_commit_callbacks):
+    """The same image uploaded twice is stored once and removed with the last flashcard using it"""
+    settings.MEDIA_ROOT = tmp_path
+    upload = io.BytesIO()
+    Image.new('RGB', (20, 20), 'blue').save(upload, 'PNG')
+    client.force_login(user=user)
+    for name in ('lights_1.png', 'lights_2.png'):
+        client.post('/add_imageflashcard', {'question': SimpleUploadedFile(name, upload.getvalue()),
+                                            'answer': "Peru", 'categories': category.pk})
+    first, second = QuestionImage.objects.order_by('id')
+    assert first.question.name == second.question.name
+    assert first.question.name.startswith('images/')
+    assert StoredFile.objects.get(name=first.question.name).references == 2
+    path = first.question.path
+    first.delete()
+    assert StoredFile.objects.get(name=second.question.name).references == 1
+    assert os.path.exists(path)
+    with django_capture_on_commit_callbacks(execute=True):
+        second.delete()
+    assert not StoredFile.objects.filter(name=second.question.name).exists()
+    assert not os.path.exists(path)
+
+
+@pytest.mark.django_db
+def test_questionimage_file_kept_when_deletion_rolled_back(settings, tmp_path, user):
+    settings.MEDIA_ROOT = tmp_path
+    question_image = QuestionImage.objects.create(question=SimpleUploadedFile('lights.png', b'image'), answer="Peru")
+    with pytest.raises(DatabaseError):
+        with transaction.atomic():
+            question_image.delete()
+            raise DatabaseError("rollback")
+    assert StoredFile.objects.get(name=question_image.question.name).references == 1
+    assert os.path.exists(question_image.question.path)
+
+
+@pytest.mark.django_db
+def test_derivatives_of_deleted_questionimage_released(settings, tmp_path, user):
+    """Image deleted while its derivatives are generated doesn't leave references to derivatives"""
+    settings.MEDIA_ROOT = tmp_path
+    upload = io.BytesIO()
+    Image.new('RGB', (400, 300), 'green').save(upload, 'PNG')
+    question_image = QuestionImage.objects.create(question=SimpleUploadedFile('map.png', upload.getvalue()),
+                                                  answer="Peru")
+    QuestionImage.objects.filter(id=question_image.id).delete()
+    images.generate_derivatives(question_image)
+    assert not StoredFile.objects.exclude(name=question_image.question.name).exists()
+
+
 def test_questionimage_list_view_without_login(client):
     """test for ImageTextListView for no logged user"""
     response = client.get('/image_list')
     assert response.status_code == 302
     assert response.url == '/accounts/login/?next=/image_list'
+
+
+# tests for learning sessions with QuestionImage flashcards
+
+@pytest.mark.django_db
+def test_choose_image_session_view(client, user, category, imageflashcard, imageflashcard_2):
+    """Session with image flashcards is created with its flashcards in "through" table"""
+    client.force_login(user=user)
+    response = client.get('/choose_image_session')
+    assert response.status_code == 200
+    response = client.post('/choose_image_session', {'amount_of_cards': 5, 'category': category.pk})
+    session_image = SessionImage.objects.get()
+    assert response.url == reverse('image_question', kwargs={'session_id': session_image.id})
+    assert QuestionImageStatus.objects.filter(session=session_image).count() == 2
+    assert SessionImageCardState.objects.filter(session=session_image).count() == 2
+
+
+@pytest.mark.django_db
+def test_image_question_view_prefetches_next_flashcard(client, user, session_image, imageflashcard,
+                                                        imageflashcard_2, django_assert_num_queries):
+    """Displayed flashcard and the next one are taken in one query, image of the next one is prefetched"""
+    client.force_login(user=user)
+    with django_assert_num_queries(3):
+        response = client.get(reverse('image_question', kwargs={'session_id': session_image.id}))
+    assert response.status_code == 200
+    shown, next_flashcard = response.context['questionimage'], response.context['next_flashcard']
+    assert {shown, next_flashcard} == {imageflashcard, imageflashcard_2}
+    assert f'<link rel="prefetch" href="{next_flashcard.medium_url}"' in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_image_session_flow(client, user, session_image, imageflashcard, imageflashcard_2):
+    """Answers update state of image flashcards, session is finished when all are answered correctly"""
+    client.force_login(user=user)
+    for flashcard, result in ((imageflashcard, 0), (imageflashcard, 2), (imageflashcard_2, 1)):
+        response = client.post(reverse('image_answer', kwargs={'session_id': session_image.id,
+                                                                'questionimage_id': flashcard.id}), {'result': result})
+        assert response.url == reverse('image_question', kwargs={'session_id': session_image.id})
+    assert SessionImageCardState.objects.get(session=session_image, flash_card=imageflashcard).attempts == 2
+    response = client.get(reverse('image_question', kwargs={'session_id': session_image.id}))
+    assert response.url == reverse('image_finish_page', kwargs={'session_id': session_image.id})
+    response = client.get(response.url)
+    assert response.context['amount'] == 2
+    session_image.refresh_from_db()
+    assert session_image.finished
+    assert (session_image.wrong_answers, session_image.difficult_answers, session_image.correct_answers) == (1, 1, 1)
+
+
+@pytest.mark.django_db
+def test_image_answer_to_session_of_other_user(client, user_login, session_image, imageflashcard):
+    """Answer is not recorded in session of other user, nor in session which doesn't exist"""
+    client.force_login(user=user_login)
+    for session_id in (session_image.id, session_image.id + 1):
+        response = client.post(reverse('image_answer', kwargs={'session_id': session_id,
+                                                                'questionimage_id': imageflashcard.id}), {'result': 2})
+        assert response.status_code == 404
+    assert SessionImageCardState.objects.get(session=session_image, flash_card=imageflashcard).attempts == 0
+    assert not QuestionImageStatus.objects.filter(result__isnull=False).exists()
+
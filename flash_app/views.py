@@ -1,15 +1,26 @@
-from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
+from asgiref.sync import sync_to_async
+from django.contrib.auth.mixins import AccessMixin, LoginRequiredMixin, PermissionRequiredMixin, UserPassesTestMixin
+from django.http import StreamingHttpResponse, Http404, JsonResponse
 from django.template.response import TemplateResponse
+from django.db import transaction
 from django.views import View
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
-from django.views.generic import FormView, ListView, UpdateView, CreateView, DeleteView
+from django.views.generic import FormView, ListView, TemplateView, UpdateView, CreateView, DeleteView
 from django.urls import reverse_lazy, reverse
-from django.shortcuts import render, redirect
-import random
+from django.shortcuts import render, redirect, get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import ensure_csrf_cookie
+import json
+import time
 
-from .models import Category, QuestionText, FlashCardsTextStatus, Session, QuestionImage
-from .forms import FlashcardTextAnswerForm
+from .models import RESULTS, Category, QuestionText, FlashCardsTextStatus, Session, SessionCardState, QuestionImage, \
+    QuestionImageStatus, SessionImage, SessionImageCardState, question_key
+from .forms import FlashcardTextAnswerForm, FlashcardImageAnswerForm, ImportFlashcardsForm, StudySessionForm, \
+    ImageSessionForm
+from .caching import CachedResponseMixin
+from .pagination import KeysetPaginationMixin
+from . import answers, exporter, images, importer, instrumentation, scheduler, search, stats
 
 
 class FlashcardsView(View):
@@ -28,11 +39,25 @@ class AddCategoryView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
         return f"Category {cleaned_data['category_name']} added"
 
 
-class CategoryListView(ListView):
-    """List of all categories with links to update and delete views"""
+class CategoryListView(CachedResponseMixin, KeysetPaginationMixin, ListView):
+    """List of all categories with links to update and delete views. Cached until categories or flashcards
+    change, or until the next flashcard of the user becomes due"""
     paginate_by = 20
+    replica_reads = True
     model = Category
-    ordering = ('category_name', 'category_description')
+    keyset = ('category_name', 'id')
+    cache_dependencies = ('categories', 'common')
+
+    def get_cache_expiry(self):
+        return scheduler.next_due_date(self.request.user.id) if self.request.user.is_authenticated else None
+
+    def get_context_data(self, **kwargs):
+        """Cached numbers of flashcards of the user are added to categories of the page"""
+        context = super().get_context_data(**kwargs)
+        counts = stats.category_counts(self.request.user.id, [category.id for category in context['page_obj']])
+        for category in context['page_obj']:
+            category.counts = counts[category.id]
+        return context
 
 
 class UpdateCategoryView(LoginRequiredMixin,  PermissionRequiredMixin, SuccessMessageMixin, UpdateView):
@@ -69,20 +94,74 @@ class AddTextFlashcardView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
         return super().form_valid(form)
 
 
-class FlashcardsListView(LoginRequiredMixin, ListView):
-    """List of QuestionText flashcards created by logged user with links to update and delete views"""
+class ImportFlashcardsView(LoginRequiredMixin, FormView):
+    """View allowing to import QuestionText flashcards of logged user from CSV, JSON, JSON Lines or Anki TSV file.
+    File is parsed while it is read and flashcards are saved in batches of one transaction"""
+    form_class = ImportFlashcardsForm
+    template_name = 'import_flashcards.html'
+    success_url = reverse_lazy('import_flashcards')
+
+    def form_valid(self, form):
+        uploaded = form.cleaned_data['file']
+        file_format = form.cleaned_data['format'] or importer.guess_format(uploaded.name)
+        category = form.cleaned_data['category']
+        started = time.perf_counter()
+        try:
+            imported = importer.import_flashcards(importer.parse(uploaded.file, file_format), user=self.request.user,
+                                                  default_categories=[category.category_name] if category else [])
+        except (importer.FlashcardImportError, ValueError) as error:
+            form.add_error('file', str(error))
+            return self.form_invalid(form)
+        elapsed = time.perf_counter() - started
+        messages.success(self.request, f"{imported} flashcards imported in {elapsed:.1f} s "
+                                       f"({imported / (elapsed or 1):.0f} flashcards/s)")
+        return super().form_valid(form)
+
+
+class ExportFlashcardsView(LoginRequiredMixin, View):
+    """Export of logged user flashcards with categories and study history, format is chosen with "format"
+    parameter (csv, jsonl or zip). Export is streamed while it is read from the database"""
+    def get(self, request):
+        export_format = request.GET.get('format', 'jsonl')
+        if export_format not in exporter.EXPORTERS:
+            raise Http404("Unknown export format")
+        answers.flush_logged()
+        response = StreamingHttpResponse(exporter.export(request.user, export_format),
+                                         content_type=exporter.CONTENT_TYPES[export_format])
+        response['Content-Disposition'] = f'attachment; filename="flashcards.{export_format}"'
+        return response
+
+
+class FlashcardsListView(LoginRequiredMixin, CachedResponseMixin, KeysetPaginationMixin, ListView):
+    """List of QuestionText flashcards created by logged user with links to update and delete views,
+    cached until flashcards of the user change"""
     paginate_by = 20
+    replica_reads = True
     model = QuestionText
-    ordering = ('question', 'answer')
+    keyset = ('question_key', 'id')
 
     def get_queryset(self):
-        """Filtering to return only flashcards created by logged user"""
-        query_set = super().get_queryset()
-        return query_set.filter(user_id=self.request.user.id)
+        """Filtering to return only flashcards created by logged user, ordered by prefix of the question"""
+        return QuestionText.objects.filter(user_id=self.request.user.id).annotate(question_key=question_key())\
+            .order_by(*self.keyset)
 
 # to add sorting by category
 
 
+class SearchView(LoginRequiredMixin, CachedResponseMixin, TemplateView):
+    """Full-text search of flashcards available to logged user and categories (see search.py), cached
+    until categories or flashcards available to the user change"""
+    template_name = "search.html"
+    cache_dependencies = ('categories', 'common')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = context['query'] = self.request.GET.get('q', '')
+        context['flashcards'] = search.search(QuestionText.objects.available_to(self.request.user.id), query)
+        context['categories'] = search.search(Category.objects.all(), query)
+        return context
+
+
 class UpdateQuestionTextView(LoginRequiredMixin, SuccessMessageMixin, UserPassesTestMixin, UpdateView):
     """View allowing to update flashcard by their user"""
     model = QuestionText
@@ -108,37 +187,36 @@ class DeleteQuestionTextView(LoginRequiredMixin, UserPassesTestMixin, DeleteView
         return object.user == self.request.user
 
 
+def category_label(counts):
+    """Label of category to choose for learning session, with numbers of flashcards of the user"""
+    return lambda category: (
+        f"{category.category_name} ({counts[category.id].total} flashcards, {counts[category.id].due} due, "
+        f"{counts[category.id].mastery}% mastered)")
+
+
 class ChooseLearnSessionView(LoginRequiredMixin, SuccessMessageMixin, CreateView):
     """View for choose learning session, it is doing by create object of Session model.
     User can choose only flashcards created by himself or placed in database without assigned user"""
     model = Session
-    fields = ['amount_of_cards', 'category']
+    form_class = StudySessionForm
 
     def form_valid(self, form):
-        """flashcards from chosen category are filter by user (logged user or no user)
-        and put in one list. List is shuffled. Flashcards from list are put in "through" table"""
+        """Flashcards from chosen category available to the user (logged user or no user) are chosen by spaced
+        repetition scheduler - due flashcards first, then new ones. Session and its flashcards in "through" table
+        are created in one transaction by scheduler.start_session, session without flashcards is not saved"""
         form.instance.user = self.request.user
-        result = super().form_valid(form)
-        number = form.cleaned_data['amount_of_cards']
-        category_id = form.cleaned_data['category']
-        flashcards_of_user = QuestionText.objects.filter(categories=category_id).filter(user_id=self.request.user.id).order_by('?')
-        flashcards_common_list = QuestionText.objects.filter(categories=category_id).filter(user_id__isnull=True)
-        flashcards_list = []
-        for card in flashcards_common_list:
-            flashcards_list.append(card)
-        for card in flashcards_of_user:
-            flashcards_list.append(card)
-        random.shuffle(flashcards_list)
-        if len(flashcards_list) == 0:
+        self.object = form.save(commit=False)
+        if not scheduler.start_session(self.object):
             messages.success(self.request, "You don't have flashcards in chosen category")
             return redirect('choose_session')
-        if len(flashcards_list) <= number:
-            flashcards_list = flashcards_list
-        elif len(flashcards_list) > number:
-            flashcards_list = flashcards_list[0:number]
-        for card in flashcards_list:
-            FlashCardsTextStatus.objects.create(result=None, session=form.instance, flash_card=card)   # flashcards from list are put in through table, each have at begin result "None"
-        return super().form_valid(form)
+        return redirect(self.get_success_url())
+
+    def get_context_data(self, **kwargs):
+        """Categories to choose are shown with cached numbers of flashcards of the user"""
+        context = super().get_context_data(**kwargs)
+        context['form'].fields['category'].label_from_instance = category_label(
+            stats.category_counts(self.request.user.id))
+        return context
 
     def get_success_url(self):
         """Redirection to question from first flashcard"""
@@ -152,30 +230,19 @@ class FlashcardTextQuestionView(LoginRequiredMixin, View):
     and flash_card_id.
     """
     def get(self, request, session_id):
-        """Id of QuestionText flashcards from one session are put in list and shuffle. Then flashcard with first id
-        is checking - if the newest record in FlashCardsTextStatus is "wrong" or null (0 or null) question is display
-        if the newest record is "correct" or "correct but difficult" (1 or 2) next Flashcard is checking.
-        when there are no Flashcards with the newest record "wrong" or null session id finished with redirect to
-        the "finish page".
+        """Current state of each flashcard from the session is kept in SessionCardState. Random flashcard
+        with the newest result "wrong" or null (0 or null) is displayed. When there are no such flashcards
+        session is finished with redirect to the "finish page".
         """
-        flashcards = FlashCardsTextStatus.objects.filter(session_id=session_id)
-        flashcards_id_list = []
-        for card in flashcards:
-            if card.flash_card_id not in flashcards_id_list:
-                flashcards_id_list.append(card.flash_card_id)
-        random.shuffle(flashcards_id_list)
-        num = 0
-        while num < len(flashcards_id_list):
-            item = flashcards_id_list[num]
-            questiontext = QuestionText.objects.get(id=item)
-            flashcard_status = FlashCardsTextStatus.objects.filter(session_id=session_id, flash_card_id=item).order_by("-date").first()
-            if flashcard_status.result != 1 and flashcard_status.result != 2:
-                return TemplateResponse(request, "flashcard_question.html",
-                                        context={"questiontext": questiontext, "flashcard_status": flashcard_status, "session_id": session_id})
-            else:
-                num += 1
-        session_id = session_id
-        return redirect('finish_page', session_id=session_id)
+        flashcard_state = SessionCardState.objects.next_pending(session_id)
+        if flashcard_state is None:
+            return redirect('finish_page', session_id=session_id)
+        return TemplateResponse(request, "flashcard_question.html",
+                                context={"questiontext": flashcard_state.flash_card,
+                                         "flashcard_state": flashcard_state, "session_id": session_id,
+                                         "answer_url": reverse('flashcard_answer', kwargs={
+                                             'session_id': session_id,
+                                             'questiontext_id': flashcard_state.flash_card_id})})
 
 
 class FlashcardTextAnswerView(LoginRequiredMixin, FormView):
@@ -192,39 +259,55 @@ class FlashcardTextAnswerView(LoginRequiredMixin, FormView):
         return query_set.filter(session_id=int(self.kwargs['session_id'])).filter(questiontext_id=int(self.kwargs['questiontext_id']))
 
     def get_context_data(self):
-        """Getting context to display answer"""
+        """Getting context to display answer from current state of the flashcard in session"""
         context = super().get_context_data()
-        context['flashcard'] = QuestionText.objects.get(id=int(self.kwargs['questiontext_id']))
+        flashcard_state = get_object_or_404(SessionCardState.objects.select_related('flash_card'),
+                                            session_id=int(self.kwargs['session_id']),
+                                            flash_card_id=int(self.kwargs['questiontext_id']))
+        context['flashcard'] = flashcard_state.flash_card
         return context
 
     def form_valid(self, form):
-        """Result is choosing and new record is saved in flashcardstextstatus table"""
-        session = Session.objects.get(id=int(self.kwargs['session_id']))
-        flashcard = QuestionText.objects.get(id=int(self.kwargs['questiontext_id']))
-        result = form.cleaned_data['result']
-
-        FlashCardsTextStatus.objects.create(result=result, session=session, flash_card=flashcard)
+        """Result is choosing, current state of the flashcard in session of logged user is updated with one query,
+        record in flashcardstextstatus table and spaced repetition schedule are written by answers buffer"""
+        try:
+            answers.record(int(self.kwargs['session_id']), int(self.kwargs['questiontext_id']),
+                           self.request.user.id, form.cleaned_data['result'])
+        except SessionCardState.DoesNotExist:
+            raise Http404("Flashcard is not in the learning session")
         return super().form_valid(form)
 
     def get_success_url(self) -> str:
         """Redirect to FlashcardTextQuestionView"""
-        session = Session.objects.get(id=int(self.kwargs['session_id']))
-        return reverse('flashcard_question', kwargs={'session_id': session.id})
+        return reverse('flashcard_question', kwargs={'session_id': int(self.kwargs['session_id'])})
 
 
 class FinishPageView(LoginRequiredMixin, View):
     """View diplay after finishing learn session, with brief summary"""
+    model = Session
+    replica_reads = True
+
     def get(self, request, session_id):
-        flashcards_done = FlashCardsTextStatus.objects.filter(session_id=session_id)
-        session = Session.objects.get(id=session_id)
+        """Summary of finished session is stored with the session, otherwise it is counted in one query
+        after buffered answers are written"""
+        session = self.model.objects.select_related('category').get(id=session_id)
+        if not session.finished:
+            answers.flush_logged()
+        session.update_summary()
         category = session.category.category_name
-        flashcards_id_list = []
-        for card in flashcards_done:
-            if card.flash_card_id not in flashcards_id_list:
-                flashcards_id_list.append(card.flash_card_id)
-        amount = len(flashcards_id_list)
-        time = flashcards_done[len(flashcards_done)-1].date - flashcards_done[0].date
-        return render(request, "finish_page.html", context={"amount": amount, "time": time, "category": category})
+        return render(request, "finish_page.html", context={"amount": session.cards_learned,
+                                                            "time": session.learning_time, "category": category,
+                                                            "session": session})
+
+
+class InstrumentationView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """Aggregated query count, database time and latency of sampled requests for each URL merged from all worker
+    processes, for staff users"""
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        return JsonResponse(instrumentation.snapshot())
 
 
 class ProfileView(LoginRequiredMixin, View):
@@ -241,21 +324,315 @@ class AddImageFlashcardView(LoginRequiredMixin, SuccessMessageMixin, CreateView)
     success_message = 'flashcard added'
 
     def form_valid(self, form):
-        """logged user is assigned as QuestionText object user"""
+        """logged user is assigned as QuestionText object user, thumbnails are generated in background"""
         obj = form.save(commit=False)
         obj.user = self.request.user
         obj.save()
+        images.schedule_derivatives(obj.id)
         return super().form_valid(form)
 
 
-class FlashcardsImageListView(LoginRequiredMixin, ListView):
+class FlashcardsImageListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """List of QuestionImage flashcards created by logged user with links to update and delete views
     (views to be added)"""
     paginate_by = 20
+    replica_reads = True
     model = QuestionImage
-    ordering = ('question', 'answer')
+    keyset = ('question', 'id')
 
     def get_queryset(self):
         """Filtering to return only flashcards created by logged user"""
         query_set = super().get_queryset()
         return query_set.filter(user_id=self.request.user.id)
+
+
+class ChooseImageSessionView(LoginRequiredMixin, CreateView):
+    """View for choose learning session with QuestionImage flashcards, it is doing by create object
+    of SessionImage model. User can choose only flashcards created by himself or placed in database without
+    assigned user"""
+    model = SessionImage
+    form_class = ImageSessionForm
+    template_name = 'flash_app/session_form.html'
+
+    def form_valid(self, form):
+        """Random flashcards from chosen category are sampled in the database. Session and its flashcards
+        in "through" table are created in one transaction"""
+        form.instance.user = self.request.user
+        number = form.cleaned_data['amount_of_cards']
+        category = form.cleaned_data['category']
+        with transaction.atomic():
+            response = super().form_valid(form)
+            flashcards_ids = list(QuestionImage.objects.available_to(self.request.user.id).filter(categories=category)
+                                  .order_by('?').values_list('id', flat=True)[:number])
+            if len(flashcards_ids) == 0:
+                messages.success(self.request, "You don't have image flashcards in chosen category")
+                return redirect('choose_image_session')
+            self.object.add_flash_cards(flashcards_ids)
+        return response
+
+    def get_success_url(self):
+        """Redirection to question from first flashcard"""
+        return reverse('image_question', kwargs={'session_id': self.object.id})
+
+
+class FlashcardImageQuestionView(LoginRequiredMixin, View):
+    """View showing image of QuestionImage flashcard, pressing "check" button redirect to the page with answer"""
+    def get(self, request, session_id):
+        """Two random pending flashcards (result "wrong" or null) are taken in one query - the first one is
+        displayed, image of the second one is prefetched by the browser, so it is already loaded when user moves
+        to the next flashcard. When there are no pending flashcards session is finished"""
+        flashcard_states = list(SessionImageCardState.objects.filter(session_id=session_id).pending()
+                                .select_related('flash_card').order_by('?')[:2])
+        if not flashcard_states:
+            return redirect('image_finish_page', session_id=session_id)
+        next_flashcard = flashcard_states[1].flash_card if len(flashcard_states) > 1 else None
+        return TemplateResponse(request, "flashcard_image_question.html",
+                                context={"questionimage": flashcard_states[0].flash_card,
+                                         "next_flashcard": next_flashcard, "session_id": session_id})
+
+
+class FlashcardImageAnswerView(LoginRequiredMixin, FormView):
+    """View showing QuestionImage flashcard answer with 3 options of result, after choosing result new record
+    is saved in QuestionImageStatus table and user is redirect to the FlashcardImageQuestionView"""
+    form_class = FlashcardImageAnswerForm
+    template_name = 'flashcardimageanswer.html'
+
+    def get_context_data(self):
+        """Getting context to display answer from current state of the flashcard in session"""
+        context = super().get_context_data()
+        flashcard_state = get_object_or_404(SessionImageCardState.objects.select_related('flash_card'),
+                                            session_id=int(self.kwargs['session_id']),
+                                            flash_card_id=int(self.kwargs['questionimage_id']))
+        context['flashcard'] = flashcard_state.flash_card
+        return context
+
+    def form_valid(self, form):
+        """New record is saved in QuestionImageStatus table and current state of the flashcard is updated
+        in the same transaction, only in session of the user"""
+        try:
+            QuestionImageStatus.objects.record_result(int(self.kwargs['session_id']),
+                                                      int(self.kwargs['questionimage_id']),
+                                                      form.cleaned_data['result'], self.request.user.id)
+        except SessionImageCardState.DoesNotExist:
+            raise Http404("Flashcard is not in the learning session")
+        return super().form_valid(form)
+
+    def get_success_url(self):
+        """Redirect to FlashcardImageQuestionView"""
+        return reverse('image_question', kwargs={'session_id': int(self.kwargs['session_id'])})
+
+
+class ImageFinishPageView(FinishPageView):
+    """View diplay after finishing image learn session, with brief summary"""
+    model = SessionImage
+
+
+# JSON API of learning sessions with QuestionText flashcards for SPA and mobile clients. Client gets many
+# pending flashcards with answers in one request and sends results of many answers in one request.
+
+API_CARDS_LIMIT = 50
+API_ANSWERS_LIMIT = 200
+
+
+def json_body(request):
+    """Decoded JSON object from request body, None when body is not a JSON object"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def json_error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+@method_decorator(ensure_csrf_cookie, name='dispatch')
+class StudyApiMixin(LoginRequiredMixin):
+    """Not logged user gets 401 JSON response instead of redirect to login page. CSRF cookie is set
+    for POST requests of the client"""
+
+    def handle_no_permission(self):
+        return json_error("Authentication required", status=401)
+
+
+class StudyApiSessionsView(StudyApiMixin, View):
+    """Starting of learning session: POST {"category": id, "amount_of_cards": n}"""
+
+    def post(self, request):
+        data = json_body(request)
+        if data is None:
+            return json_error("Request body must be a JSON object")
+        form = StudySessionForm(data)
+        if not form.is_valid():
+            return JsonResponse({'errors': form.errors}, status=400)
+        session = form.save(commit=False)
+        session.user = request.user
+        cards = scheduler.start_session(session)
+        if not cards:
+            return json_error("You don't have flashcards in chosen category")
+        return JsonResponse({'session_id': session.id, 'cards': cards}, status=201)
+
+
+class StudyApiSessionView(StudyApiMixin, View):
+    """Summary of learning session of logged user"""
+
+    def get(self, request, session_id):
+        session = get_object_or_404(Session.objects.select_related('category'), id=session_id, user=request.user)
+        if not session.finished:
+            answers.flush_logged()
+        session.update_summary()
+        return JsonResponse({
+            'session_id': session.id, 'category': session.category.category_name,
+            'amount_of_cards': session.amount_of_cards, 'finished': session.finished,
+            'cards_learned': session.cards_learned,
+            'learning_time': session.learning_time.total_seconds() if session.learning_time else None,
+            'wrong_answers': session.wrong_answers, 'difficult_answers': session.difficult_answers,
+            'correct_answers': session.correct_answers,
+        })
+
+
+class StudyApiCardsView(StudyApiMixin, View):
+    """Up to ?limit= random pending flashcards of the session with questions and answers, in one query"""
+
+    def get(self, request, session_id):
+        try:
+            limit = min(int(request.GET.get('limit', 10)), API_CARDS_LIMIT)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return json_error(f"limit must be a number from 1 to {API_CARDS_LIMIT}")
+        states = list(SessionCardState.objects.filter(session_id=session_id, session__user_id=request.user.id)
+                      .pending().select_related('flash_card').order_by('?')[:limit])
+        if not states and not Session.objects.filter(id=session_id, user=request.user).exists():
+            raise Http404("Learning session not found")
+        return JsonResponse({
+            'session_id': session_id,
+            'cards': [{'id': state.flash_card_id, 'question': state.flash_card.question,
+                       'answer': state.flash_card.answer, 'attempts': state.attempts} for state in states],
+            'finished': not states,
+        })
+
+
+class StudyApiAnswersView(StudyApiMixin, View):
+    """Batch of answers: POST {"answers": [{"card_id": id, "result": 0, 1 or 2}, ...]} in order of answering.
+    Results are recorded and schedules updated in one transaction, with the same number of queries
+    for any size of the batch"""
+
+    def post(self, request, session_id):
+        data = json_body(request)
+        submitted = data.get('answers') if data else None
+        if not isinstance(submitted, list) or not 0 < len(submitted) <= API_ANSWERS_LIMIT:
+            return json_error(f"answers must be a list of 1 to {API_ANSWERS_LIMIT} answers")
+        results = []
+        for answer in submitted:
+            if not isinstance(answer, dict) or not isinstance(answer.get('card_id'), int) \
+                    or answer.get('result') not in dict(RESULTS):
+                return json_error("each answer needs card_id and result (0, 1 or 2)")
+            results.append((answer['card_id'], answer['result']))
+        with transaction.atomic():
+            try:
+                FlashCardsTextStatus.objects.record_results(session_id, results, request.user.id)
+            except SessionCardState.DoesNotExist as error:
+                return json_error(str(error), status=404)
+            scheduler.review_many(request.user.id, results)
+        remaining = SessionCardState.objects.filter(session_id=session_id).pending().count()
+        return JsonResponse({'recorded': len(results), 'remaining': remaining, 'finished': remaining == 0})
+
+
+# Async versions of the learning flow with QuestionText flashcards, under async/ URLs. Served by ASGI server
+# (flashcards/asgi.py) a request waiting for the database doesn't hold a worker thread. Queries use async ORM
+# interface, transactions (not available in async code) and form validation querying the database are run
+# in a thread with sync_to_async. Templates are rendered in a thread by the handler, so TemplateResponse is used.
+
+class AsyncLoginRequiredMixin(AccessMixin):
+    """LoginRequiredMixin for views with async handlers, user is loaded from the session in a thread"""
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class AsyncChooseLearnSessionView(AsyncLoginRequiredMixin, View):
+    """Async version of ChooseLearnSessionView"""
+    template_name = 'flash_app/session_form.html'
+
+    async def get(self, request):
+        return await self.render_form(StudySessionForm())
+
+    async def post(self, request):
+        form = StudySessionForm(request.POST)
+        if not await sync_to_async(form.is_valid)():
+            return await self.render_form(form)
+        session = form.save(commit=False)
+        session.user = request.user
+        if not await sync_to_async(scheduler.start_session)(session):
+            messages.success(request, "You don't have flashcards in chosen category")
+            return redirect('async_choose_session')
+        return redirect('async_flashcard_question', session_id=session.id)
+
+    async def render_form(self, form):
+        counts = await sync_to_async(stats.category_counts)(self.request.user.id)
+        form.fields['category'].label_from_instance = category_label(counts)
+        return TemplateResponse(self.request, self.template_name, context={'form': form})
+
+
+class AsyncFlashcardTextQuestionView(AsyncLoginRequiredMixin, View):
+    """Async version of FlashcardTextQuestionView"""
+
+    async def get(self, request, session_id):
+        flashcard_state = await SessionCardState.objects.anext_pending(session_id)
+        if flashcard_state is None:
+            return redirect('async_finish_page', session_id=session_id)
+        return TemplateResponse(request, "flashcard_question.html",
+                                context={"questiontext": flashcard_state.flash_card,
+                                         "flashcard_state": flashcard_state, "session_id": session_id,
+                                         "answer_url": reverse('async_flashcard_answer', kwargs={
+                                             'session_id': session_id,
+                                             'questiontext_id': flashcard_state.flash_card_id})})
+
+
+class AsyncFlashcardTextAnswerView(AsyncLoginRequiredMixin, View):
+    """Async version of FlashcardTextAnswerView"""
+    template_name = 'flashcardtextanswer.html'
+
+    async def get(self, request, session_id, questiontext_id):
+        return await self.render_answer(FlashcardTextAnswerForm())
+
+    async def post(self, request, session_id, questiontext_id):
+        form = FlashcardTextAnswerForm(request.POST)
+        if not await sync_to_async(form.is_valid)():
+            return await self.render_answer(form)
+        try:
+            await sync_to_async(answers.record)(session_id, questiontext_id, request.user.id,
+                                                form.cleaned_data['result'])
+        except SessionCardState.DoesNotExist:
+            raise Http404("Flashcard is not in the learning session")
+        return redirect('async_flashcard_question', session_id=session_id)
+
+    async def render_answer(self, form):
+        try:
+            flashcard_state = await SessionCardState.objects.select_related('flash_card').aget(
+                session_id=self.kwargs['session_id'], flash_card_id=self.kwargs['questiontext_id'])
+        except SessionCardState.DoesNotExist:
+            raise Http404("Flashcard is not in the learning session")
+        return TemplateResponse(self.request, self.template_name,
+                                context={'form': form, 'flashcard': flashcard_state.flash_card})
+
+
+class AsyncFinishPageView(AsyncLoginRequiredMixin, View):
+    """Async version of FinishPageView"""
+    replica_reads = True
+
+    async def get(self, request, session_id):
+        try:
+            session = await Session.objects.select_related('category').aget(id=session_id)
+        except Session.DoesNotExist:
+            raise Http404("Learning session not found")
+        if not session.finished:
+            await sync_to_async(answers.flush_logged)()
+            await sync_to_async(session.update_summary)()
+        return TemplateResponse(request, "finish_page.html",
+                                context={"amount": session.cards_learned, "time": session.learning_time,
+                                         "category": session.category.category_name, "session": session})
@@ -0,0 +1,74 @@
+"""DATABASES setting from environment variables.
+
+FLASH_DB_ENGINE              postgresql (default) or sqlite - local benchmarks without PostgreSQL server
+FLASH_DB_NAME                database name, for SQLite path of the file (default db.sqlite3 in project directory)
+FLASH_DB_USER, FLASH_DB_PASSWORD, FLASH_DB_HOST, FLASH_DB_PORT
+                             PostgreSQL credentials (default user postgres on 127.0.0.1, no password)
+FLASH_DB_CONN_MAX_AGE        seconds the connection is kept open after request for next requests of the thread,
+                             0 - new connection for each request, 'none' - no limit (default 60)
+FLASH_DB_CONN_HEALTH_CHECKS  reused connection is checked before the request uses it (default 1), so a connection
+                             broken while it was idle doesn't fail the request
+FLASH_DB_POOL_SIZE           maximum connections of in-process pool of PostgreSQL connections
+                             (flash_app.backends.pooled_postgresql), 0 - no pool (default). Connection is taken
+                             from the pool for each request and returned after it, so CONN_MAX_AGE is 0. Size must
+                             not be smaller than number of threads of the process. Not used with SQLite
+FLASH_DB_POOL_MIN_SIZE       connections opened when the pool is created (default 1), connections returned to
+                             the pool are kept open up to FLASH_DB_POOL_SIZE
+FLASH_DB_REPLICAS            comma separated read replicas of the database: PostgreSQL hosts (host or host:port)
+                             with the same name and credentials, for SQLite paths of files. Replicas get aliases
+                             replica_1, replica_2, ... used by flash_app.routers.ReplicaRouter
+"""
+import os
+
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+
+
+def conn_max_age(value):
+    return None if value.lower() == 'none' else int(value)
+
+
+def database_settings(base_dir, environ=os.environ):
+    """Settings of 'default' database"""
+    engine = environ.get('FLASH_DB_ENGINE', 'postgresql')
+    connections = {
+        'CONN_MAX_AGE': conn_max_age(environ.get('FLASH_DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': environ.get('FLASH_DB_CONN_HEALTH_CHECKS', '1').lower() in TRUE_VALUES,
+    }
+    if engine == 'sqlite':
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': environ.get('FLASH_DB_NAME', str(base_dir / 'db.sqlite3')),
+            **connections,
+        }
+    if engine != 'postgresql':
+        raise ValueError(f"FLASH_DB_ENGINE must be postgresql or sqlite, not {engine!r}")
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': environ.get('FLASH_DB_NAME', 'flashcards'),
+        'USER': environ.get('FLASH_DB_USER', 'postgres'),
+        'PASSWORD': environ.get('FLASH_DB_PASSWORD', ''),
+        'HOST': environ.get('FLASH_DB_HOST', '127.0.0.1'),
+        'PORT': environ.get('FLASH_DB_PORT', ''),
+        **connections,
+    }
+    pool_size = int(environ.get('FLASH_DB_POOL_SIZE', '0'))
+    if pool_size:
+        database.update({
+            'ENGINE': 'flash_app.backends.pooled_postgresql',
+            'CONN_MAX_AGE': 0,
+            'POOL': {'min_size': int(environ.get('FLASH_DB_POOL_MIN_SIZE', '1')), 'max_size': pool_size},
+        })
+    return database
+
+
+def replica_settings(database, environ=os.environ):
+    """Settings of replicas of the database, tests use the database itself instead of replicas"""
+    replicas = {}
+    for number, replica in enumerate(filter(None, environ.get('FLASH_DB_REPLICAS', '').split(',')), start=1):
+        if database['ENGINE'] == 'django.db.backends.sqlite3':
+            location = {'NAME': replica.strip()}
+        else:
+            host, _, port = replica.strip().partition(':')
+            location = {'HOST': host, 'PORT': port or database['PORT']}
+        replicas[f'replica_{number}'] = {**database, **location, 'TEST': {'MIRROR': 'default'}}
+    return replicas
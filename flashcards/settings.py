@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 
+from .database import database_settings, replica_settings
+
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'flash_app.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'flash_app.routers.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'flashcards.urls'
@@ -76,15 +80,20 @@ WSGI_APPLICATION = 'flashcards.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# configured with FLASH_DB_* environment variables (see flashcards/database.py): persistent connections with
+# health checks by default, optional in-process connection pool, SQLite for local benchmarks, read replicas
+
 DATABASES = {
-    'default': {
-        'HOST': '127.0.0.1',
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
-        'NAME': 'flashcards',
-        'USER': 'postgres',
-        'PASSWORD': 'coderslab',
-    }
+    'default': database_settings(BASE_DIR),
 }
+DATABASES.update(replica_settings(DATABASES['default']))
+
+# safe reads of list and finish pages go to replicas (flash_app/routers.py)
+DATABASE_ROUTERS = ['flash_app.routers.ReplicaRouter']
+FLASH_REPLICA_DATABASES = [alias for alias in DATABASES if alias != 'default']
+# seconds of replication lag: reads of the user go to the primary for this time after the user changed data,
+# responses rendered from replicas are cached for this time
+FLASH_REPLICA_LAG = 10
 
 
 # Password validation
@@ -130,3 +139,40 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_ROOT= os.path.join(BASE_DIR, 'media/')
 MEDIA_URL= "/media/"
+
+# uploaded files are hashed while they are received, for content-addressed storage of images
+FILE_UPLOAD_HANDLERS = [
+    'flash_app.storage.HashingMemoryFileUploadHandler',
+    'flash_app.storage.HashingTemporaryFileUploadHandler',
+]
+
+# answers of learning sessions are written in batches (flash_app/answers.py) when the buffer of the process
+# has this number of answers or this number of seconds after the first buffered answer, 1 - written at once
+FLASH_ANSWER_BUFFER_SIZE = 100
+FLASH_ANSWER_BUFFER_SECONDS = 2
+
+# history of answers of finished sessions started this number of days ago is moved to the archive table
+# by archive_session_history command (flash_app/archive.py)
+FLASH_ARCHIVE_AFTER_DAYS = 90
+
+# number of threads generating thumbnails of QuestionImage uploads, 0 - generate during request
+FLASH_IMAGE_WORKERS = 2
+
+# part of requests measured by InstrumentationMiddleware (query count, database and render time)
+FLASH_INSTRUMENTATION_SAMPLE_RATE = 0.05
+
+# cache of rendered responses invalidated by versions (flash_app/caching.py). Versions must be seen by all
+# processes serving the site, so the default is file based cache shared by processes of one host (directory
+# FLASH_CACHE_DIR), with many hosts use cache server, e.g. django.core.cache.backends.redis.RedisCache.
+# Local memory cache is refused by system check when the server has more than one worker process
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('FLASH_CACHE_DIR', str(BASE_DIR / 'cache')),
+    },
+}
+# number of worker processes of the server (WEB_CONCURRENCY of gunicorn)
+FLASH_WEB_WORKERS = int(os.environ.get('WEB_CONCURRENCY', '1'))
+FLASH_RESPONSE_CACHE = 'default'
+# seconds after which unreachable (invalidated) responses are removed
+FLASH_RESPONSE_CACHE_TIMEOUT = 3600
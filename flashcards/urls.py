@@ -21,7 +21,10 @@ from django.urls import path, include
 from flash_app.views import AddCategoryView, AddTextFlashcardView, ChooseLearnSessionView, FlashcardTextQuestionView, \
     FlashcardTextAnswerView, FinishPageView, CategoryListView, FlashcardsView, FlashcardsListView, UpdateCategoryView, \
     DeleteCategoryView, UpdateQuestionTextView, DeleteQuestionTextView, ProfileView, AddImageFlashcardView, \
-    FlashcardsImageListView
+    FlashcardsImageListView, ImportFlashcardsView, ExportFlashcardsView, ChooseImageSessionView, \
+    FlashcardImageQuestionView, FlashcardImageAnswerView, ImageFinishPageView, InstrumentationView, SearchView, \
+    StudyApiSessionsView, StudyApiSessionView, StudyApiCardsView, StudyApiAnswersView, AsyncChooseLearnSessionView, \
+    AsyncFlashcardTextQuestionView, AsyncFlashcardTextAnswerView, AsyncFinishPageView
 
 
 urlpatterns = [
@@ -33,17 +36,35 @@ urlpatterns = [
     path('category/update/<int:pk>', UpdateCategoryView.as_view(), name='update_category'),
     path('category/delete/<int:pk>', DeleteCategoryView.as_view(), name='delete_category'),
     path('add_textflashcard', AddTextFlashcardView.as_view(), name='add_textflashcard'),
+    path('import_flashcards', ImportFlashcardsView.as_view(), name='import_flashcards'),
+    path('export_flashcards', ExportFlashcardsView.as_view(), name='export_flashcards'),
     path('choose_session', ChooseLearnSessionView.as_view(), name='choose_session'),
     path('flashcard_question/<int:session_id>', FlashcardTextQuestionView.as_view(), name='flashcard_question'),
     path('flashcard_answer/<int:session_id>/<int:questiontext_id>', FlashcardTextAnswerView.as_view(), name='flashcard_answer'),
     path('finish_page/<int:session_id>', FinishPageView.as_view(), name='finish_page'),
     path('category_list', CategoryListView.as_view(), name='category_list'),
     path('flashcards_list', FlashcardsListView.as_view(), name='flashcards_list'),
+    path('search', SearchView.as_view(), name='search'),
     path('questiontext/update/<int:pk>', UpdateQuestionTextView.as_view(), name='update_questiontext'),
     path('questiontext/delete/<int:pk>', DeleteQuestionTextView.as_view(), name='delete_questiontext'),
     path('profile', ProfileView.as_view(), name='profile'),
+    path('instrumentation', InstrumentationView.as_view(), name='instrumentation'),
     path('add_imageflashcard', AddImageFlashcardView.as_view(), name='add_imageflashcard'),
-    path('image_list', FlashcardsImageListView.as_view(), name='image_list')
+    path('image_list', FlashcardsImageListView.as_view(), name='image_list'),
+    path('choose_image_session', ChooseImageSessionView.as_view(), name='choose_image_session'),
+    path('image_question/<int:session_id>', FlashcardImageQuestionView.as_view(), name='image_question'),
+    path('image_answer/<int:session_id>/<int:questionimage_id>', FlashcardImageAnswerView.as_view(), name='image_answer'),
+    path('image_finish_page/<int:session_id>', ImageFinishPageView.as_view(), name='image_finish_page'),
+    path('api/sessions', StudyApiSessionsView.as_view(), name='api_sessions'),
+    path('api/sessions/<int:session_id>', StudyApiSessionView.as_view(), name='api_session'),
+    path('api/sessions/<int:session_id>/cards', StudyApiCardsView.as_view(), name='api_session_cards'),
+    path('api/sessions/<int:session_id>/answers', StudyApiAnswersView.as_view(), name='api_session_answers'),
+    path('async/choose_session', AsyncChooseLearnSessionView.as_view(), name='async_choose_session'),
+    path('async/flashcard_question/<int:session_id>', AsyncFlashcardTextQuestionView.as_view(),
+         name='async_flashcard_question'),
+    path('async/flashcard_answer/<int:session_id>/<int:questiontext_id>', AsyncFlashcardTextAnswerView.as_view(),
+         name='async_flashcard_answer'),
+    path('async/finish_page/<int:session_id>', AsyncFinishPageView.as_view(), name='async_finish_page'),
 ]
 
 